@@ -1,6 +1,6 @@
-import http.client
 import json
 import os
+from api.broker_client import broker_request
 
 def authenticate_broker(clientcode, broker_pin, totp_code):
     """
@@ -9,7 +9,6 @@ def authenticate_broker(clientcode, broker_pin, totp_code):
     api_key = os.getenv('BROKER_API_KEY')
 
     try:
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
         payload = json.dumps({
             "clientcode": clientcode,
             "password": broker_pin,
@@ -26,12 +25,8 @@ def authenticate_broker(clientcode, broker_pin, totp_code):
             'X-PrivateKey': api_key
         }
 
-        conn.request("POST", "/rest/auth/angelbroking/user/v1/loginByPassword", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        mydata = data.decode("utf-8")
-
-        data_dict = json.loads(mydata)
+        res = broker_request("POST", "/rest/auth/angelbroking/user/v1/loginByPassword", payload, headers)
+        data_dict = res.json()
 
         if 'data' in data_dict and 'jwtToken' in data_dict['data']:
             return data_dict['data']['jwtToken'], None
@@ -0,0 +1,64 @@
+# api/book_cache.py
+
+"""
+Per-account read-through cache for the order book, trade book, positions and
+holdings views.
+
+The dashboard polls these views, often from several tabs at once. Each view is
+cached per account for BOOK_CACHE_TTL seconds, concurrent requests for the same view
+share one broker call, and the account's views are dropped whenever we place,
+modify or cancel an order so a poll right after an order sees it.
+"""
+
+import os
+import threading
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# Seconds a book fetched from the broker is served to later requests, 0 disables the cache
+BOOK_CACHE_TTL = float(os.getenv('BOOK_CACHE_TTL', '2'))
+
+_books = TTLCache(maxsize=1024, ttl=BOOK_CACHE_TTL) if BOOK_CACHE_TTL > 0 else None
+_lock = threading.Lock()
+_flight = SingleFlight()
+_generations = {}  # account -> invalidation count, to drop loads that raced an order
+
+
+def _load(account, name, load):
+    with _lock:
+        generation = _generations.get(account, 0)
+    ok, value = load()
+    if ok and _books is not None:
+        with _lock:
+            # An order placed while the book was loading may be missing from it
+            if _generations.get(account, 0) == generation:
+                _books[(account, name)] = value
+    return ok, value
+
+
+def get_cached_book(account, name, load):
+    """
+    Return the (ok, value) pair produced by `load()` for the account's `name` view,
+    served from the cache while it is fresh. Only successful loads are cached.
+    """
+    if _books is not None and account:
+        with _lock:
+            value = _books.get((account, name))
+        if value is not None:
+            return True, value
+    if not account:
+        return load()
+    return _flight.do((account, name), _load, account, name, load)
+
+
+def invalidate_books(account):
+    """Drop every cached view of the account, called after our own order placement, modification or cancellation."""
+    if _books is None or not account:
+        return
+    with _lock:
+        _generations[account] = _generations.get(account, 0) + 1
+        for key in [key for key in _books.keys() if key[0] == account]:
+            _books.pop(key, None)
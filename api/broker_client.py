@@ -0,0 +1,206 @@
+# api/broker_client.py
+
+import http.client
+import json
+import os
+import select
+import ssl
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from api.broker_scheduler import get_broker_scheduler
+
+load_dotenv()
+
+# Broker endpoint and connection pool settings
+BROKER_HOST = os.getenv('BROKER_HOST', 'apiconnect.angelbroking.com')
+BROKER_PORT = int(os.getenv('BROKER_PORT', '443'))
+BROKER_POOL_SIZE = int(os.getenv('BROKER_POOL_SIZE', '10'))
+BROKER_CONNECT_TIMEOUT = float(os.getenv('BROKER_CONNECT_TIMEOUT', '5'))
+BROKER_READ_TIMEOUT = float(os.getenv('BROKER_READ_TIMEOUT', '15'))
+BROKER_IDLE_TIMEOUT = float(os.getenv('BROKER_IDLE_TIMEOUT', '50'))
+
+# Errors raised when a pooled keep-alive socket was closed by the broker while idle
+STALE_CONNECTION_ERRORS = (ConnectionError, ssl.SSLEOFError, ssl.SSLZeroReturnError)
+# Requests that may be sent again when the response is lost; everything else may have placed,
+# modified or cancelled an order by then
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class BrokerResponse:
+    """
+    A fully read broker response. Exposes the same `status`, `reason` and `read()`
+    that callers previously used on http.client responses, plus a `json()` helper.
+    """
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+class BrokerConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTPS connections to a single host.
+
+    Up to `maxsize` idle connections are retained for reuse; when every pooled
+    connection is busy a new one is opened rather than blocking the caller, and
+    surplus connections are closed when they are returned.
+
+    A reused connection found dead is retried once on a fresh one, but only when no
+    part of the request can have reached the broker (the send itself failed) or the
+    method is idempotent. A POST whose response is lost raises, since the order may
+    be live; the caller has to check the order book rather than send it again.
+    """
+
+    def __init__(self, host, port=443, maxsize=BROKER_POOL_SIZE, ssl_context=None,
+                 connect_timeout=BROKER_CONNECT_TIMEOUT, read_timeout=BROKER_READ_TIMEOUT,
+                 idle_timeout=BROKER_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.ssl_context = ssl_context
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self._idle = deque()  # (connection, last_used) pairs, most recently used last
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'reconnects': 0, 'discarded': 0}
+
+    def _new_connection(self):
+        conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout,
+                                           context=self.ssl_context)
+        conn.connect()
+        # The handshake is done, switch the socket over to the read timeout
+        conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self.stats['created'] += 1
+        return conn
+
+    def _get_connection(self):
+        """Return a (connection, reused) pair, preferring a warm idle connection."""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if conn.sock is not None and now - last_used < self.idle_timeout and not self._dropped(conn):
+                    self.stats['reused'] += 1
+                    return conn, True
+                # Idle for too long, the broker has most likely dropped it already
+                self.stats['discarded'] += 1
+                conn.close()
+        return self._new_connection(), False
+
+    @staticmethod
+    def _dropped(conn):
+        # An idle keep-alive socket only turns readable when the broker has closed it
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+            return bool(readable)
+        except (OSError, ValueError):
+            return True
+
+    def _put_connection(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _receive(self, conn):
+        res = conn.getresponse()
+        data = res.read()
+        return res, data
+
+    def _retry(self, method, endpoint, body, headers):
+        with self._lock:
+            self.stats['reconnects'] += 1
+        conn = self._new_connection()
+        try:
+            conn.request(method, endpoint, body, headers)
+            return conn, self._receive(conn)
+        except Exception:
+            conn.close()
+            raise
+
+    def request(self, method, endpoint, body=None, headers=None):
+        headers = headers or {}
+        conn, reused = self._get_connection()
+        try:
+            conn.request(method, endpoint, body, headers)
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # The pooled socket went stale before the request went out, retry once on a fresh connection
+            conn, (res, data) = self._retry(method, endpoint, body, headers)
+        except Exception:
+            conn.close()
+            raise
+        else:
+            try:
+                res, data = self._receive(conn)
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused or method.upper() not in IDEMPOTENT_METHODS:
+                    raise
+                conn, (res, data) = self._retry(method, endpoint, body, headers)
+            except Exception:
+                conn.close()
+                raise
+
+        if res.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+
+        return BrokerResponse(res.status, res.reason, dict(res.getheaders()), data)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+
+
+# One pool per (host, port), shared by every broker call in the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _default_ssl_context():
+    return ssl.create_default_context()
+
+
+def get_broker_pool(host=None, port=None):
+    """Return the shared connection pool for the given host, creating it on first use."""
+    host = host or BROKER_HOST
+    port = port or BROKER_PORT
+    key = (host, port)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = BrokerConnectionPool(host, port, ssl_context=_default_ssl_context())
+                _pools[key] = pool
+    return pool
+
+
+def broker_request(method, endpoint, payload='', headers=None, host=None, port=None, priority=None):
+    """
+    Send a request to the broker over a pooled keep-alive connection and return a BrokerResponse.
+
+    The call first waits for the endpoint's outbound rate limit, served in `priority`
+    order (see api.broker_scheduler); BrokerQueueTimeout is raised if it cannot be sent in time.
+    """
+    get_broker_scheduler().acquire(endpoint, priority)
+    return get_broker_pool(host, port).request(method, endpoint, payload, headers)
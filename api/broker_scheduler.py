@@ -0,0 +1,258 @@
+# api/broker_scheduler.py
+
+"""
+Outbound rate limiting for broker calls.
+
+The broker enforces per-endpoint request limits (orders per second, order book and
+position fetches per second). Every broker call takes a token from its endpoint's
+bucket before it is sent; when the bucket is empty the caller queues, and queued
+callers are served by priority class (exits, then orders, then queries) and then in
+arrival order, so a burst of book fetches never delays a square-off.
+"""
+
+import os
+import heapq
+import itertools
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Priority classes, lower is served first
+PRIORITY_EXIT = 0   # square-offs and cancellations
+PRIORITY_ORDER = 1  # new orders and modifications
+PRIORITY_QUERY = 2  # order book, positions, funds and other reads
+PRIORITY_NAMES = {PRIORITY_EXIT: 'exit', PRIORITY_ORDER: 'order', PRIORITY_QUERY: 'query'}
+
+# Requests per second per endpoint, as "endpoint=rate" pairs keyed by the last path segment
+DEFAULT_BROKER_RATE_LIMITS = ('placeOrder=20,modifyOrder=20,cancelOrder=20,getOrderBook=1,getTradeBook=1,'
+                              'getPosition=1,getAllHolding=1,getRMS=2,loginByPassword=1')
+BROKER_RATE_LIMITS = os.getenv('BROKER_RATE_LIMITS', DEFAULT_BROKER_RATE_LIMITS)
+# Limit for endpoints not listed above, 0 leaves them unlimited
+BROKER_DEFAULT_RATE_LIMIT = float(os.getenv('BROKER_DEFAULT_RATE_LIMIT', '10'))
+# Requests a bucket may send back to back after being idle
+BROKER_RATE_BURST = float(os.getenv('BROKER_RATE_BURST', '1'))
+# Seconds a call may wait in the queue before it is given up
+BROKER_QUEUE_TIMEOUT = float(os.getenv('BROKER_QUEUE_TIMEOUT', '10'))
+
+ORDER_ENDPOINTS = {'placeOrder', 'modifyOrder', 'cancelOrder'}
+
+
+class BrokerQueueTimeout(Exception):
+    """Raised when a broker call could not be sent before its queue deadline."""
+
+
+def parse_rate_limits(spec):
+    """Parse "endpoint=rate,..." into a dict of endpoint name to requests per second."""
+    limits = {}
+    for item in (spec or '').split(','):
+        name, _, rate = item.strip().partition('=')
+        if name and rate:
+            limits[name.strip()] = float(rate)
+    return limits
+
+
+def endpoint_name(endpoint):
+    """The bucket name of a broker path, e.g. placeOrder for /rest/secure/.../order/v1/placeOrder."""
+    return endpoint.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
+
+def default_priority(endpoint):
+    return PRIORITY_ORDER if endpoint_name(endpoint) in ORDER_ENDPOINTS else PRIORITY_QUERY
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `capacity`; starts full."""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_token(self, now):
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'bucket', 'enqueued', 'granted')
+
+    def __init__(self, priority, seq, bucket, enqueued):
+        self.priority = priority
+        self.seq = seq
+        self.bucket = bucket
+        self.enqueued = enqueued
+        self.granted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class BrokerScheduler:
+    """
+    Per-endpoint token buckets with a priority queue in front of each.
+
+    `clock` returns monotonic seconds and `wait(condition, timeout)` blocks on the
+    scheduler's condition; both can be replaced with a fake clock in tests, where
+    `wait` advances the clock instead of sleeping.
+    """
+
+    def __init__(self, limits=None, default_rate=BROKER_DEFAULT_RATE_LIMIT, burst=BROKER_RATE_BURST,
+                 queue_timeout=BROKER_QUEUE_TIMEOUT, clock=time.monotonic, wait=None):
+        self.limits = parse_rate_limits(BROKER_RATE_LIMITS) if limits is None else dict(limits)
+        self.default_rate = default_rate
+        self.burst = burst
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        self._wait = wait or (lambda condition, timeout: condition.wait(timeout))
+        self._condition = threading.Condition()
+        self._buckets = {}
+        self._queues = {}  # bucket name -> heap of waiting _Waiters
+        self._seq = itertools.count()
+        self._metrics = {}
+
+    def _bucket(self, name):
+        """Return the bucket name used for `name`, or None when calls to it are not limited."""
+        if name not in self._buckets:
+            rate = self.limits.get(name, self.default_rate)
+            if rate <= 0:
+                return None
+            self._buckets[name] = TokenBucket(rate, self.burst, self.clock())
+            self._queues[name] = []
+        return name
+
+    def _stats(self, name):
+        stats = self._metrics.get(name)
+        if stats is None:
+            stats = self._metrics[name] = {'sent': 0, 'queued': 0, 'expired': 0, 'total_wait': 0.0,
+                                           'max_wait': 0.0, 'by_priority': {}}
+        return stats
+
+    def _record(self, name, priority, waited, expired=False):
+        stats = self._stats(name)
+        key = 'expired' if expired else 'sent'
+        stats[key] += 1
+        if expired:
+            return
+        if waited > 0:
+            stats['queued'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        by_priority = stats['by_priority'].setdefault(PRIORITY_NAMES.get(priority, str(priority)),
+                                                      {'sent': 0, 'total_wait': 0.0})
+        by_priority['sent'] += 1
+        by_priority['total_wait'] += waited
+
+    def _dispatch(self, name, now):
+        """Hand out available tokens to the head of the bucket's queue, in priority order."""
+        queue = self._queues[name]
+        bucket = self._buckets[name]
+        granted = False
+        while queue and bucket.try_take(now):
+            waiter = heapq.heappop(queue)
+            waiter.granted = True
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def acquire(self, endpoint, priority=None, timeout=None):
+        """
+        Block until a call to `endpoint` may be sent and return the seconds spent waiting.
+
+        `priority` defaults to PRIORITY_ORDER for order endpoints and PRIORITY_QUERY
+        otherwise. Raises BrokerQueueTimeout when no token was granted within `timeout`
+        seconds (BROKER_QUEUE_TIMEOUT by default).
+        """
+        name = endpoint_name(endpoint)
+        priority = default_priority(endpoint) if priority is None else priority
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        with self._condition:
+            now = self.clock()
+            bucket_name = self._bucket(name)
+            if bucket_name is None:
+                self._record(name, priority, 0.0)
+                return 0.0
+
+            queue = self._queues[name]
+            bucket = self._buckets[name]
+            # Nobody is queued ahead, take a token straight away if there is one
+            if not queue and bucket.try_take(now):
+                self._record(name, priority, 0.0)
+                return 0.0
+
+            waiter = _Waiter(priority, next(self._seq), name, now)
+            heapq.heappush(queue, waiter)
+            deadline = now + timeout
+            while True:
+                self._dispatch(name, now)
+                if waiter.granted:
+                    waited = now - waiter.enqueued
+                    self._record(name, priority, waited)
+                    return waited
+                if now >= deadline:
+                    queue.remove(waiter)
+                    heapq.heapify(queue)
+                    self._record(name, priority, now - waiter.enqueued, expired=True)
+                    # The waiter behind us may be able to go now
+                    self._dispatch(name, now)
+                    raise BrokerQueueTimeout(
+                        f"Broker rate limit: {name} call not sent within {timeout:g}s "
+                        f"({len(queue)} calls still queued)")
+                self._wait(self._condition, min(bucket.time_until_token(now), deadline - now))
+                now = self.clock()
+
+    def metrics(self):
+        """Queue depth, calls sent, expired calls and wait times per endpoint."""
+        with self._condition:
+            snapshot = {}
+            for name, stats in self._metrics.items():
+                bucket = self._buckets.get(name)
+                sent = stats['sent']
+                snapshot[name] = {
+                    'rate': bucket.rate if bucket else None,
+                    'queue_depth': len(self._queues.get(name, [])),
+                    'sent': stats['sent'],
+                    'queued': stats['queued'],
+                    'expired': stats['expired'],
+                    'avg_wait_ms': round(stats['total_wait'] / sent * 1000, 1) if sent else 0.0,
+                    'max_wait_ms': round(stats['max_wait'] * 1000, 1),
+                    'by_priority': {
+                        priority: {'sent': values['sent'],
+                                   'avg_wait_ms': round(values['total_wait'] / values['sent'] * 1000, 1)}
+                        for priority, values in stats['by_priority'].items()
+                    },
+                }
+            return snapshot
+
+
+# One scheduler per process, shared by every broker call
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_broker_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BrokerScheduler()
+    return _scheduler
+
+
+def get_broker_scheduler_metrics():
+    return get_broker_scheduler().metrics()
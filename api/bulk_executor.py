@@ -0,0 +1,82 @@
+# api/bulk_executor.py
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bulk operation settings (cancel all orders, close all positions)
+BULK_MAX_WORKERS = int(os.getenv('BULK_MAX_WORKERS', '8'))
+BULK_ITEM_TIMEOUT = float(os.getenv('BULK_ITEM_TIMEOUT', '10'))
+# Legs of a basket order placed at once
+BASKET_MAX_WORKERS = int(os.getenv('BASKET_MAX_WORKERS', '10'))
+# Child orders of a split order placed at once
+SPLIT_ORDER_MAX_WORKERS = int(os.getenv('SPLIT_ORDER_MAX_WORKERS', '10'))
+
+
+def run_bulk(items, fn, describe=None, max_workers=BULK_MAX_WORKERS, timeout=BULK_ITEM_TIMEOUT):
+    """
+    Run `fn(item)` for every item on a bounded thread pool and return a report.
+
+    `fn` returns an (ok, response) pair. Broker calls made by `fn` are paced by the
+    outbound scheduler (api.broker_scheduler). Each call is reported as timed out once
+    it has run for `timeout` seconds; the call itself is not interrupted, the broker
+    client's read timeout bounds it. `describe(item)` gives the dict used to
+    identify the item in the report.
+
+    The report has `total`, `succeeded`, `failed`, `timed_out`, `elapsed_ms` and a
+    `results` list (in item order) of {'item', 'status', 'response', 'elapsed_ms'},
+    where status is success, error or timeout.
+    """
+    items = list(items)
+    describe = describe or (lambda item: item)
+    started = {}
+    results = [None] * len(items)
+    start = time.monotonic()
+
+    def task(position, item):
+        started[position] = time.monotonic()
+        return fn(item)
+
+    def record(position, status, response):
+        began = started.get(position, start)
+        results[position] = {
+            'item': describe(items[position]),
+            'status': status,
+            'response': response,
+            'elapsed_ms': round((time.monotonic() - began) * 1000, 1),
+        }
+
+    if items:
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+        futures = {pool.submit(task, position, item): position for position, item in enumerate(items)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                position = futures[future]
+                try:
+                    ok, response = future.result()
+                    record(position, 'success' if ok else 'error', response)
+                except Exception as e:
+                    record(position, 'error', {'message': str(e)})
+            now = time.monotonic()
+            for future in list(pending):
+                position = futures[future]
+                if position in started and now - started[position] > timeout:
+                    record(position, 'timeout', {'message': f'No response within {timeout:g}s'})
+                    pending.discard(future)
+        # Don't hold the request for calls that already timed out
+        pool.shutdown(wait=False)
+
+    statuses = [result['status'] for result in results]
+    return {
+        'total': len(items),
+        'succeeded': statuses.count('success'),
+        'failed': statuses.count('error'),
+        'timed_out': statuses.count('timeout'),
+        'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+        'results': results,
+    }
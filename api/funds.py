@@ -1,8 +1,8 @@
 # api/funds.py
 
 import os
-import http.client
 import json
+from api.broker_client import broker_request
 
 def get_margin_data(auth_token, api_key=None):
     """Fetch margin data from the broker's API using the provided auth token and api_key.
@@ -13,7 +13,6 @@ def get_margin_data(auth_token, api_key=None):
             # Fallback to environment variable if api_key is not provided
             api_key = os.getenv('BROKER_API_KEY')
             
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
         headers = {
             'Authorization': f'Bearer {auth_token}',
             'Content-Type': 'application/json',
@@ -25,11 +24,8 @@ def get_margin_data(auth_token, api_key=None):
             'X-MACAddress': 'MAC_ADDRESS',
             'X-PrivateKey': api_key
         }
-        conn.request("GET", "/rest/secure/angelbroking/user/v1/getRMS", '', headers)
-
-        res = conn.getresponse()
-        data = res.read()
-        margin_data = json.loads(data.decode("utf-8"))
+        res = broker_request("GET", "/rest/secure/angelbroking/user/v1/getRMS", '', headers)
+        margin_data = res.json()
 
         print(f"Margin Data {margin_data}")
 
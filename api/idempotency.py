@@ -0,0 +1,203 @@
+# api/idempotency.py
+
+"""
+Duplicate suppression for the order webhooks.
+
+A request is identified by its `idempotency_key` field when it has one. With
+IDEMPOTENCY_WINDOW set, requests without a key are also identified by a hash of what
+they ask for (user, strategy, exchange, symbol, action, quantity and the price and
+product fields, or the legs of a basket) within that many seconds; it is off by default, since a strategy
+may well send two identical orders on purpose, e.g. when scaling in. The first
+request for an identity runs; repeats get the first request's response back without
+reaching the broker. Repeats arriving while the first is still running wait for it.
+
+Responses are looked up in a bounded in-memory LRU first, then in the shared
+idempotency_keys table so repeats landing on another worker process are caught too.
+The key is only released, so a retry runs normally, when the response shows the order
+never reached the broker or the broker turned it down (4xx, 502). Any other response,
+including a 5xx after the broker call, is remembered: the order may be live.
+"""
+
+import os
+import time
+import json
+import hashlib
+import threading
+from cachetools import LRUCache
+from dotenv import load_dotenv
+
+from database import idempotency_db
+
+load_dotenv()
+
+# Seconds within which a request with the same content is a duplicate; 0 (default) only honours explicit keys
+IDEMPOTENCY_WINDOW = float(os.getenv('IDEMPOTENCY_WINDOW', '0'))
+# Seconds an explicit idempotency_key is remembered
+IDEMPOTENCY_KEY_TTL = float(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))
+# Responses kept in memory per worker process
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+# Seconds a repeat waits for the first request to finish before being turned away
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', '15'))
+
+# Seconds an unfinished claim holds its key, so a worker dying mid-order does not block retries for
+# long; the key is kept for its full ttl only once the response is stored
+PENDING_LEASE = IDEMPOTENCY_WAIT * 4
+
+# Request fields that make two orders different when there is no explicit key
+CONTENT_FIELDS = ('strategy', 'exchange', 'symbol', 'action', 'quantity', 'pricetype', 'product', 'price',
+                  'trigger_price', 'position_size', 'splitsize')
+
+_responses = LRUCache(maxsize=IDEMPOTENCY_CACHE_SIZE)
+_inflight = {}
+_lock = threading.Lock()
+_stats = {'executed': 0, 'replayed': 0, 'in_progress': 0}
+
+
+def order_not_placed(status):
+    """Whether a response status means no order was placed: refused before the broker (4xx) or by it (502)."""
+    return 400 <= status < 500 or status == 502
+
+
+class IdempotencyConflict(Exception):
+    """A request with the same key is still running and did not finish in time."""
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def get_idempotency_stats():
+    with _lock:
+        return dict(_stats, cached=len(_responses), in_flight=len(_inflight))
+
+
+def request_identity(kind, user_id, data):
+    """
+    The (key, ttl) identifying an order request, or None when it is not deduplicated.
+    Explicit keys are scoped to the user and the route; content keys also to the window.
+    """
+    explicit = data.get('idempotency_key')
+    if explicit:
+        raw = json.dumps(['key', kind, user_id, str(explicit)])
+        ttl = IDEMPOTENCY_KEY_TTL
+    elif IDEMPOTENCY_WINDOW > 0:
+        content = [str(data.get(field, '')).strip().upper() for field in CONTENT_FIELDS]
+        # A basket is told apart by its legs, which carry the symbol and quantity fields
+        content.append(json.dumps(data.get('orders'), sort_keys=True, default=str))
+        raw = json.dumps(['content', kind, user_id] + content)
+        ttl = IDEMPOTENCY_WINDOW
+    else:
+        return None
+    return hashlib.sha256(raw.encode()).hexdigest(), ttl
+
+
+def _cached(key):
+    with _lock:
+        entry = _responses.get(key)
+        if entry is not None and entry[2] <= time.time():
+            _responses.pop(key, None)
+            entry = None
+    return entry
+
+
+def _remember(key, http_status, response_data, expires_at):
+    with _lock:
+        _responses[key] = (response_data, http_status, expires_at)
+
+
+def _update_store(fn, *args):
+    # The order has already run, a store failure must not turn its response into an error
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"Error updating idempotency key: {e}")
+
+
+def _wait_for_owner(key):
+    """Wait for the request that owns `key` elsewhere; return its stored entry or None if it was released."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    while time.monotonic() < deadline:
+        entry = idempotency_db.get_key(key)
+        if entry is None or entry['state'] == idempotency_db.DONE:
+            return entry
+        time.sleep(0.05)
+    raise IdempotencyConflict('A request with the same idempotency key is still being processed')
+
+
+def run_idempotent(kind, user_id, data, execute):
+    """
+    Run `execute()` -> (response body, HTTP status) unless `data` repeats a recent
+    request, in which case that request's response is returned. Returns (body, status,
+    replayed). Raises IdempotencyConflict when the original is still running after
+    IDEMPOTENCY_WAIT seconds. An exception from `execute()` releases the key, so it
+    must only raise before the order is sent.
+    """
+    identity = request_identity(kind, user_id, data)
+    if identity is None:
+        body, status = execute()
+        return body, status, False
+    key, ttl = identity
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    while True:
+        entry = _cached(key)
+        if entry is not None:
+            _count('replayed')
+            return entry[0], entry[1], True
+
+        with _lock:
+            event = _inflight.get(key)
+            owner = event is None
+            if owner:
+                event = _inflight[key] = threading.Event()
+        if owner:
+            break
+        # Another request in this process has the key: wait for it, then look again
+        if not event.wait(max(0, deadline - time.monotonic())):
+            _count('in_progress')
+            raise IdempotencyConflict('A request with the same idempotency key is still being processed')
+
+    try:
+        try:
+            existing = idempotency_db.claim_key(key, pending_ttl=PENDING_LEASE)
+            if existing is not None and existing['state'] != idempotency_db.DONE:
+                existing = _wait_for_owner(key)
+                if existing is None:
+                    existing = idempotency_db.claim_key(key, pending_ttl=PENDING_LEASE)
+            shared = True
+        except IdempotencyConflict:
+            _count('in_progress')
+            raise
+        except Exception as e:
+            # Without the shared store, still deduplicate within this process
+            print(f"Idempotency store unavailable, deduplicating in this process only: {e}")
+            existing, shared = None, False
+
+        if existing is not None and existing['state'] == idempotency_db.DONE:
+            _remember(key, existing['http_status'], existing['response_data'], existing['expires_at'])
+            _count('replayed')
+            return existing['response_data'], existing['http_status'], True
+        if existing is not None:
+            _count('in_progress')
+            raise IdempotencyConflict('A request with the same idempotency key is still being processed')
+
+        try:
+            body, status = execute()
+        except Exception:
+            if shared:
+                _update_store(idempotency_db.release_key, key)
+            raise
+        _count('executed')
+        if order_not_placed(status):
+            if shared:
+                _update_store(idempotency_db.release_key, key)
+        else:
+            _remember(key, status, body, time.time() + ttl)
+            if shared:
+                _update_store(idempotency_db.complete_key, key, status, body, ttl)
+        return body, status, False
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        event.set()
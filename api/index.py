@@ -7,7 +7,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
 # Initialize Flask application
@@ -69,6 +69,7 @@ try:
         from database.auth_db import init_db as ensure_auth_tables_exists
         from database.master_contract_db import init_db as ensure_master_contract_tables_exists, SymToken
         from database.apilog_db import init_db as ensure_api_log_tables_exists
+        from database.idempotency_db import init_db as ensure_idempotency_tables_exists
         
         with app.app_context():
             print("📊 Creating auth tables...")
@@ -77,6 +78,8 @@ try:
             ensure_master_contract_tables_exists()
             print("📊 Creating API log tables...")
             ensure_api_log_tables_exists()
+            print("📊 Creating idempotency tables...")
+            ensure_idempotency_tables_exists()
             
             # Check if symbols exist, if not download them
             try:
@@ -85,8 +88,8 @@ try:
                 
                 if symbol_count < 100:  # If less than 100 symbols, download fresh data
                     print("🔄 Downloading master contract symbols...")
-                    from database.master_contract_db import master_contract_download
-                    result = master_contract_download()
+                    from database.master_contract_refresh import refresh_master_contract
+                    result = refresh_master_contract(triggered_by='cold start', force=True)
                     print(f"Master contract download result: {result}")
                 else:
                     print("✅ Symbols already exist in database")
@@ -211,9 +214,10 @@ def debug_info():
 def download_symbols():
     """Manual endpoint to download master contract symbols"""
     try:
-        from database.master_contract_db import master_contract_download
+        from database.master_contract_refresh import refresh_master_contract
         print("Starting master contract download...")
-        result = master_contract_download()
+        force = request.args.get('force', '').lower() in ('1', 'true')
+        result = refresh_master_contract(triggered_by='/api/download-symbols', force=force)
         return jsonify({'status': 'success', 'message': 'Master contract download completed', 'result': result})
     except Exception as e:
         print(f"Download error: {e}")
@@ -221,6 +225,30 @@ def download_symbols():
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/download-symbols/status', methods=['GET'])
+def download_symbols_status():
+    """Status and progress of the current or most recent master contract download"""
+    from database.master_contract_refresh import get_master_contract_status
+    return jsonify({'status': 'success', 'data': get_master_contract_status()})
+
+@app.route('/api/broker-scheduler/status', methods=['GET'])
+def broker_scheduler_status():
+    """Outbound broker queue depth, calls sent and wait times per endpoint"""
+    from api.broker_scheduler import get_broker_scheduler_metrics
+    return jsonify({'status': 'success', 'data': get_broker_scheduler_metrics()})
+
+@app.route('/api/execution-lanes/status', methods=['GET'])
+def execution_lanes_status():
+    """Smart order execution lanes: active lanes, queued orders and lane wait times"""
+    from api.order_execution import get_execution_lane_metrics
+    return jsonify({'status': 'success', 'data': get_execution_lane_metrics()})
+
+@app.route('/api/idempotency/status', methods=['GET'])
+def idempotency_status():
+    """Duplicate order suppression: orders executed, repeats replayed and responses cached"""
+    from api.idempotency import get_idempotency_stats
+    return jsonify({'status': 'success', 'data': get_idempotency_stats()})
+
 @app.route('/api/v1/test-webhook', methods=['POST'])
 def test_webhook():
     """Test endpoint to check if webhook is working"""
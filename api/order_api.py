@@ -1,8 +1,12 @@
-import http.client
 import json
 import os
-from database.auth_db import get_auth_token
-from database.token_db import get_token
+from api.broker_client import broker_request
+from api.broker_scheduler import PRIORITY_EXIT
+from api.book_cache import invalidate_books
+from api.bulk_executor import run_bulk, BASKET_MAX_WORKERS
+from api.position_snapshot import get_position_snapshot, record_fill
+from database.auth_db import get_auth_token, get_broker_credentials
+from database.token_db import get_token, get_br_symbol, get_tokens_bulk, get_br_symbols_bulk
 from mapping.transform_data import transform_data , map_product_type, reverse_map_product_type, transform_modify_order_data
 
 
@@ -35,7 +39,6 @@ def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_ke
         return api_key
         
     try:
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
         headers = {
           'Authorization': f'Bearer {auth_token}',
           'Content-Type': 'application/json',
@@ -47,17 +50,39 @@ def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_ke
           'X-MACAddress': 'MAC_ADDRESS',
           'X-PrivateKey': api_key
         }
-        conn.request(method, endpoint, payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        return json.loads(data.decode("utf-8"))
+        res = broker_request(method, endpoint, payload, headers)
+        return res.json()
     except Exception as e:
         print(f"API Error: {str(e)}")
         return {"status": "error", "message": f"API Connection Error: {str(e)}"}
 
-def get_order_book():
+def resolve_order_credentials(user_id=None, auth_token=None, api_key=None):
+    """
+    Resolve the broker auth token and API key for an order call: explicit arguments first,
+    then the Flask session, then the user's cached credentials, then the LOGIN_USERNAME
+    and BROKER_API_KEY fallbacks. Safe to call outside a request, e.g. on worker threads.
+    """
+    from flask import session, has_request_context
+
+    if has_request_context():
+        auth_token = auth_token or session.get('AUTH_TOKEN')
+        api_key = api_key or session.get('apikey')
+
+    if auth_token is None and user_id:
+        credentials = get_broker_credentials(user_id)
+        if credentials:
+            auth_token = credentials.auth_token
+            api_key = api_key or credentials.broker_apikey
+
+    if auth_token is None:
+        auth_token = get_auth_token(os.getenv('LOGIN_USERNAME'))
+    if api_key is None:
+        api_key = os.getenv('BROKER_API_KEY')
+    return auth_token, api_key
+
+def get_order_book(auth_token=None, api_key=None):
     try:
-        return get_api_response("/rest/secure/angelbroking/order/v1/getOrderBook")
+        return get_api_response("/rest/secure/angelbroking/order/v1/getOrderBook", auth_token=auth_token, api_key=api_key)
     except Exception as e:
         print(f"Error in get_order_book: {str(e)}")
         return {"status": "error", "message": str(e)}
@@ -65,58 +90,33 @@ def get_order_book():
 def get_trade_book():
     return get_api_response("/rest/secure/angelbroking/order/v1/getTradeBook")
 
-def get_positions():
-    return get_api_response("/rest/secure/angelbroking/order/v1/getPosition")
+def get_positions(auth_token=None, api_key=None):
+    return get_api_response("/rest/secure/angelbroking/order/v1/getPosition", auth_token=auth_token, api_key=api_key)
 
 def get_holdings():
     return get_api_response("/rest/secure/angelbroking/portfolio/v1/getAllHolding")
 
-def get_open_position(tradingsymbol, exchange, producttype):
-    positions_data = get_positions()
-    net_qty = '0'
-
-    if positions_data and positions_data.get('status') and positions_data.get('data'):
-        for position in positions_data['data']:
-            if position.get('tradingsymbol') == tradingsymbol and position.get('exchange') == exchange and position.get('producttype') == producttype:
-                net_qty = position.get('netqty', '0')
-                break  # Assuming you need the first match
-
-    return net_qty
-
-def place_order_api(data, user_id=None):
-    # Get auth token and API key from session if available
-    from flask import session
-    from database.auth_db import get_auth_tokens, get_user_by_id
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Try session first
-    BROKER_API_KEY = session.get('apikey')
-    
-    # If not in session and user_id provided, get from database
-    if AUTH_TOKEN is None and user_id:
-        # Get user details from database
-        user = get_user_by_id(user_id)
-        if user:
-            # Get auth tokens from database
-            tokens = get_auth_tokens(user.username)
-            if tokens.get('status') == 'success':
-                AUTH_TOKEN = tokens.get('access_token')
-                print(f"✅ Using auth token from database for user: {user.username}")
-            
-            # Get broker API key from user record
-            BROKER_API_KEY = user.apikey
-            print(f"✅ Using broker API key from database for user: {user_id}")
-    
-    # Fallback to environment variables
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    if BROKER_API_KEY is None:
-        BROKER_API_KEY = os.getenv('BROKER_API_KEY')
+def get_open_position(tradingsymbol, exchange, producttype, auth_token=None, api_key=None):
+    """
+    Net quantity of the position as a string, read from the account's shared position
+    snapshot. Returns None when the position book could not be fetched.
+    """
+    auth_token, api_key = resolve_order_credentials(None, auth_token, api_key)
+    snapshot = get_position_snapshot(auth_token, lambda: get_positions(auth_token, api_key))
+    if snapshot is None:
+        return None
+
+    return str(snapshot.net_quantity(tradingsymbol, exchange, producttype))
+
+def place_order_api(data, user_id=None, auth_token=None, broker_api_key=None, priority=None, token=None,
+                    br_symbol=None):
+    # Use credentials resolved by the caller, otherwise the session, the user's cached credentials or the env fallback
+    AUTH_TOKEN, BROKER_API_KEY = resolve_order_credentials(user_id, auth_token, broker_api_key)
         
     data['apikey'] = BROKER_API_KEY
-    token = get_token(data['symbol'], data['exchange'])
-    newdata = transform_data(data, token)  
+    # Callers placing many orders pass the token and broker symbol they looked up in bulk
+    token = token or get_token(data['symbol'], data['exchange'])
+    newdata = transform_data(data, token, br_symbol)  
     headers = {
         'Authorization': f'Bearer {AUTH_TOKEN}',
         'Content-Type': 'application/json',
@@ -145,21 +145,28 @@ def place_order_api(data, user_id=None):
     })
 
     print(payload)
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/placeOrder", payload, headers)
-    res = conn.getresponse()
-    response_data = json.loads(res.read().decode("utf-8"))
+    res = broker_request("POST", "/rest/secure/angelbroking/order/v1/placeOrder", payload, headers, priority=priority)
+    # Placed or rejected, the order shows up in the books, so cached views are out of date
+    invalidate_books(AUTH_TOKEN)
+    response_data = res.json()
     if response_data['status'] == True:
         orderid = response_data['data']['orderid']
+        if newdata.get('ordertype', 'MARKET') == 'MARKET':
+            # Market orders fill straight away, keep the position snapshot in step for smart orders
+            record_fill(AUTH_TOKEN, newdata['tradingsymbol'], newdata['exchange'], newdata.get('producttype', 'INTRADAY'),
+                        newdata['transactiontype'], newdata['quantity'])
     else:
         orderid = None
     return res, response_data, orderid
 
-def place_smartorder_api(data, user_id=None):
+def place_smartorder_api(data, user_id=None, auth_token=None, broker_api_key=None):
 
-    #If no API call is made in this function then res will return None
+    #If no API call is made in this function then res and orderid will return None
     res = None
 
+    # Resolve credentials once, the position lookup and the order must use the same account
+    auth_token, broker_api_key = resolve_order_credentials(user_id, auth_token, broker_api_key)
+
     # Extract necessary info from data
     symbol = data.get("symbol")
     exchange = data.get("exchange")
@@ -168,8 +175,13 @@ def place_smartorder_api(data, user_id=None):
 
     
 
-    # Get current open position for the symbol
-    current_position = int(get_open_position(symbol, exchange, map_product_type(product)))
+    # Get current open position for the symbol, positions are keyed by the broker's trading symbol
+    br_symbol = get_br_symbol(symbol, exchange) or symbol
+    current_position = get_open_position(br_symbol, exchange, map_product_type(product), auth_token, broker_api_key)
+    if current_position is None:
+        # Without the current position the order size can't be worked out, don't guess flat
+        return res, {"status": "error", "message": "Failed to fetch open positions from the broker"}, None
+    current_position = int(current_position)
 
 
     #print(f"position_size : {position_size}") 
@@ -186,15 +198,15 @@ def place_smartorder_api(data, user_id=None):
         quantity = data['quantity']
         #print(f"action : {action}")
         #print(f"Quantity : {quantity}")
-        res, response, orderid = place_order_api(data, user_id=user_id)
+        res, response, orderid = place_order_api(data, user_id=user_id, auth_token=auth_token, broker_api_key=broker_api_key)
         #print(res)
         #print(response)
         
-        return res , response
+        return res , response, orderid
         
     elif position_size == current_position:
         response = {"status": "success", "message": "No action needed. Position size matches current position."}
-        return res, response  # res remains None as no API call was mad
+        return res, response, None  # res remains None as no API call was mad
    
    
 
@@ -227,8 +239,10 @@ def place_smartorder_api(data, user_id=None):
         order_data["quantity"] = str(quantity)
 
         #print(order_data)
-        # Place the order
-        res, response, orderid = place_order_api(order_data, user_id=user_id)
+        # Place the order, flattening a position goes ahead of new entries in the broker queue
+        priority = PRIORITY_EXIT if position_size == 0 else None
+        res, response, orderid = place_order_api(order_data, user_id=user_id, auth_token=auth_token,
+                                                 broker_api_key=broker_api_key, priority=priority)
         #print(res)
         #print(response)
         
@@ -237,61 +251,78 @@ def place_smartorder_api(data, user_id=None):
 
 
 
-def close_all_positions(current_api_key):
-    # Fetch the current open positions
-    positions_response = get_positions()
+def _mark_timeouts_pending(report, message):
+    """Report items without a response in time as pending: the broker may still carry them out."""
+    for result in report['results']:
+        if result['status'] == 'timeout':
+            result['status'] = 'pending'
+            result['response'] = {'message': message}
+    return report
 
-    # Check if the positions data is null or empty
-    if positions_response['data'] is None or not positions_response['data']:
-        return {"message": "No Open Positions Found"}, 200
 
-    if positions_response['status']:
-        # Loop through each position to close
-        for position in positions_response['data']:
-            # Skip if net quantity is zero
-            if int(position['netqty']) == 0:
-                continue
+def close_all_positions(current_api_key, auth_token=None, broker_api_key=None):
+    # Resolve credentials once here, the orders are placed from worker threads without a session
+    auth_token, broker_api_key = resolve_order_credentials(None, auth_token, broker_api_key)
 
-            # Determine action based on net quantity
-            action = 'SELL' if int(position['netqty']) > 0 else 'BUY'
-            quantity = abs(int(position['netqty']))
-
-            # Prepare the order payload
-            place_order_payload = {
-                "apikey": current_api_key,
-                "strategy": "Squareoff",
-                "symbol": position['tradingsymbol'],
-                "action": action,
-                "exchange": position['exchange'],
-                "pricetype": "MARKET",
-                "product": reverse_map_product_type(position['producttype']),
-                "quantity": str(quantity)
-            }
-
-            print(place_order_payload)
-
-            # Place the order to close the position
-            _, api_response, _ =   place_order_api(place_order_payload)
-
-            print(api_response)
-            
-            # Note: Ensure place_order_api handles any errors and logs accordingly
+    # Fetch the current open positions
+    positions_response = get_positions(auth_token, broker_api_key)
 
-    return {'status': 'success', "message": "All Open Positions SquaredOff"}, 200
+    # Check if the positions data is null or empty
+    if positions_response.get('data') is None or not positions_response['data']:
+        return {"message": "No Open Positions Found"}, 200
 
+    if not positions_response['status']:
+        return {'status': 'error', 'message': positions_response.get('message', 'Failed to fetch positions')}, 500
+
+    # Skip positions whose net quantity is zero
+    open_positions = [position for position in positions_response['data'] if int(position['netqty']) != 0]
+
+    def square_off(position):
+        # Determine action based on net quantity
+        action = 'SELL' if int(position['netqty']) > 0 else 'BUY'
+        quantity = abs(int(position['netqty']))
+
+        # Prepare the order payload
+        place_order_payload = {
+            "apikey": current_api_key,
+            "strategy": "Squareoff",
+            "symbol": position['tradingsymbol'],
+            "action": action,
+            "exchange": position['exchange'],
+            "pricetype": "MARKET",
+            "product": reverse_map_product_type(position['producttype']),
+            "quantity": str(quantity)
+        }
 
-def cancel_order(orderid):
-    # Get auth token and API key from session if available
-    from flask import session
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Changed from 'auth_token' to 'AUTH_TOKEN'
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    api_key = session.get('apikey')  # Changed from 'api_key' to 'apikey'
-    if api_key is None:
-        api_key = os.getenv('BROKER_API_KEY')
+        # Place the order to close the position
+        res, api_response, orderid = place_order_api(place_order_payload, auth_token=auth_token,
+                                                     broker_api_key=broker_api_key, priority=PRIORITY_EXIT)
+        ok = res.status == 200 and orderid is not None
+        return ok, {'orderid': orderid} if ok else {'message': api_response.get('message', 'Failed to place order')}
+
+    def describe(position):
+        return {'symbol': position['tradingsymbol'], 'exchange': position['exchange'],
+                'product': reverse_map_product_type(position['producttype']), 'netqty': position['netqty']}
+
+    report = _mark_timeouts_pending(run_bulk(open_positions, square_off, describe),
+                                    'No response in time, check the positions before squaring off again')
+    print(f"Close all positions: {report['succeeded']}/{report['total']} squared off in {report['elapsed_ms']}ms")
+
+    if report['succeeded'] == report['total']:
+        return {'status': 'success', "message": "All Open Positions SquaredOff", 'report': report}, 200
+    message = f"Squared off {report['succeeded']} of {report['total']} positions"
+    if report['timed_out']:
+        message += f", {report['timed_out']} pending"
+    response = {'status': 'error', 'message': message, 'report': report}
+    if report['succeeded']:
+        return response, 200
+    # Nothing squared off: 504 when orders may still be live, 502 when all failed
+    return response, 504 if report['timed_out'] else 502
+
+
+def cancel_order(orderid, auth_token=None, api_key=None, priority=None):
+    # Use credentials passed by the caller, otherwise the session or the env fallback
+    AUTH_TOKEN, api_key = resolve_order_credentials(None, auth_token, api_key)
     
     # Set up the request headers
     headers = {
@@ -312,11 +343,10 @@ def cancel_order(orderid):
         "orderid": orderid,
     })
     
-    # Establish the connection and send the request
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")  # Adjust the URL as necessary
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/cancelOrder", payload, headers)
-    res = conn.getresponse()
-    data = json.loads(res.read().decode("utf-8"))
+    # Send the request over the pooled broker connection
+    res = broker_request("POST", "/rest/secure/angelbroking/order/v1/cancelOrder", payload, headers, priority=priority)
+    invalidate_books(AUTH_TOKEN)
+    data = res.json()
     
     # Check if the request was successful
     if data.get("status"):
@@ -327,18 +357,9 @@ def cancel_order(orderid):
         return {"status": "error", "message": data.get("message", "Failed to cancel order")}, res.status
 
 
-def modify_order(data):
-    # Get auth token and API key from session if available
-    from flask import session
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Changed from 'auth_token' to 'AUTH_TOKEN'
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    api_key = session.get('apikey')  # Changed from 'api_key' to 'apikey'
-    if api_key is None:
-        api_key = os.getenv('BROKER_API_KEY')
+def modify_order(data, auth_token=None, api_key=None):
+    # Use credentials passed by the caller, otherwise the session or the env fallback
+    AUTH_TOKEN, api_key = resolve_order_credentials(None, auth_token, api_key)
 
     token = get_token(data['symbol'], data['exchange'])
     transformed_data = transform_modify_order_data(data, token)  # You need to implement this function
@@ -356,10 +377,9 @@ def modify_order(data):
     }
     payload = json.dumps(transformed_data)
 
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/modifyOrder", payload, headers)
-    res = conn.getresponse()
-    data = json.loads(res.read().decode("utf-8"))
+    res = broker_request("POST", "/rest/secure/angelbroking/order/v1/modifyOrder", payload, headers)
+    invalidate_books(AUTH_TOKEN)
+    data = res.json()
 
     if data.get("status") == "true" or data.get("message") == "SUCCESS":
         return {"status": "success", "orderid": data["data"]["orderid"]}, 200
@@ -368,28 +388,65 @@ def modify_order(data):
 
 
 
-def cancel_all_orders_api(data):
+def cancel_all_orders_api(data, auth_token=None, api_key=None):
+    # Resolve credentials once here, the cancellations run on worker threads without a session
+    auth_token, api_key = resolve_order_credentials(None, auth_token, api_key)
+
     # Get the order book
-    order_book_response = get_order_book()
+    order_book_response = get_order_book(auth_token, api_key)
     #print(order_book_response)
     if order_book_response['status'] != True:
-        return [], []  # Return empty lists indicating failure to retrieve the order book
+        return [], [], [], None  # Return empty lists indicating failure to retrieve the order book
 
     # Filter orders that are in 'open' or 'trigger_pending' state
-    orders_to_cancel = [order for order in order_book_response.get('data', [])
+    orders_to_cancel = [order for order in (order_book_response.get('data') or [])
                         if order['status'] in ['open', 'trigger pending']]
     #print(orders_to_cancel)
-    canceled_orders = []
-    failed_cancellations = []
-
-    # Cancel the filtered orders
-    for order in orders_to_cancel:
-        orderid = order['orderid']
-        cancel_response, status_code = cancel_order(orderid)
-        if status_code == 200:
-            canceled_orders.append(orderid)
-        else:
-            failed_cancellations.append(orderid)
-    
-    return canceled_orders, failed_cancellations
 
+    def cancel(order):
+        cancel_response, status_code = cancel_order(order['orderid'], auth_token, api_key, priority=PRIORITY_EXIT)
+        return status_code == 200, cancel_response
+
+    # Cancel the filtered orders concurrently
+    report = _mark_timeouts_pending(run_bulk(orders_to_cancel, cancel, lambda order: {'orderid': order['orderid']}),
+                                    'No response in time, check the order book before cancelling again')
+
+    def orderids(status):
+        return [result['item']['orderid'] for result in report['results'] if result['status'] == status]
+
+    return orderids('success'), orderids('error'), orderids('pending'), report
+
+
+def resolve_order_symbols(orders):
+    """
+    Look up the token and broker symbol of every order in one pass. Returns a dict of
+    (symbol, exchange) -> (token, brsymbol) and the list of pairs that are not known.
+    """
+    pairs = {(order['symbol'], order['exchange']) for order in orders}
+    tokens = get_tokens_bulk(pairs)
+    br_symbols = get_br_symbols_bulk(pairs)
+    resolved = {pair: (tokens[pair], br_symbols.get(pair)) for pair in pairs if pair in tokens}
+    unknown = sorted(pair for pair in pairs if pair not in resolved)
+    return resolved, unknown
+
+def place_basket_order_api(orders, symbols, auth_token=None, broker_api_key=None):
+    """
+    Place the legs of a basket concurrently, at most BASKET_MAX_WORKERS at a time, and
+    return the run_bulk report with the legs in request order. `symbols` comes from
+    resolve_order_symbols, so no leg looks up its symbol again.
+    """
+    # Resolve credentials once here, the legs are placed from worker threads without a session
+    auth_token, broker_api_key = resolve_order_credentials(None, auth_token, broker_api_key)
+
+    def place(order):
+        token, br_symbol = symbols[(order['symbol'], order['exchange'])]
+        res, api_response, orderid = place_order_api(dict(order), auth_token=auth_token, broker_api_key=broker_api_key,
+                                                     token=token, br_symbol=br_symbol)
+        ok = res.status == 200 and orderid is not None
+        return ok, {'orderid': orderid} if ok else {'message': api_response.get('message', 'Failed to place order')}
+
+    def describe(order):
+        return {'symbol': order['symbol'], 'exchange': order['exchange'], 'action': order['action'],
+                'quantity': order['quantity']}
+
+    return run_bulk(orders, place, describe, max_workers=BASKET_MAX_WORKERS)
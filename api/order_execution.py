@@ -0,0 +1,281 @@
+# api/order_execution.py
+
+"""
+Execution of webhook orders (placeorder, placesmartorder), in the request or queued.
+
+execute_order runs an order against the broker and turns the outcome into the API
+response, emitting the order event and writing the order log, exactly as the routes
+always have. With ORDER_EXECUTION_MODE=queued the routes only validate the request
+and store it in the durable order queue (database.order_queue_db), returning an
+acknowledgement id at once; a pool of executor threads in each worker process
+drains the queue through execute_order and records each outcome for /orderstatus.
+
+Smart orders size themselves from the current position, so two alerts for the same
+(user, symbol, exchange, product) must not run at once: both would read the same
+position and double the trade. They run in per-key execution lanes, one at a time in
+arrival order, while other keys proceed in parallel. In queued mode the queue also
+holds back an order until the ones ahead of it on its lane have finished, which
+keeps lanes ordered across worker processes.
+"""
+
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+from api.broker_scheduler import BrokerQueueTimeout
+from api.order_api import place_order_api, place_smartorder_api
+from database.apilog_db import async_log_order
+from database import order_queue_db
+from extensions import socketio
+from utils.execution_lanes import ExecutionLanes
+
+load_dotenv()
+
+# 'sync' places orders inside the request, 'queued' acknowledges them and places them in the background
+ORDER_EXECUTION_MODE = os.getenv('ORDER_EXECUTION_MODE', 'sync').lower()
+# Executor threads per worker process
+ORDER_QUEUE_WORKERS = int(os.getenv('ORDER_QUEUE_WORKERS', '4'))
+# How often idle executors look for orders queued by other worker processes
+ORDER_QUEUE_POLL_MS = int(os.getenv('ORDER_QUEUE_POLL_MS', '200'))
+# Orders still queued after this many seconds are expired instead of sent; 0 never expires them
+ORDER_QUEUE_MAX_AGE = float(os.getenv('ORDER_QUEUE_MAX_AGE', '60'))
+# Finished orders are kept this long for /orderstatus
+ORDER_QUEUE_RETENTION_HOURS = float(os.getenv('ORDER_QUEUE_RETENTION_HOURS', '24'))
+# Seconds a claimed order stays leased to its process without a renewal; renewed every third of it
+ORDER_QUEUE_LEASE = float(os.getenv('ORDER_QUEUE_LEASE', '30'))
+# Smart orders running at once per worker process, each on its own (user, symbol, exchange, product) lane
+EXECUTION_LANE_WORKERS = int(os.getenv('EXECUTION_LANE_WORKERS', '16'))
+
+_lanes = None
+_lanes_lock = threading.Lock()
+
+
+def get_execution_lanes():
+    global _lanes
+    if _lanes is None:
+        with _lanes_lock:
+            if _lanes is None:
+                _lanes = ExecutionLanes(EXECUTION_LANE_WORKERS, name='smart-order-lane')
+    return _lanes
+
+
+def get_execution_lane_metrics():
+    return get_execution_lanes().metrics()
+
+
+def order_lane_key(kind, user_id, data):
+    """The execution lane of an order, or None for orders that do not depend on the position."""
+    if kind != 'placesmartorder':
+        return None
+    return ':'.join(str(part or '').upper() for part in
+                    (user_id, data.get('exchange'), data.get('symbol'), data.get('product')))
+
+
+def execute_order(kind, data, user_id=None, auth_token=None, broker_api_key=None, log=async_log_order):
+    """
+    Place a placeorder or placesmartorder request and return (response body, HTTP status).
+    `log(api_type, request_data, response_data)` writes the order log for placed orders;
+    smart orders wait for their execution lane and log from its thread, so `log` must not
+    need the request context.
+    """
+    lane_key = order_lane_key(kind, user_id, data)
+    if lane_key is not None:
+        return get_execution_lanes().run(lane_key, _execute_order, kind, data, user_id, auth_token, broker_api_key, log)
+    return _execute_order(kind, data, user_id, auth_token, broker_api_key, log)
+
+
+def _write_log(log, api_type, request_data, response_data):
+    try:
+        log(api_type, request_data, response_data)
+    except Exception as e:
+        # The order is placed, a failing order log must not report it as failed
+        print(f"Error writing {api_type} order log: {e}")
+
+
+def _execute_order(kind, data, user_id, auth_token, broker_api_key, log):
+    request_data = {key: value for key, value in data.items() if key != 'apikey'}
+    try:
+        if kind == 'placesmartorder':
+            res, response_data, order_id = place_smartorder_api(data, user_id=user_id, auth_token=auth_token,
+                                                                broker_api_key=broker_api_key)
+            print(f'placesmartorder response: {response_data} and orderid is {order_id}')
+
+            if res is None and response_data.get('status') == 'error':
+                return {'status': 'error', 'message': response_data.get('message')}, 502
+
+            if res is None and response_data.get('message'):
+                # Nothing to send, the position already matches
+                order_response_data = {'status': 'success', 'message': response_data.get('message')}
+                _write_log(log, 'placesmartorder', request_data, order_response_data)
+                return order_response_data, 200
+        else:
+            res, response_data, order_id = place_order_api(data, user_id=user_id, auth_token=auth_token,
+                                                           broker_api_key=broker_api_key)
+            print(f'placeorder response : {response_data} and orderid is {order_id}')
+
+        # A 200 with status false is the broker turning the order down, nothing was placed
+        if res.status == 200 and response_data.get('status') is not False:
+            event_data = {'symbol': data['symbol'], 'action': data['action'], 'orderid': order_id}
+            print(f'🔔 Emitting order_event via SocketIO: {event_data}')
+            try:
+                socketio.emit('order_event', event_data)
+            except Exception as e:
+                # The order is placed, a dashboard notification failing must not report it as failed
+                print(f"Error emitting order_event: {e}")
+
+            if order_id:
+                order_response_data = {'status': 'success', 'orderid': order_id}
+                _write_log(log, 'placeorder', request_data, order_response_data)
+                return order_response_data, 200
+
+            # In case 'orderid' is not in the 'data'
+            return {'status': 'error', 'message': 'Order placed but order ID not found in response',
+                    'details': response_data}, 500
+
+        # Use the API's status code, unless it's 200 but the broker turned the order down
+        message = response_data.get('message', 'Failed to place order')
+        return {'status': 'error', 'message': message}, res.status if res.status != 200 else 502
+
+    except BrokerQueueTimeout as e:
+        # The broker's rate limit queue was too long to send the order in time
+        return {'status': 'error', 'message': str(e)}, 429
+    except KeyError:
+        return {'status': 'error', 'message': 'A required field is missing from the request'}, 400
+    except Exception as e:
+        print(f"Error executing {kind}: {e}")
+        return {'status': 'error', 'message': 'An unexpected error occurred'}, 500
+
+
+class OrderExecutor:
+    """
+    Threads that take orders from the durable queue and execute them, oldest first.
+
+    Started lazily in each worker process (and again after a fork). Orders accepted by
+    this process wake an executor at once; orders accepted by other processes are
+    picked up within `poll_interval` seconds. A heartbeat thread renews the lease of
+    the orders this process is running and marks orders whose lease lapsed, left
+    running by a dead process, interrupted rather than sending them again.
+    """
+
+    def __init__(self, workers=ORDER_QUEUE_WORKERS, poll_interval=ORDER_QUEUE_POLL_MS / 1000,
+                 max_age=ORDER_QUEUE_MAX_AGE, retention=ORDER_QUEUE_RETENTION_HOURS * 3600, lease=ORDER_QUEUE_LEASE):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_age = max_age or None
+        self.retention = retention
+        self.lease = lease
+        self.stats = {'executed': 0, 'succeeded': 0, 'failed': 0, 'errors': 0, 'recovered': 0}
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeups = threading.Condition()
+        self._pending = 0
+        self._threads = []
+        self._pid = None
+        self._last_prune = 0
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def start(self):
+        if self._pid == os.getpid() and self._threads:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            order_queue_db.init_db()
+            self._recover()
+            self._pid = os.getpid()
+            self._threads = [threading.Thread(target=self._run, name=f'order-executor-{i}', daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._heartbeat, name='order-executor-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def notify(self):
+        with self._wakeups:
+            self._pending += 1
+            self._wakeups.notify()
+
+    def _wait(self):
+        with self._wakeups:
+            if not self._pending:
+                self._wakeups.wait(self.poll_interval)
+            self._pending = max(0, self._pending - 1)
+
+    def _recover(self):
+        recovered = order_queue_db.recover_interrupted_orders(self.lease)
+        if recovered:
+            print(f"Marked {recovered} orders interrupted by a process that is gone")
+            self._count('recovered', recovered)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                order_queue_db.renew_leases(self.lease)
+                self._recover()
+            except Exception as e:
+                self._count('errors')
+                print(f"Error renewing order leases: {e}")
+
+    def _execute(self, order):
+        def log(api_type, request_data, response_data):
+            # Latency of a queued order runs from its acceptance, queue time included
+            async_log_order(api_type, request_data, response_data,
+                            round((time.time() - order['created_at']) * 1000, 3))
+
+        body, status = execute_order(order['kind'], dict(order['request_data']), user_id=order['user_id'], log=log)
+        order_queue_db.finish_order(order['id'], status, body)
+        self._count('executed')
+        self._count('succeeded' if status < 400 else 'failed')
+
+    def _run(self):
+        while True:
+            try:
+                order = order_queue_db.claim_next_order(self.max_age, self.lease)
+                if order is None:
+                    self._prune()
+                    self._wait()
+                    continue
+                self._execute(order)
+            except Exception as e:
+                self._count('errors')
+                print(f"Error in order executor: {e}")
+                time.sleep(self.poll_interval)
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+        order_queue_db.prune_finished_orders(self.retention)
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = order_queue_db.queue_depth()
+        stats['workers'] = self.workers if self._pid == os.getpid() and self._threads else 0
+        return stats
+
+
+order_executor = OrderExecutor()
+
+
+def queued_execution_enabled():
+    return ORDER_EXECUTION_MODE == 'queued'
+
+
+def accept_order(kind, user_id, request_data):
+    """Store a validated order in the durable queue and return the acknowledgement body."""
+    order_executor.start()
+    ack_id = order_queue_db.enqueue_order(kind, user_id, request_data, order_lane_key(kind, user_id, request_data))
+    order_executor.notify()
+    return {'status': 'success', 'ackid': ack_id, 'state': order_queue_db.QUEUED}
+
+
+def start_order_executor():
+    """Start draining the queue at startup, so orders accepted before a restart are not left waiting."""
+    if queued_execution_enabled():
+        order_executor.start()
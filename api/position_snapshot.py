@@ -0,0 +1,100 @@
+# api/position_snapshot.py
+
+"""
+Short-lived snapshot of an account's position book, shared by smart orders.
+
+A burst of smart-order alerts would otherwise download the whole position book once
+per alert. Snapshots are cached per account for POSITION_SNAPSHOT_TTL seconds,
+concurrent callers share one in-flight fetch, and positions are indexed by
+(tradingsymbol, exchange, producttype) so a lookup is a dict access. Orders placed
+while a snapshot is live are applied to it optimistically, so the next alert in the
+same burst sees the position the previous one produced.
+"""
+
+import os
+import threading
+import time
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# Seconds a position book fetched from the broker is reused by later smart orders
+POSITION_SNAPSHOT_TTL = float(os.getenv('POSITION_SNAPSHOT_TTL', '0.5'))
+
+_snapshots = TTLCache(maxsize=256, ttl=POSITION_SNAPSHOT_TTL) if POSITION_SNAPSHOT_TTL > 0 else None
+_lock = threading.Lock()
+_flight = SingleFlight()
+_fill_counts = {}  # account -> orders recorded, to spot fills that race a fetch
+
+
+class PositionSnapshot:
+    """Net quantities of one account's positions, keyed by (tradingsymbol, exchange, producttype)."""
+
+    def __init__(self, positions):
+        self.fetched_at = time.monotonic()
+        self.net = {}
+        for position in positions or []:
+            key = (position.get('tradingsymbol'), position.get('exchange'), position.get('producttype'))
+            self.net[key] = self.net.get(key, 0) + int(position.get('netqty') or 0)
+
+    def net_quantity(self, tradingsymbol, exchange, producttype):
+        return self.net.get((tradingsymbol, exchange, producttype), 0)
+
+    def apply_fill(self, tradingsymbol, exchange, producttype, quantity):
+        """Add a signed filled quantity (positive for buys) to the position."""
+        key = (tradingsymbol, exchange, producttype)
+        with _lock:
+            self.net[key] = self.net.get(key, 0) + quantity
+
+
+def _fetch(account, fetch_positions):
+    with _lock:
+        fills_before = _fill_counts.get(account, 0)
+    response = fetch_positions()
+    # Broker responses carry status true, connection and rate limit errors status 'error'
+    if not response or response.get('status') is not True:
+        # Not cached, the next caller retries the broker
+        return None
+    snapshot = PositionSnapshot(response.get('data'))
+    if _snapshots is not None:
+        with _lock:
+            # An order placed during the fetch may be missing from this book, so don't reuse it
+            if _fill_counts.get(account, 0) == fills_before:
+                _snapshots[account] = snapshot
+    return snapshot
+
+
+def get_position_snapshot(account, fetch_positions):
+    """
+    Return the PositionSnapshot for `account` (any key unique to the broker session, such
+    as its auth token), calling `fetch_positions()` for a fresh position book when the
+    cached one has expired. Returns None when the position book could not be fetched.
+    """
+    if _snapshots is not None:
+        with _lock:
+            snapshot = _snapshots.get(account)
+        if snapshot is not None:
+            return snapshot
+    return _flight.do(account, _fetch, account, fetch_positions)
+
+
+def record_fill(account, tradingsymbol, exchange, producttype, action, quantity):
+    """Apply an order assumed filled to the account's live snapshot, if there is one."""
+    if _snapshots is None:
+        return
+    with _lock:
+        _fill_counts[account] = _fill_counts.get(account, 0) + 1
+        snapshot = _snapshots.get(account)
+    if snapshot is not None:
+        signed = int(quantity) if action.upper() == 'BUY' else -int(quantity)
+        snapshot.apply_fill(tradingsymbol, exchange, producttype, signed)
+
+
+def invalidate_position_snapshot(account):
+    """Drop the account's snapshot so the next smart order fetches the position book again."""
+    if _snapshots is None:
+        return
+    with _lock:
+        _snapshots.pop(account, None)
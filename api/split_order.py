@@ -0,0 +1,148 @@
+# api/split_order.py
+
+"""
+Split orders: one parent order sliced into child orders the exchange will accept.
+
+F&O orders above the exchange freeze quantity of their underlying are rejected
+whole. plan_split cuts the parent quantity into children of at most the freeze
+limit (or a smaller `splitsize` asked for), each a whole number of lots from the
+symbol's lotsize in symtoken. place_split_order sends the children concurrently
+through run_bulk, so the outbound broker rate limiter paces them, and folds their
+outcomes into a single parent result. A child without a response in time may still
+be placed, so it is reported as pending, never as failed quantity to send again.
+"""
+
+import os
+from dotenv import load_dotenv
+
+from api.bulk_executor import run_bulk, SPLIT_ORDER_MAX_WORKERS
+from api.order_api import place_order_api, resolve_order_credentials
+from database.token_db import get_symbol_details
+
+load_dotenv()
+
+# Largest quantity the exchange accepts in one order, per underlying ("NAME=quantity,..."); update as
+# the exchanges revise them. Extra entries, e.g. for stock derivatives, are added the same way.
+DEFAULT_FREEZE_LIMITS = 'NIFTY=1800,BANKNIFTY=900,FINNIFTY=1800,MIDCPNIFTY=2800,NIFTYNXT50=600,SENSEX=1000,BANKEX=900'
+FREEZE_LIMITS = os.getenv('FREEZE_LIMITS', DEFAULT_FREEZE_LIMITS)
+# Split orders producing more child orders than this are refused
+SPLIT_ORDER_MAX_CHILDREN = int(os.getenv('SPLIT_ORDER_MAX_CHILDREN', '100'))
+
+# Exchanges whose orders are subject to the freeze limits
+FREEZE_LIMIT_EXCHANGES = {'NFO', 'BFO'}
+
+
+def parse_freeze_limits(spec):
+    """Parse "NAME=quantity,..." into a dict of underlying name to freeze limit."""
+    limits = {}
+    for item in (spec or '').split(','):
+        name, _, quantity = item.strip().partition('=')
+        if name and quantity:
+            limits[name.strip().upper()] = int(quantity)
+    return limits
+
+
+_freeze_limits = parse_freeze_limits(FREEZE_LIMITS)
+
+
+def get_freeze_limit(name, exchange):
+    """The freeze limit of an underlying on an exchange, or None when no limit applies or is known."""
+    if exchange not in FREEZE_LIMIT_EXCHANGES or not name:
+        return None
+    return _freeze_limits.get(name.upper())
+
+
+def plan_split(quantity, lotsize=None, freeze_limit=None, splitsize=None):
+    """
+    Child quantities for a parent `quantity`: as many children of the largest allowed
+    size as fit, then one with the remainder. Raises ValueError when the order cannot
+    be split into valid children.
+    """
+    lotsize = lotsize if lotsize and lotsize > 1 else 1
+    if quantity <= 0:
+        raise ValueError('quantity must be greater than zero')
+    if quantity % lotsize:
+        raise ValueError(f'quantity must be a multiple of the lot size {lotsize}')
+
+    limits = [limit for limit in (freeze_limit, splitsize) if limit]
+    if not limits:
+        raise ValueError('No freeze limit is known for this symbol, send a splitsize')
+    child = min(limits) // lotsize * lotsize
+    if child <= 0:
+        raise ValueError(f'splitsize must be at least the lot size {lotsize}')
+
+    children = [child] * (quantity // child)
+    if quantity % child:
+        children.append(quantity % child)
+    if len(children) > SPLIT_ORDER_MAX_CHILDREN:
+        raise ValueError(f'The order would be split into {len(children)} orders, '
+                         f'more than the limit of {SPLIT_ORDER_MAX_CHILDREN}')
+    return children
+
+
+def split_order_children(data):
+    """
+    The child order requests of a split order request, each a copy of it with its own
+    quantity, and the symbol details they were planned from. Raises ValueError when the
+    symbol is unknown or the quantities are invalid.
+    """
+    details = get_symbol_details(data['symbol'], data['exchange'])
+    if details is None:
+        raise ValueError(f"Unknown symbol: {data['symbol']} ({data['exchange']})")
+    try:
+        quantity = int(data['quantity'])
+        splitsize = int(data['splitsize']) if data.get('splitsize') else None
+    except (TypeError, ValueError):
+        raise ValueError('quantity and splitsize must be whole numbers')
+
+    quantities = plan_split(quantity, details['lotsize'], get_freeze_limit(details['name'], data['exchange']),
+                            splitsize)
+    fields = {key: value for key, value in data.items() if key not in ('apikey', 'splitsize', 'idempotency_key')}
+    return [{**fields, 'quantity': str(child)} for child in quantities], details
+
+
+def place_split_order(children, details, auth_token=None, broker_api_key=None):
+    """
+    Place the child orders concurrently, at most SPLIT_ORDER_MAX_WORKERS at a time, and
+    return the parent result with the outcome of every child in order: success, error
+    or pending (no response in time, the order may be live).
+    """
+    # Resolve credentials once here, the children are placed from worker threads without a session
+    auth_token, broker_api_key = resolve_order_credentials(None, auth_token, broker_api_key)
+
+    def place(child):
+        res, api_response, orderid = place_order_api(dict(child), auth_token=auth_token, broker_api_key=broker_api_key,
+                                                     token=details['token'], br_symbol=details['brsymbol'])
+        ok = res.status == 200 and orderid is not None
+        return ok, {'orderid': orderid} if ok else {'message': api_response.get('message', 'Failed to place order')}
+
+    report = run_bulk(children, place, lambda child: {'quantity': child['quantity']},
+                      max_workers=SPLIT_ORDER_MAX_WORKERS)
+    results = []
+    for result in report['results']:
+        if result['status'] == 'timeout':
+            # The broker call is still running and may yet place the child
+            results.append({**result['item'], 'status': 'pending',
+                            'message': 'No response in time, check the order book before sending it again'})
+        else:
+            results.append({**result['item'], 'status': result['status'], **result['response']})
+
+    def quantity(status):
+        return sum(int(result['quantity']) for result in results if result['status'] == status)
+
+    placed, pending, failed = quantity('success'), quantity('pending'), quantity('error')
+    total = placed + pending + failed
+    message = f'Placed {report["succeeded"]} of {report["total"]} orders for {placed} of {total}'
+    if pending:
+        message += f', {pending} pending'
+    return {
+        'status': 'success' if placed == total else 'error',
+        'message': message,
+        'quantity': total,
+        'placed_quantity': placed,
+        'pending_quantity': pending,
+        'failed_quantity': failed,
+        'orderids': [result['orderid'] for result in results if result['status'] == 'success'],
+        'results': results,
+        'elapsed_ms': report['elapsed_ms'],
+    }
@@ -18,6 +18,7 @@ from database.db import db
 from database.auth_db import init_db as ensure_auth_tables_exists
 from database.master_contract_db import init_db as ensure_master_contract_tables_exists
 from database.apilog_db import init_db as ensure_api_log_tables_exists
+from database.idempotency_db import init_db as ensure_idempotency_tables_exists
 
 from utils.colored_logger import logger
 from dotenv import load_dotenv
@@ -149,6 +150,24 @@ if __name__ == '__main__':
         ensure_api_log_tables_exists()
         logger.success("API Log DB initialized successfully")
 
+        logger.database("Initializing Idempotency DB...")
+        ensure_idempotency_tables_exists()
+        logger.success("Idempotency DB initialized successfully")
+
+    # Load the in-memory symbol lookup and search indexes in the background
+    from database.token_db import warm_symbol_index
+    from database.symbol_search import warm_search_index
+    warm_symbol_index()
+    warm_search_index()
+
+    # Move order logs past the retention window to the archive in the background
+    from database.order_log_retention import start_order_log_retention
+    start_order_log_retention()
+
+    # Drain webhook orders accepted before a restart when queued execution is on
+    from api.order_execution import start_order_executor
+    start_order_executor()
+
     logger.server("Starting Flask-SocketIO server...")
     logger.info("Server will be available at: http://127.0.0.1:5000")
     logger.success("All systems ready! 🎉")
@@ -0,0 +1,118 @@
+"""
+Benchmark: placing a basket as one /basketorder vs one /placeorder per leg.
+
+Sends a basket of N legs against a stub broker with a fixed latency, first as N
+/placeorder webhooks one after another (as a strategy looping over its legs does),
+then as a single /basketorder. Reports the time until every leg is placed, the
+symbol lookups made and the order log write transactions. Every leg must be placed,
+in both cases with its own order id.
+
+Usage: python benchmarks/bench_basket_order.py [legs] [latency_ms]
+"""
+import os
+import sys
+import json
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='basket_order_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}/algo.db"
+
+from flask import Flask
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+import blueprints.api_v1 as api_v1
+import database.token_db as token_db
+from api.broker_client import BrokerResponse
+from database.apilog_db import init_db as init_log_db, order_log_writer
+from database.auth_db import ApiKeyIdentity
+from database.idempotency_db import init_db as init_idempotency_db
+from extensions import socketio
+
+lookups = {'single': 0, 'bulk': 0}
+
+
+class StubPool:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def stub_symbols():
+    def single(symbol, exchange):
+        lookups['single'] += 1
+        return symbol
+
+    def bulk(pairs):
+        lookups['bulk'] += 1
+        return {pair: pair[0] for pair in pairs}
+
+    order_api.get_token = single
+    order_api.transform_data.__globals__['get_br_symbol'] = single
+    order_api.get_tokens_bulk = bulk
+    order_api.get_br_symbols_bulk = bulk
+
+
+def measure(label, send, legs):
+    lookups.update(single=0, bulk=0)
+    batches = order_log_writer.get_stats()['batches']
+    broker_scheduler._scheduler = None
+    start = time.perf_counter()
+    order_ids = send()
+    elapsed = time.perf_counter() - start
+    order_log_writer.flush(10)
+    writes = order_log_writer.get_stats()['batches'] - batches
+    print(f"  {label:<12} {elapsed * 1000:8.0f} ms  symbol lookups {lookups['single']} single, "
+          f"{lookups['bulk']} bulk  log writes {writes}")
+    assert len(order_ids) == legs and all(order_ids), "a leg was not placed"
+    assert len(set(order_ids)) == legs, "legs share an order id"
+
+
+def main():
+    legs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 150) / 1000
+
+    init_log_db()
+    init_idempotency_db()
+    broker_client.get_broker_pool = lambda host=None, port=None: StubPool(latency)
+    stub_symbols()
+    identity = ApiKeyIdentity('user1', 'user1', False, 'broker-key', 'jwt', 'feed')
+    api_v1.authenticate_login_user = lambda api_key: identity
+    order_api.get_broker_credentials = lambda user_id: None
+    order_api.get_auth_token = lambda name: 'jwt'
+    # Leave the first pass's log writes out of the second pass's count
+    order_log_writer.flush_interval = 0.05
+
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.api_v1_bp)
+    socketio.init_app(app)
+    client = app.test_client()
+    print(f"{legs} legs, {latency * 1000:.0f} ms broker latency")
+
+    def orders(run):
+        return [{'symbol': f'SYM{i}{run}', 'exchange': 'NSE', 'action': 'BUY' if i % 2 else 'SELL', 'quantity': '1',
+                 'pricetype': 'MARKET', 'product': 'MIS'} for i in range(legs)]
+
+    def per_leg():
+        return [client.post('/api/v1/placeorder', json={'apikey': 'key', 'strategy': 'bench', **order})
+                .get_json().get('orderid') for order in orders('A')]
+
+    def basket():
+        body = client.post('/api/v1/basketorder',
+                           json={'apikey': 'key', 'strategy': 'bench', 'orders': orders('B')}).get_json()
+        return [result.get('orderid') for result in body['results']]
+
+    measure('placeorder', per_leg, legs)
+    measure('basketorder', basket, legs)
+
+
+if __name__ == '__main__':
+    main()
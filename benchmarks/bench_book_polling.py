@@ -0,0 +1,92 @@
+"""
+Benchmark: dashboard tabs polling the order book through the book cache.
+
+Several tabs poll /orderbook concurrently against a stub broker with a fixed latency
+(the outbound rate limits still apply, getOrderBook is 1/s), sending back the ETag
+they last saw. Reports broker calls, 304 responses and bytes
+sent, with the cache disabled and enabled.
+
+Usage: python benchmarks/bench_book_polling.py [tabs] [polls_per_tab]
+"""
+import os
+import sys
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+import blueprints.orders as orders
+import mapping.order_data as order_data
+import api.broker_client as broker_client
+from api.broker_client import BrokerResponse
+from blueprints.orders import orders_bp
+
+ORDERS = [{'orderid': str(i), 'tradingsymbol': f'SYM{i}-EQ', 'symboltoken': str(i), 'exchange': 'NSE',
+           'transactiontype': 'BUY', 'producttype': 'INTRADAY', 'ordertype': 'LIMIT', 'price': 100.0,
+           'triggerprice': 0, 'quantity': '10', 'status': 'open', 'updatetime': '10:00:00'} for i in range(50)]
+
+
+class StubPool:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+
+    def request(self, method, endpoint, body=None, headers=None):
+        self.calls[endpoint.rsplit('/', 1)[-1]] += 1
+        time.sleep(self.latency)
+        return BrokerResponse(200, 'OK', {}, json.dumps({'status': True, 'data': ORDERS}).encode())
+
+
+def poll(app, polls):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, AUTH_TOKEN='jwt', apikey='apikey')
+    etag, statuses, sent = None, Counter(), 0
+    for _ in range(polls):
+        headers = {'Accept': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
+        response = client.get('/orderbook', headers=headers)
+        statuses[response.status_code] += 1
+        sent += len(response.data)
+        etag = response.headers.get('ETag', etag)
+        time.sleep(0.1)
+    return statuses, sent
+
+
+def run(app, stub, tabs, polls):
+    stub.calls.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=tabs) as pool:
+        results = list(pool.map(lambda _: poll(app, polls), range(tabs)))
+    statuses = sum((statuses for statuses, _ in results), Counter())
+    sent = sum(sent for _, sent in results)
+    return time.perf_counter() - start, stub.calls['getOrderBook'], dict(statuses), sent
+
+
+def main():
+    tabs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    stub = StubPool(0.05)
+    broker_client.get_broker_pool = lambda host=None, port=None: stub
+    order_data.get_symbol = lambda token, exchange: f'SYM{token}'
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+    app.register_blueprint(orders_bp)
+    print(f"{tabs} tabs polling /orderbook {polls} times each, every 100 ms")
+
+    cached = orders.get_cached_book
+    orders.get_cached_book = lambda account, name, load: load()
+    elapsed, calls, statuses, sent = run(app, stub, tabs, polls)
+    print(f"  no cache  {elapsed:6.2f}s  broker calls {calls:>3}  responses {statuses}  {sent / 1024:.0f} KiB sent")
+
+    orders.get_cached_book = cached
+    elapsed, calls, statuses, sent = run(app, stub, tabs, polls)
+    print(f"  cached    {elapsed:6.2f}s  broker calls {calls:>3}  responses {statuses}  {sent / 1024:.0f} KiB sent")
+
+
+if __name__ == '__main__':
+    main()
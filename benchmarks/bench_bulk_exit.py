@@ -0,0 +1,59 @@
+"""
+Benchmark: serial vs concurrent square-off of all open positions.
+
+Replaces the broker connection pool with a stub that answers after a fixed latency
+(the outbound rate limits still apply) and squares off N positions through close_all_positions, once with a single worker
+(the previous one-at-a-time behaviour) and once with the default bulk settings.
+
+Usage: python benchmarks/bench_bulk_exit.py [positions] [latency_ms]
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.bulk_executor as bulk_executor
+from api.broker_client import BrokerResponse
+
+
+class StubPool:
+    def __init__(self, positions, latency):
+        self.positions = positions
+        self.latency = latency
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        if endpoint.endswith('getPosition'):
+            body = {'status': True, 'data': self.positions}
+        else:
+            body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 250) / 1000
+    positions = [{'tradingsymbol': f'SYM{i}-EQ', 'exchange': 'NSE', 'producttype': 'INTRADAY',
+                  'netqty': str((i % 5 + 1) * (1 if i % 2 else -1))} for i in range(count)]
+    stub = StubPool(positions, latency)
+    broker_client.get_broker_pool = lambda host=None, port=None: stub
+    order_api.get_token = lambda symbol, exchange: '1'
+    print(f"Squaring off {count} positions, {latency * 1000:.0f} ms broker latency")
+
+    for label, workers in (('serial', 1), ('concurrent', bulk_executor.BULK_MAX_WORKERS)):
+        original = order_api.run_bulk
+        order_api.run_bulk = lambda items, fn, describe=None: original(items, fn, describe, max_workers=workers)
+        start = time.perf_counter()
+        response, _ = order_api.close_all_positions('key', auth_token='jwt', broker_api_key='apikey')
+        elapsed = time.perf_counter() - start
+        order_api.run_bulk = original
+        report = response['report']
+        print(f"  {label:<10} {elapsed:8.2f}s  {report['succeeded']}/{report['total']} squared off")
+
+
+if __name__ == '__main__':
+    main()
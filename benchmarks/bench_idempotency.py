@@ -0,0 +1,142 @@
+"""
+Benchmark: duplicate webhook alerts with and without idempotency.
+
+Sends A distinct alerts, each double-fired D times at once and then retried once
+after the first response came back (as TradingView does on a slow response),
+against a stub broker with a fixed latency that counts the orders it receives.
+Without deduplication every copy is an order; with it each alert must reach the
+broker exactly once and every copy must get the first response (same order id).
+Then the in-memory cache is dropped, as on another worker process, and the alerts
+are retried again: they must be answered from the idempotency_keys table.
+
+Usage: python benchmarks/bench_idempotency.py [alerts] [duplicates] [latency_ms]
+"""
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='idempotency_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}/algo.db"
+
+from flask import Flask
+
+import api.idempotency as idempotency
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+import blueprints.api_v1 as api_v1
+from api.broker_client import BrokerResponse
+from database.apilog_db import init_db as init_log_db, order_log_writer
+from database.auth_db import ApiKeyIdentity
+from database.idempotency_db import init_db as init_idempotency_db
+from extensions import socketio
+
+
+class StubPool:
+    def __init__(self, latency):
+        self.latency = latency
+        self.orders = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        with self.lock:
+            self.orders += 1
+        body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def fire(client, alerts, duplicates):
+    """Double-fire every alert, then retry it once; return the order ids each alert got."""
+    def post(alert):
+        response = client.post('/api/v1/placeorder', json=alert)
+        return response.status_code, response.get_json().get('orderid'), response.headers.get('Idempotent-Replayed')
+
+    copies = [alert for alert in alerts for _ in range(duplicates)]
+    with ThreadPoolExecutor(max_workers=len(copies)) as pool:
+        results = list(pool.map(post, copies))
+        results += list(pool.map(post, alerts))
+    return results
+
+
+def report(label, results, stub, elapsed):
+    replayed = sum(1 for _, _, header in results if header)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"  {label:<14} {len(results)} requests in {elapsed:5.2f}s  broker orders {stub.orders:4}  "
+          f"replayed {replayed:4}  status {statuses}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duplicates = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 300) / 1000
+
+    init_log_db()
+    init_idempotency_db()
+    stub = StubPool(latency)
+    broker_client.get_broker_pool = lambda host=None, port=None: stub
+    order_api.get_token = lambda symbol, exchange: '1'
+    order_api.transform_data.__globals__['get_br_symbol'] = lambda symbol, exchange: symbol
+    identity = ApiKeyIdentity('user1', 'user1', False, 'broker-key', 'jwt', 'feed')
+    api_v1.authenticate_login_user = lambda api_key: identity
+    api_v1.resolve_api_key = lambda api_key: identity
+    order_api.get_broker_credentials = lambda user_id: None
+    order_api.get_auth_token = lambda name: 'jwt'
+
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.api_v1_bp)
+    socketio.init_app(app)
+    client = app.test_client()
+    print(f"{count} alerts, each fired {duplicates}x at once and retried once, {latency * 1000:.0f} ms broker latency")
+
+    def alerts(run):
+        return [{'apikey': 'key', 'strategy': f'bench{run}', 'symbol': f'SYM{i}', 'exchange': 'NSE',
+                 'action': 'BUY', 'quantity': '1', 'product': 'MIS', 'pricetype': 'MARKET'} for i in range(count)]
+
+    broker_scheduler._scheduler = None
+    idempotency.IDEMPOTENCY_WINDOW = 0
+    start = time.perf_counter()
+    results = fire(client, alerts('off'), duplicates)
+    report('no dedup', results, stub, time.perf_counter() - start)
+    assert stub.orders == count * (duplicates + 1)
+
+    broker_scheduler._scheduler = None
+    idempotency.IDEMPOTENCY_WINDOW = 10
+    stub.orders = 0
+    batch = alerts('on')
+    start = time.perf_counter()
+    results = fire(client, batch, duplicates)
+    report('content hash', results, stub, time.perf_counter() - start)
+    assert stub.orders == count, "a duplicate alert reached the broker"
+    order_ids = {}
+    for alert, (status, order_id, _) in zip([a for a in batch for _ in range(duplicates)] + batch, results):
+        assert status == 200 and order_id, "a duplicate did not get the original response"
+        order_ids.setdefault(alert['symbol'], set()).add(order_id)
+    assert all(len(ids) == 1 for ids in order_ids.values()), "copies of an alert got different order ids"
+
+    # Another worker process has none of this process's cached responses
+    idempotency._responses.clear()
+    stub.orders = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        retried = list(pool.map(lambda alert: client.post('/api/v1/placeorder', json=alert), batch))
+    elapsed = time.perf_counter() - start
+    print(f"  {'other worker':<14} {len(retried)} retries in {elapsed:5.2f}s  broker orders {stub.orders:4}  "
+          f"replayed {sum(1 for r in retried if r.headers.get('Idempotent-Replayed'))}")
+    assert stub.orders == 0, "a retry on another worker reached the broker"
+    assert all(r.get_json()['orderid'] in order_ids[alert['symbol']] for alert, r in zip(batch, retried))
+
+    print(f"    stats {idempotency.get_idempotency_stats()}")
+    order_log_writer.flush(5)
+
+
+if __name__ == '__main__':
+    main()
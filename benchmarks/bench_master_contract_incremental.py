@@ -0,0 +1,82 @@
+"""
+Benchmark: full reload vs incremental refresh of symtoken.
+
+Loads a synthetic scrip master into a scratch SQLite database, then simulates an
+overnight change (expired contracts removed, new expiries listed, a few rows
+edited) and applies it once through a full staging reload and once through the
+incremental diff. Both must leave the same rows behind. A second incremental run
+with an identical source hash shows the skip path.
+
+Usage: python benchmarks/bench_master_contract_incremental.py [rows] [changed_fraction]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+import pandas as pd
+from sqlalchemy import select
+import database.master_contract_db as mcdb
+from benchmarks.bench_master_contract_transform import synthetic_scrip_master
+
+
+def table_contents():
+    table = mcdb.SymToken.__table__
+    query = select(*[table.c[c] for c in mcdb.SYMTOKEN_COLUMNS])
+    with mcdb.engine.connect() as conn:
+        df = pd.DataFrame(conn.execute(query).all(), columns=mcdb.SYMTOKEN_COLUMNS)
+    return df.sort_values(mcdb.SYMTOKEN_KEY_COLUMNS).reset_index(drop=True)
+
+
+def overnight_change(records, fraction):
+    """Drop, add and edit `fraction` of the records each."""
+    n = max(1, int(len(records) * fraction))
+    changed = [dict(r) for r in records[n:]]
+    for record in changed[:n]:
+        record['lotsize'] = str(int(record['lotsize']) * 2)
+    extra = synthetic_scrip_master(n, seed=11)
+    for i, record in enumerate(extra):
+        record['token'] = str(900000 + i)
+    return changed + extra
+
+
+def timed_load(label, mode, df, source_hash):
+    mcdb.MASTER_CONTRACT_REFRESH_MODE = mode
+    start = time.perf_counter()
+    total = mcdb.load_master_contract(lambda: [df], source_hash)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed:8.3f}s  {total} symbols")
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.005
+    mcdb.init_db()
+
+    base = synthetic_scrip_master(rows)
+    base_df = mcdb.process_angel_data_direct(base)
+    next_df = mcdb.process_angel_data_direct(overnight_change(base, fraction))
+    print(f"{rows} symbols, {fraction:.1%} removed, added and edited")
+
+    timed_load('initial load', 'FULL', base_df, 'day-1')
+    full_t = timed_load('full reload', 'FULL', next_df, 'day-2')
+    expected = table_contents()
+
+    timed_load('reset to day 1', 'FULL', base_df, 'day-1')
+    incr_t = timed_load('incremental refresh', 'INCREMENTAL', next_df, 'day-2')
+    pd.testing.assert_frame_equal(expected, table_contents(), check_dtype=False)
+    timed_load('unchanged source', 'INCREMENTAL', next_df, 'day-2')
+    print(f"  identical rows, speedup {full_t / incr_t:.1f}x")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        os.remove(_scratch)
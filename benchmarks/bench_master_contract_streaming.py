@@ -0,0 +1,84 @@
+"""
+Benchmark: in-memory vs streaming master contract ingest.
+
+Writes a synthetic scrip master to disk, serves it from a local stub HTTP
+server and runs each ingest mode in its own child process against a scratch
+SQLite database, printing wall time and peak RSS. The streaming run must load
+the same symbols as the in-memory run.
+
+Usage: python benchmarks/bench_master_contract_streaming.py [rows]
+"""
+import os
+import sys
+import json
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_child(mode, url):
+    """Load the scrip master from `url` in this process and print the result as JSON."""
+    from sqlalchemy import select, func
+    from database.master_contract_db import (SymToken, engine, init_db, streaming_master_contract_load,
+                                             in_memory_master_contract_load)
+    init_db()
+    start = time.perf_counter()
+    if mode == 'streaming':
+        total = streaming_master_contract_load(url)
+    else:
+        total = in_memory_master_contract_load(url)
+    elapsed = time.perf_counter() - start
+    with engine.connect() as conn:
+        count, checksum = conn.execute(select(func.count(), func.sum(SymToken.strike))).one()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'total': total, 'count': count, 'checksum': checksum, 'seconds': elapsed, 'peak_mb': peak_kb / 1024}))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    from benchmarks.bench_master_contract_transform import synthetic_scrip_master
+
+    workdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, 'OpenAPIScripMaster.json'), 'w') as f:
+        json.dump(synthetic_scrip_master(rows), f)
+    size_mb = os.path.getsize(f.name) / (1024 * 1024)
+
+    server = HTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=workdir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/OpenAPIScripMaster.json"
+    print(f"Serving {rows} synthetic records ({size_mb:.1f} MB) at {url}")
+
+    results = {}
+    try:
+        for mode in ('in-memory', 'streaming'):
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, mode + '.db')}")
+            out = subprocess.run([sys.executable, __file__, '--child', mode, url], env=env, cwd=ROOT,
+                                 capture_output=True, text=True, check=True).stdout
+            results[mode] = json.loads(out.strip().splitlines()[-1])
+            r = results[mode]
+            print(f"  {mode:<10} {r['seconds']:8.3f}s  peak RSS {r['peak_mb']:8.1f} MB  {r['count']} symbols")
+    finally:
+        server.shutdown()
+
+    old, new = results['in-memory'], results['streaming']
+    assert (old['count'], old['checksum']) == (new['count'], new['checksum']), "streaming load differs"
+    print(f"  identical symbols, peak RSS {old['peak_mb'] - new['peak_mb']:+.1f} MB saved")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,150 @@
+"""
+Benchmark: row-wise vs columnar master contract transformation.
+
+Builds a synthetic 200k-row OpenAPIScripMaster, runs the previous row-wise
+(`DataFrame.apply`) implementations and the current columnar ones, checks that
+both produce identical frames and prints the timings.
+
+Usage: python benchmarks/bench_master_contract_transform.py [rows]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from database.master_contract_db import (process_angel_data_direct, process_angel_json,
+                                         reformat_symbol, convert_date)
+
+MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+
+def synthetic_scrip_master(rows, seed=7):
+    """Generate records shaped like the Angel One OpenAPIScripMaster JSON."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        day = rng.randint(1, 28)
+        month = rng.choice(MONTHS)
+        year = rng.choice([2024, 2025])
+        expiry = f"{day:02d}{month}{year}"
+        name = rng.choice(['NIFTY', 'BANKNIFTY', 'RELIANCE', 'USDINR', 'GOLD', 'CRUDEOIL', 'SBIN'])
+        kind = rng.random()
+        if kind < 0.15:
+            record = dict(symbol=f"{name}-EQ", instrumenttype='', exch_seg='NSE', expiry='', strike='-1.000000')
+        elif kind < 0.20:
+            record = dict(symbol=f"{name} {month} {day} {year} FUT", instrumenttype='FUT', exch_seg='NFO',
+                          expiry=expiry, strike='-1.000000')
+        elif kind < 0.25:
+            strike = rng.randint(100, 500) * 100
+            record = dict(symbol=f"{name} {rng.choice(['CE', 'PE'])} {strike} {month} {day} {year}",
+                          instrumenttype=rng.choice(['CE', 'PE']), exch_seg='NFO', expiry=expiry,
+                          strike=f"{strike * 100}.000000")
+        elif kind < 0.30:
+            record = dict(symbol=f"{name}{day:02d}{month}{str(year)[2:]}FUT", instrumenttype=rng.choice(['FUTCUR', 'FUTIRC']),
+                          exch_seg='CDS', expiry=expiry, strike='-1.000000')
+        elif kind < 0.35:
+            strike = rng.randint(7000000, 9000000)
+            record = dict(symbol=f"{name}{day:02d}{month}{str(year)[2:]}{strike}{rng.choice(['CE', 'PE'])}",
+                          instrumenttype=rng.choice(['OPTCUR', 'OPTIRC']), exch_seg='CDS', expiry=expiry,
+                          strike=f"{strike}.000000")
+        elif kind < 0.40:
+            record = dict(symbol=f"{name}{day:02d}{month}{str(year)[2:]}FUT", instrumenttype='FUTCOM',
+                          exch_seg='MCX', expiry=expiry, strike='-1.000000')
+        elif kind < 0.45:
+            strike = rng.randint(100, 900) * 100
+            record = dict(symbol=f"{name}{day:02d}{month}{str(year)[2:]}{strike}{rng.choice(['CE', 'PE'])}",
+                          instrumenttype='OPTFUT', exch_seg='MCX', expiry=expiry, strike=f"{strike * 100}.000000")
+        elif kind < 0.47:
+            record = dict(symbol=name, instrumenttype='AMXIDX', exch_seg=rng.choice(['NSE', 'BSE', 'MCX']),
+                          expiry='', strike='0.000000')
+        else:
+            strike = rng.randint(100, 500) * 100
+            record = dict(symbol=f"{name}{day:02d}{month}{str(year)[2:]}{strike}{rng.choice(['CE', 'PE'])}",
+                          instrumenttype=rng.choice(['OPTIDX', 'OPTSTK']), exch_seg=rng.choice(['NFO', 'BFO']),
+                          expiry=expiry, strike=f"{strike * 100}.000000")
+        record.update(token=str(100000 + i), name=name, lotsize=str(rng.choice([1, 15, 25, 50, 75])),
+                      tick_size=rng.choice(['5.000000', '0.250000', '0.002500']))
+        records.append(record)
+    return records
+
+
+def legacy_process_angel_data_direct(data):
+    """The previous row-wise implementation of process_angel_data_direct."""
+    df = pd.DataFrame(data)
+    df['symbol'] = df.apply(reformat_symbol, axis=1)
+    df = df[df['exch_seg'].isin(['NSE', 'BSE', 'NFO', 'BFO', 'CDS', 'MCX'])]
+    df = df.rename(columns={'exch_seg': 'exchange', 'symbol': 'brsymbol'})
+    df['symbol'] = df['brsymbol']
+    df['brexchange'] = df['exchange']
+    df = df.fillna('')
+    df['strike'] = pd.to_numeric(df['strike'], errors='coerce').fillna(0)
+    df['lotsize'] = pd.to_numeric(df['lotsize'], errors='coerce').fillna(1)
+    df['tick_size'] = pd.to_numeric(df['tick_size'], errors='coerce').fillna(0.05)
+    return df
+
+
+def legacy_process_angel_json(path):
+    """The previous row-wise implementation of process_angel_json."""
+    df = pd.read_json(path)
+    df = df.rename(columns={'exch_seg': 'exchange'})
+    df['brsymbol'] = df['symbol']
+    df['brexchange'] = df['exchange']
+    df.loc[(df['instrumenttype'] == 'AMXIDX') & (df['exchange'] == 'NSE'), 'exchange'] = 'NSE_INDEX'
+    df.loc[(df['instrumenttype'] == 'AMXIDX') & (df['exchange'] == 'BSE'), 'exchange'] = 'BSE_INDEX'
+    df.loc[(df['instrumenttype'] == 'AMXIDX') & (df['exchange'] == 'MCX'), 'exchange'] = 'MCX_INDEX'
+    df['symbol'] = df['symbol'].str.replace('-EQ|-BE|-MF|-SG', '', regex=True)
+    df['expiry'] = df['expiry'].apply(lambda x: convert_date(x) if pd.notnull(x) else x)
+    df['expiry'] = df['expiry'].str.upper()
+    df['strike'] = df['strike'].astype(float) / 100
+    df.loc[(df['instrumenttype'] == 'OPTCUR') & (df['exchange'] == 'CDS'), 'strike'] = df['strike'].astype(float) / 100000
+    df.loc[(df['instrumenttype'] == 'OPTIRC') & (df['exchange'] == 'CDS'), 'strike'] = df['strike'].astype(float) / 100000
+    df['lotsize'] = df['lotsize'].astype(int)
+    df['tick_size'] = df['tick_size'].astype(float)
+    df.loc[(df['instrumenttype'] == 'FUTCUR') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
+    df.loc[(df['instrumenttype'] == 'FUTIRC') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
+    df.loc[(df['instrumenttype'] == 'FUTCOM') & (df['exchange'] == 'MCX'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
+    df.loc[(df['instrumenttype'] == 'OPTCUR') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\\.0', '', regex=True) + df['symbol'].str[-2:]
+    df.loc[(df['instrumenttype'] == 'OPTIRC') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\\.0', '', regex=True) + df['symbol'].str[-2:]
+    df.loc[(df['instrumenttype'] == 'OPTFUT') & (df['exchange'] == 'MCX'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\\.0', '', regex=True) + df['symbol'].str[-2:]
+    return df
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed:8.3f}s")
+    return result, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"Generating synthetic scrip master with {rows} rows...")
+    data = synthetic_scrip_master(rows)
+
+    print("process_angel_data_direct")
+    old, old_t = timed('row-wise', legacy_process_angel_data_direct, data)
+    new, new_t = timed('columnar', process_angel_data_direct, data)
+    pd.testing.assert_frame_equal(old, new)
+    print(f"  identical output, speedup {old_t / new_t:.1f}x")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(data, f)
+        path = f.name
+    try:
+        print("process_angel_json")
+        old, old_t = timed('row-wise', legacy_process_angel_json, path)
+        new, new_t = timed('columnar', process_angel_json, path)
+        pd.testing.assert_frame_equal(old, new)
+        print(f"  identical output, speedup {old_t / new_t:.1f}x")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
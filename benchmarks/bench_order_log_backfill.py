@@ -0,0 +1,111 @@
+"""
+Benchmark: order log filters on JSON payloads vs extracted, indexed columns.
+
+Creates an order_logs table in the old layout (JSON payloads only) in a scratch SQLite
+database, fills it with N logs over the last 30 days and times a month-wide symbol and
+strategy search the old way (LIKE on request_data). It then adds the extracted columns,
+times the batched backfill and repeats the searches with query_order_logs. Both ways
+must return the same rows.
+
+Usage: python benchmarks/bench_order_log_backfill.py [rows]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+from sqlalchemy import text
+from database import apilog_db
+from database.apilog_db import OrderLog, engine, backfill_order_log_columns
+from database.order_log_query import IST, ist_day_range, query_order_logs, today_ist, MAX_PAGE_SIZE
+
+API_TYPES = ['placeorder', 'placesmartorder', 'cancelorder', 'modifyorder', 'squareoff']
+SYMBOLS = ['SBIN', 'RELIANCE', 'INFY', 'TCS', 'HDFCBANK', 'NIFTY25JANFUT', 'BANKNIFTY25JANFUT'] + \
+          [f'STOCK{i}' for i in range(200)]
+
+
+def create_old_table():
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE order_logs (id INTEGER PRIMARY KEY, api_type TEXT NOT NULL, '
+                          'request_data TEXT NOT NULL, response_data TEXT NOT NULL, created_at DATETIME)'))
+        conn.execute(text('CREATE INDEX ix_order_logs_created_at_id ON order_logs (created_at, id)'))
+
+
+def fill(rows, days=30, seed=5):
+    rng = random.Random(seed)
+    now = datetime.now(IST)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            created_at = now - timedelta(seconds=(rows - i) * days * 86400 / rows)
+            # One symbol traded rarely, so a search for it has to cover the whole month
+            symbol = 'RAREFUT' if i % 5000 == 0 else rng.choice(SYMBOLS)
+            request_data = {'strategy': f'strategy{rng.randint(1, 50)}', 'symbol': symbol,
+                            'exchange': 'NSE', 'action': rng.choice(['BUY', 'SELL']), 'quantity': '1'}
+            batch.append({'api_type': rng.choice(API_TYPES), 'request_data': json.dumps(request_data),
+                          'response_data': json.dumps({'status': 'success', 'orderid': str(i)}),
+                          'created_at': created_at.replace(tzinfo=None)})
+            if len(batch) == 20000:
+                conn.execute(text('INSERT INTO order_logs (api_type, request_data, response_data, created_at) '
+                                  'VALUES (:api_type, :request_data, :response_data, :created_at)'), batch)
+                batch = []
+        if batch:
+            conn.execute(text('INSERT INTO order_logs (api_type, request_data, response_data, created_at) '
+                              'VALUES (:api_type, :request_data, :response_data, :created_at)'), batch)
+
+
+def like_search(start, end, field, value):
+    """The filter the logs API used before the extracted columns existed, first page."""
+    pattern = f'{json.dumps(field)}: {json.dumps(value)}'
+    return OrderLog.query.with_entities(OrderLog.id).filter(
+        OrderLog.created_at >= start, OrderLog.created_at < end,
+        OrderLog.request_data.contains(pattern, autoescape=True)
+    ).order_by(OrderLog.created_at.desc(), OrderLog.id.desc()).limit(MAX_PAGE_SIZE).all()
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<46} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    create_old_table()
+    fill(rows)
+    print(f"{rows} order logs over 30 days, old layout")
+    end = ist_day_range(today_ist())[1]
+    start = ist_day_range(today_ist() - timedelta(days=30))[0]
+
+    old_symbol = timed("LIKE request_data, symbol=RAREFUT", lambda: like_search(start, end, 'symbol', 'RAREFUT'))
+    old_strategy = timed("LIKE request_data, strategy=strategy9",
+                         lambda: like_search(start, end, 'strategy', 'strategy9'))
+
+    apilog_db._add_missing_columns()
+    for index in OrderLog.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    begin = time.perf_counter()
+    converted = backfill_order_log_columns()
+    elapsed = time.perf_counter() - begin
+    print(f"  backfill: {converted} rows in {elapsed:.1f}s ({converted / elapsed:,.0f} rows/s)")
+    assert backfill_order_log_columns() == 0, "backfill is not idempotent"
+
+    new_symbol, _ = timed("indexed column, symbol=RAREFUT",
+                          lambda: query_order_logs(start, end, symbol='RAREFUT', limit=MAX_PAGE_SIZE))
+    new_strategy, _ = timed("indexed column, strategy=strategy9",
+                            lambda: query_order_logs(start, end, strategy='strategy9', limit=MAX_PAGE_SIZE))
+    assert [log['id'] for log in new_symbol] == [row.id for row in old_symbol], "symbol results differ"
+    assert [log['id'] for log in new_strategy] == [row.id for row in old_strategy], "strategy results differ"
+
+
+if __name__ == '__main__':
+    main()
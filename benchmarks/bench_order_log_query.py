@@ -0,0 +1,91 @@
+"""
+Benchmark: the old logs page query vs indexed, keyset-paginated order log queries.
+
+Fills a scratch SQLite database with N order logs spread over the last 30 days and
+times the old view_logs query (func.date(created_at) == day, all rows) for the last
+full IST day against the first page, a deep page and filtered pages from
+query_order_logs. Paging through the whole day must return the same rows.
+
+Usage: python benchmarks/bench_order_log_query.py [rows]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+from sqlalchemy import func
+from database.apilog_db import OrderLog, engine, init_db
+from database.order_log_query import IST, ist_day_range, query_order_logs, today_ist
+
+API_TYPES = ['placeorder', 'placesmartorder', 'cancelorder', 'modifyorder', 'squareoff']
+SYMBOLS = ['SBIN', 'RELIANCE', 'INFY', 'TCS', 'HDFCBANK', 'NIFTY25JANFUT', 'BANKNIFTY25JANFUT']
+
+
+def fill(rows, days=30, seed=3):
+    rng = random.Random(seed)
+    now = datetime.now(IST)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            # Oldest first, like a real log, so ids follow created_at
+            created_at = now - timedelta(seconds=(rows - i) * days * 86400 / rows)
+            request_data = {'strategy': f'strategy{rng.randint(1, 20)}', 'symbol': rng.choice(SYMBOLS),
+                            'exchange': 'NSE', 'action': rng.choice(['BUY', 'SELL']), 'quantity': '1'}
+            batch.append({'api_type': rng.choice(API_TYPES), 'request_data': json.dumps(request_data),
+                          'response_data': json.dumps({'status': 'success', 'orderid': str(i)}),
+                          'created_at': created_at})
+            if len(batch) == 20000:
+                conn.execute(OrderLog.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(OrderLog.__table__.insert(), batch)
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<46} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    init_db()
+    fill(rows)
+    print(f"{rows} order logs over 30 days")
+    day = today_ist() - timedelta(days=1)
+    start, end = ist_day_range(day)
+
+    old = timed("old: func.date(created_at) == day, .all()",
+                lambda: OrderLog.query.filter(func.date(OrderLog.created_at) == day)
+                .order_by(OrderLog.created_at.desc()).all())
+    print(f"    {len(old)} rows loaded")
+
+    logs, cursor = timed("first page of the day", lambda: query_order_logs(start, end))
+    for _ in range(49):
+        logs, cursor = query_order_logs(start, end, cursor=cursor)
+    timed("51st page of the day", lambda: query_order_logs(start, end, cursor=cursor))
+    month_start = ist_day_range(day - timedelta(days=30))[0]
+    timed("first page of the month, api_type=cancelorder",
+          lambda: query_order_logs(month_start, end, api_type='cancelorder'))
+    timed("first page of the day, symbol=SBIN", lambda: query_order_logs(start, end, symbol='SBIN'))
+
+    ids, cursor = [], None
+    while True:
+        logs, cursor = query_order_logs(start, end, cursor=cursor, limit=500)
+        ids.extend(log['id'] for log in logs)
+        if cursor is None:
+            break
+    assert ids == [row.id for row in old], "paged results differ from the full query"
+
+
+if __name__ == '__main__':
+    main()
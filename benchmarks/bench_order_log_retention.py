@@ -0,0 +1,103 @@
+"""
+Benchmark: order log retention and the archive reader.
+
+Fills a scratch SQLite database with N order logs over the last 90 days, pages
+through the whole table newest first, then runs retention with a 30 day window into
+a scratch archive directory. Reports the retention run, the table and archive sizes
+and the cost of a recent page, an archived page and a page spanning the cutoff. Paging
+through table and archive together must return the same rows as before retention.
+
+Usage: python benchmarks/bench_order_log_retention.py [rows]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+os.environ['ORDER_LOG_ARCHIVE_DIR'] = tempfile.mkdtemp(prefix='order_log_archive_')
+os.environ['ORDER_LOG_RETENTION_DAYS'] = '30'
+
+from database.apilog_db import OrderLog, engine, init_db
+from database.order_log_archive import ORDER_LOG_ARCHIVE_DIR, query_order_log_history
+from database.order_log_query import IST, ist_day_range, query_order_logs, today_ist
+from database.order_log_retention import retention_cutoff, run_order_log_retention
+
+API_TYPES = ['placeorder', 'placesmartorder', 'cancelorder', 'modifyorder', 'squareoff']
+SYMBOLS = ['SBIN', 'RELIANCE', 'INFY', 'TCS', 'HDFCBANK', 'NIFTY25JANFUT', 'BANKNIFTY25JANFUT']
+
+
+def fill(rows, days=90, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now(IST)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            created_at = now - timedelta(seconds=(rows - i) * days * 86400 / rows)
+            symbol = rng.choice(SYMBOLS)
+            request_data = {'strategy': f'strategy{rng.randint(1, 20)}', 'symbol': symbol,
+                            'exchange': 'NSE', 'action': rng.choice(['BUY', 'SELL']), 'quantity': '1'}
+            batch.append({'api_type': rng.choice(API_TYPES), 'request_data': json.dumps(request_data),
+                          'response_data': json.dumps({'status': 'success', 'orderid': str(i)}),
+                          'created_at': created_at, 'strategy': request_data['strategy'], 'symbol': symbol,
+                          'exchange': 'NSE', 'action': request_data['action'], 'quantity': 1,
+                          'orderid': str(i), 'status': 'success'})
+            if len(batch) == 20000:
+                conn.execute(OrderLog.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(OrderLog.__table__.insert(), batch)
+
+
+def all_ids(query, **filters):
+    ids, cursor = [], None
+    while True:
+        logs, cursor = query(cursor=cursor, limit=500, **filters)
+        ids.extend(log['id'] for log in logs)
+        if cursor is None:
+            return ids
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<46} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    init_db()
+    fill(rows)
+    print(f"{rows} order logs over 90 days, database {os.path.getsize(_scratch) / 2**20:.1f} MB")
+    before = all_ids(query_order_logs)
+    before_sbin = all_ids(query_order_logs, symbol='SBIN')
+
+    result = timed("retention run (30 days)", run_order_log_retention)
+    print(f"    {result['deleted']} rows from {len(result['days'])} days into {result['files']} files")
+    archive_bytes = sum(os.path.getsize(os.path.join(ORDER_LOG_ARCHIVE_DIR, name))
+                        for name in os.listdir(ORDER_LOG_ARCHIVE_DIR))
+    print(f"    table now {OrderLog.query.count()} rows, archive {archive_bytes / 2**20:.1f} MB")
+    assert run_order_log_retention()['deleted'] == 0, "second run found rows to move"
+
+    cutoff_day = retention_cutoff().date()
+    today = ist_day_range(today_ist())
+    timed("today, first page", lambda: query_order_log_history(*today))
+    old_day = ist_day_range(cutoff_day - timedelta(days=20))
+    timed("archived day, first page", lambda: query_order_log_history(*old_day))
+    spanning = (ist_day_range(cutoff_day - timedelta(days=2))[0], ist_day_range(cutoff_day + timedelta(days=2))[1])
+    timed("5 days across the cutoff, first page", lambda: query_order_log_history(*spanning))
+
+    after = timed("every page, table and archive", lambda: all_ids(query_order_log_history))
+    assert after == before, "table and archive differ from the table before retention"
+    assert all_ids(query_order_log_history, symbol='SBIN') == before_sbin, "filtered history differs"
+
+
+if __name__ == '__main__':
+    main()
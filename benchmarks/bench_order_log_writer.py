@@ -0,0 +1,76 @@
+"""
+Benchmark: per-row order log commits vs the batched order log writer.
+
+Simulates an alert storm: many request threads log orders at once into a scratch
+SQLite database. The baseline is the previous path, a 2-thread executor committing
+one OrderLog row per task. Reports the time callers spend handing off logs and the
+time until every row is on disk.
+
+Usage: python benchmarks/bench_order_log_writer.py [rows] [threads]
+"""
+import os
+import sys
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+from database.apilog_db import OrderLog, db_session, init_db, order_log_writer
+
+REQUEST = {'strategy': 'bench', 'symbol': 'SBIN', 'exchange': 'NSE', 'action': 'BUY', 'quantity': '1',
+           'pricetype': 'MARKET', 'product': 'MIS'}
+RESPONSE = {'status': 'success', 'orderid': '250101000000001'}
+
+
+def commit_per_row(api_type, request_data, response_data):
+    """The previous async_log_order body: one session and one commit per row."""
+    try:
+        order_log = OrderLog(api_type=api_type, request_data=json.dumps(request_data),
+                             response_data=json.dumps(response_data), created_at=datetime.now())
+        db_session.add(order_log)
+        db_session.commit()
+    except Exception as e:
+        print(f"Error saving order log: {e}")
+    finally:
+        db_session.remove()
+
+
+def storm(rows, threads, log):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as callers:
+        list(callers.map(lambda i: log('placeorder', REQUEST, RESPONSE), range(rows)))
+    return time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    init_db()
+    print(f"{rows} order logs from {threads} request threads")
+
+    executor = ThreadPoolExecutor(2)
+    start = time.perf_counter()
+    handoff = storm(rows, threads, lambda *args: executor.submit(commit_per_row, *args))
+    executor.shutdown(wait=True)
+    total = time.perf_counter() - start
+    print(f"  per-row commits  hand-off {handoff:6.2f}s  all written {total:6.2f}s  "
+          f"({rows / total:,.0f} rows/s)")
+
+    start = time.perf_counter()
+    handoff = storm(rows, threads, order_log_writer.submit)
+    order_log_writer.flush()
+    total = time.perf_counter() - start
+    stats = order_log_writer.get_stats()
+    print(f"  batched writer   hand-off {handoff:6.2f}s  all written {total:6.2f}s  "
+          f"({rows / total:,.0f} rows/s)  {stats['batches']} batches, {stats['dropped']} dropped")
+    print(f"  rows in order_logs: {OrderLog.query.count()}")
+
+
+if __name__ == '__main__':
+    main()
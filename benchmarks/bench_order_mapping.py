@@ -0,0 +1,78 @@
+"""
+Benchmark: per-row vs bulk symbol resolution when mapping order and trade books.
+
+Loads a synthetic scrip master into a scratch SQLite database and maps order books
+and trade books of 1k and 10k rows drawn from it. Compares one query per row (what
+map_order_data / map_trade_data did on an index miss) with the bulk lookups on the
+database fallback and on the in-memory symbol index. All three must resolve the
+same symbols.
+
+Usage: python benchmarks/bench_order_mapping.py [master_rows]
+"""
+import os
+import sys
+import copy
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+import database.token_db as token_db
+import mapping.order_data as order_data
+from database.master_contract_db import SymToken, init_db, process_angel_data_direct, replace_symtoken_table
+from benchmarks.bench_master_contract_transform import synthetic_scrip_master
+
+
+def books(instruments, rows, seed=11):
+    rng = random.Random(seed)
+    picks = [rng.choice(instruments) for _ in range(rows)]
+    orders = [{'symboltoken': token, 'tradingsymbol': brsymbol, 'exchange': exchange, 'producttype': 'INTRADAY',
+               'transactiontype': 'BUY', 'status': 'complete'} for token, brsymbol, exchange in picks]
+    return {'status': True, 'data': orders}
+
+
+def per_row(book, key):
+    """Resolve every row with its own query, as the index-miss path did before."""
+    lookup = token_db.get_symbol_dbquery if key == 'symboltoken' else token_db.get_oa_symbol_dbquery
+    return [lookup(row[key], row['exchange']) for row in book['data']]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    master_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    init_db()
+    replace_symtoken_table([process_angel_data_direct(synthetic_scrip_master(master_rows))])
+    instruments = [(row.token, row.brsymbol, row.exchange) for row in
+                   SymToken.query.with_entities(SymToken.token, SymToken.brsymbol, SymToken.exchange).limit(5000)]
+    index = token_db.build_symbol_index()
+    print(f"{master_rows} symbols in the master contract")
+
+    for rows in (1_000, 10_000):
+        book = books(instruments, rows)
+        for name, mapper, key in (('order book', order_data.map_order_data, 'symboltoken'),
+                                  ('trade book', order_data.map_trade_data, 'tradingsymbol')):
+            row_time, expected = timed(per_row, book, key)
+
+            token_db._get_index = lambda: None
+            db_time, mapped = timed(mapper, copy.deepcopy(book))
+            assert [row['tradingsymbol'] for row in mapped] == expected
+
+            token_db._get_index = lambda: index
+            index_time, mapped = timed(mapper, copy.deepcopy(book))
+            assert [row['tradingsymbol'] for row in mapped] == expected
+
+            print(f"  {name} {rows:>6} rows: per-row queries {row_time * 1000:8.1f} ms   "
+                  f"bulk query {db_time * 1000:7.1f} ms   bulk index {index_time * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: webhook response times with orders placed in the request vs queued.
+
+Posts N placeorder webhooks through a pool of request threads (standing in for the
+gunicorn workers) against a stub broker with a fixed latency, the outbound rate
+limits still applying. Reports webhook response times in sync mode, then in queued
+mode along with how long the executors took to place every order, which must all
+end up done with an order id in /orderstatus.
+
+Usage: python benchmarks/bench_queued_execution.py [orders] [latency_ms] [request_threads]
+"""
+import os
+import sys
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='order_queue_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}/algo.db"
+os.environ['ORDER_QUEUE_DATABASE_URL'] = f"sqlite:///{_scratch}/order_queue.db"
+# Both modes post the same orders, which must not be suppressed as duplicates
+os.environ['IDEMPOTENCY_WINDOW'] = '0'
+
+from flask import Flask
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+import api.order_execution as order_execution
+import blueprints.api_v1 as api_v1
+from api.broker_client import BrokerResponse
+from database.apilog_db import init_db as init_log_db, order_log_writer
+from database.auth_db import ApiKeyIdentity
+from extensions import socketio
+
+
+class StubPool:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def post_all(client, orders, threads):
+    def post(order):
+        start = time.perf_counter()
+        response = client.post('/api/v1/placeorder', json=order)
+        return time.perf_counter() - start, response.status_code, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(post, orders))
+
+
+def report(label, results, elapsed):
+    times = [seconds * 1000 for seconds, _, _ in results]
+    codes = {}
+    for _, code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    print(f"  {label:<8} all responses {elapsed:6.2f}s  p50 {percentile(times, 0.5):7.0f} ms  "
+          f"p95 {percentile(times, 0.95):7.0f} ms  max {max(times):7.0f} ms  status {codes}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 800) / 1000
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    init_log_db()
+    broker_client.get_broker_pool = lambda host=None, port=None: StubPool(latency)
+    order_api.get_token = lambda symbol, exchange: '1'
+    order_api.transform_data.__globals__['get_br_symbol'] = lambda symbol, exchange: symbol
+    identity = ApiKeyIdentity('user1', 'user1', False, 'broker-key', 'jwt', 'feed')
+    api_v1.authenticate_login_user = lambda api_key: identity
+    api_v1.resolve_api_key = lambda api_key: identity
+    order_api.get_broker_credentials = lambda user_id: None
+    order_api.get_auth_token = lambda name: 'jwt'
+
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.api_v1_bp)
+    socketio.init_app(app)
+    client = app.test_client()
+    orders = [{'apikey': 'key', 'strategy': 'bench', 'symbol': f'SYM{i}', 'exchange': 'NSE', 'action': 'BUY',
+               'quantity': '1', 'product': 'MIS', 'pricetype': 'LIMIT', 'price': '100'} for i in range(count)]
+    print(f"{count} webhooks, {threads} request threads, {latency * 1000:.0f} ms broker latency")
+
+    broker_scheduler._scheduler = None
+    order_execution.ORDER_EXECUTION_MODE = 'sync'
+    start = time.perf_counter()
+    results = post_all(client, orders, threads)
+    report('sync', results, time.perf_counter() - start)
+
+    broker_scheduler._scheduler = None
+    order_execution.ORDER_EXECUTION_MODE = 'queued'
+    start = time.perf_counter()
+    results = post_all(client, orders, threads)
+    report('queued', results, time.perf_counter() - start)
+
+    ack_ids = [body['ackid'] for _, _, body in results]
+    states = {}
+    while True:
+        statuses = [client.post('/api/v1/orderstatus', json={'apikey': 'key', 'ackid': ack_id}).get_json()
+                    for ack_id in ack_ids]
+        if all(status['state'] not in ('queued', 'running') for status in statuses):
+            break
+        time.sleep(0.05)
+    print(f"    every queued order finished after {time.perf_counter() - start:.2f}s")
+    for status in statuses:
+        states[status['state']] = states.get(status['state'], 0) + 1
+    print(f"    states {states}, executor {order_execution.order_executor.get_stats()}")
+    assert states == {'done': count}, "not every queued order was placed"
+    assert all(status['result'].get('orderid') for status in statuses), "a placed order has no orderid"
+    order_log_writer.flush(5)
+
+
+if __name__ == '__main__':
+    main()
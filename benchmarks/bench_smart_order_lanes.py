@@ -0,0 +1,96 @@
+"""
+Benchmark: duplicate smart-order alerts with and without execution lanes.
+
+Fires A alerts per symbol for S symbols at once, every alert asking for a position of
+10, against a stub broker that keeps positions (fills are immediate) and has a fixed
+latency. Without lanes alerts for the same symbol read the same position and each
+buys 10; with lanes each symbol must end at exactly 10 while symbols still run in
+parallel. Reports wall time, final positions and the lane metrics.
+
+Usage: python benchmarks/bench_smart_order_lanes.py [symbols] [alerts_per_symbol] [latency_ms]
+"""
+import os
+import sys
+import json
+import threading
+import time
+from types import SimpleNamespace
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+import api.order_execution as order_execution
+import api.position_snapshot as position_snapshot
+from api.broker_client import BrokerResponse
+
+TARGET = 10
+
+
+class StubBroker:
+    def __init__(self, latency):
+        self.latency = latency
+        self.positions = Counter()
+        self.lock = threading.Lock()
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        if endpoint.endswith('getPosition'):
+            with self.lock:
+                data = [{'tradingsymbol': symbol, 'exchange': 'NSE', 'producttype': 'INTRADAY', 'netqty': str(qty)}
+                        for symbol, qty in self.positions.items()]
+            return BrokerResponse(200, 'OK', {}, json.dumps({'status': True, 'data': data}).encode())
+        order = json.loads(body)
+        sign = 1 if order['transactiontype'] == 'BUY' else -1
+        with self.lock:
+            self.positions[order['tradingsymbol']] += sign * int(order['quantity'])
+        body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def run(execute, alerts, stub):
+    broker_scheduler._scheduler = None
+    position_snapshot._snapshots.clear()
+    stub.positions.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(alerts)) as pool:
+        list(pool.map(lambda alert: execute('placesmartorder', dict(alert), 'user1', 'jwt', 'apikey',
+                                            lambda *args: None), alerts))
+    return time.perf_counter() - start, Counter(stub.positions.values())
+
+
+def main():
+    symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    per_symbol = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 100) / 1000
+    stub = StubBroker(latency)
+    broker_client.get_broker_pool = lambda host=None, port=None: stub
+    order_api.get_token = lambda symbol, exchange: '1'
+    order_execution.socketio = SimpleNamespace(emit=lambda *args, **kwargs: None)
+    order_api.get_br_symbol = lambda symbol, exchange: symbol
+    order_api.transform_data.__globals__['get_br_symbol'] = lambda symbol, exchange: symbol
+    # Position reads are not the bottleneck being measured
+    broker_scheduler.BROKER_RATE_LIMITS = broker_scheduler.BROKER_RATE_LIMITS.replace('getPosition=1', 'getPosition=50')
+
+    alerts = [{'strategy': 'bench', 'symbol': f'SYM{i}', 'exchange': 'NSE', 'action': 'BUY', 'product': 'MIS',
+               'pricetype': 'MARKET', 'quantity': str(TARGET), 'position_size': str(TARGET)}
+              for _ in range(per_symbol) for i in range(symbols)]
+    print(f"{symbols} symbols x {per_symbol} concurrent alerts for a position of {TARGET}, "
+          f"{latency * 1000:.0f} ms broker latency")
+
+    elapsed, finals = run(order_execution._execute_order, alerts, stub)
+    print(f"  no lanes   {elapsed:6.2f}s  final positions {dict(finals)}")
+
+    elapsed, finals = run(order_execution.execute_order, alerts, stub)
+    print(f"  lanes      {elapsed:6.2f}s  final positions {dict(finals)}")
+    metrics = order_execution.get_execution_lane_metrics()
+    print(f"    lane waits avg {metrics['avg_wait_ms']} ms, p95 {metrics['p95_wait_ms']} ms, "
+          f"max {metrics['max_wait_ms']} ms; {metrics['queued_behind']} alerts queued behind another")
+    assert finals == Counter({TARGET: symbols}), "a symbol did not end at the target position"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: a burst of smart orders with and without the shared position snapshot.
+
+Fires N smart-order alerts on different symbols at once against a stub broker with a
+fixed latency (the outbound rate limits still apply, getPosition is 1/s) and counts
+position book downloads. The baseline fetches the position book for every alert, as
+place_smartorder_api did before the snapshot. Alerts whose position book fetch times
+out in the broker queue are rejected rather than sized against a guessed position.
+
+Usage: python benchmarks/bench_smart_order_positions.py [alerts] [latency_ms]
+"""
+import os
+import sys
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+from api.broker_client import BrokerResponse
+from api.position_snapshot import PositionSnapshot
+
+
+class StubPool:
+    def __init__(self, positions, latency):
+        self.positions = positions
+        self.latency = latency
+        self.calls = Counter()
+
+    def request(self, method, endpoint, body=None, headers=None):
+        self.calls[endpoint.rsplit('/', 1)[-1]] += 1
+        time.sleep(self.latency)
+        if endpoint.endswith('getPosition'):
+            body = {'status': True, 'data': self.positions}
+        else:
+            body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def run(alerts, stub):
+    broker_scheduler._scheduler = None
+    stub.calls.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(alerts)) as pool:
+        results = list(pool.map(lambda alert: order_api.place_smartorder_api(
+            alert, auth_token='jwt', broker_api_key='apikey'), alerts))
+    return time.perf_counter() - start, sum(1 for _, _, orderid in results if orderid), dict(stub.calls)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+    positions = [{'tradingsymbol': f'SYM{i}', 'exchange': 'NSE', 'producttype': 'INTRADAY', 'netqty': '10'}
+                 for i in range(count)]
+    alerts = [{'apikey': 'key', 'strategy': 'bench', 'symbol': f'SYM{i}', 'exchange': 'NSE', 'action': 'BUY',
+               'product': 'MIS', 'pricetype': 'MARKET', 'quantity': '5', 'position_size': '0'} for i in range(count)]
+    stub = StubPool(positions, latency)
+    broker_client.get_broker_pool = lambda host=None, port=None: stub
+    order_api.get_token = lambda symbol, exchange: '1'
+    order_api.get_br_symbol = lambda symbol, exchange: symbol
+    order_api.transform_data.__globals__['get_br_symbol'] = lambda symbol, exchange: symbol
+    print(f"{count} concurrent smart orders, {latency * 1000:.0f} ms broker latency")
+
+    snapshot = order_api.get_position_snapshot
+
+    def fetch_every_time(account, fetch):
+        response = fetch()
+        return PositionSnapshot(response['data']) if response.get('status') is True else None
+
+    order_api.get_position_snapshot = fetch_every_time
+    elapsed, placed, calls = run(alerts, stub)
+    print(f"  per-alert fetch  {elapsed:6.2f}s  {placed}/{count} placed  broker calls {calls}")
+
+    order_api.get_position_snapshot = snapshot
+    elapsed, placed, calls = run(alerts, stub)
+    print(f"  shared snapshot  {elapsed:6.2f}s  {placed}/{count} placed  broker calls {calls}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: an order above the freeze quantity via /placeorder vs /splitorder.
+
+The stub broker has a fixed latency and, like the exchange, rejects any order above
+the freeze quantity of NIFTY options. The parent order is first sent whole through
+/placeorder (rejected), then as the child orders a trader would re-send one at a
+time, then through /splitorder, whose children go out concurrently under the
+outbound rate limiter. Every split must place the full quantity, no child may
+exceed the freeze limit and every child must be a whole number of lots.
+
+Usage: python benchmarks/bench_split_order.py [lots] [latency_ms]
+"""
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='split_order_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}/algo.db"
+os.environ['IDEMPOTENCY_WINDOW'] = '0'
+
+from flask import Flask
+
+import api.order_api as order_api
+import api.broker_client as broker_client
+import api.broker_scheduler as broker_scheduler
+import api.split_order as split_order
+import blueprints.api_v1 as api_v1
+from api.broker_client import BrokerResponse
+from database.apilog_db import init_db as init_log_db, order_log_writer
+from database.auth_db import ApiKeyIdentity
+from database.idempotency_db import init_db as init_idempotency_db
+from extensions import socketio
+
+LOT_SIZE = 75
+FREEZE = split_order.get_freeze_limit('NIFTY', 'NFO')
+SYMBOL = 'NIFTY30DEC2524000CE'
+
+
+class StubExchange:
+    def __init__(self, latency):
+        self.latency = latency
+        self.accepted = []
+        self.lock = threading.Lock()
+
+    def request(self, method, endpoint, body=None, headers=None):
+        time.sleep(self.latency)
+        quantity = int(json.loads(body)['quantity'])
+        if quantity > FREEZE:
+            body = {'status': False, 'message': f'Quantity {quantity} exceeds the freeze limit', 'data': None}
+            return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+        with self.lock:
+            self.accepted.append(quantity)
+        body = {'status': True, 'data': {'orderid': str(time.monotonic_ns())}}
+        return BrokerResponse(200, 'OK', {}, json.dumps(body).encode())
+
+
+def main():
+    lots = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 150) / 1000
+    quantity = lots * LOT_SIZE
+
+    init_log_db()
+    init_idempotency_db()
+    exchange = StubExchange(latency)
+    broker_client.get_broker_pool = lambda host=None, port=None: exchange
+    order_api.get_token = lambda symbol, exchange: '1'
+    order_api.transform_data.__globals__['get_br_symbol'] = lambda symbol, exchange: symbol
+    split_order.get_symbol_details = lambda symbol, exchange: {'token': '1', 'brsymbol': symbol, 'name': 'NIFTY',
+                                                               'lotsize': LOT_SIZE}
+    identity = ApiKeyIdentity('user1', 'user1', False, 'broker-key', 'jwt', 'feed')
+    api_v1.authenticate_login_user = lambda api_key: identity
+    order_api.get_broker_credentials = lambda user_id: None
+    order_api.get_auth_token = lambda name: 'jwt'
+
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.api_v1_bp)
+    socketio.init_app(app)
+    client = app.test_client()
+    order = {'apikey': 'key', 'strategy': 'bench', 'symbol': SYMBOL, 'exchange': 'NFO', 'action': 'BUY',
+             'quantity': str(quantity), 'pricetype': 'MARKET', 'product': 'NRML'}
+    children = split_order.plan_split(quantity, LOT_SIZE, FREEZE)
+    print(f"{lots} lots of {SYMBOL} ({quantity}), freeze limit {FREEZE}, {latency * 1000:.0f} ms broker latency")
+
+    broker_scheduler._scheduler = None
+    response = client.post('/api/v1/placeorder', json=order)
+    print(f"  placeorder        status {response.status_code}: {response.get_json().get('message')}")
+
+    broker_scheduler._scheduler = None
+    exchange.accepted.clear()
+    start = time.perf_counter()
+    for child in children:
+        client.post('/api/v1/placeorder', json=dict(order, quantity=str(child)))
+    print(f"  manual re-sends   {(time.perf_counter() - start) * 1000:8.0f} ms  {len(exchange.accepted)} orders "
+          f"for {sum(exchange.accepted)}")
+
+    broker_scheduler._scheduler = None
+    exchange.accepted.clear()
+    start = time.perf_counter()
+    body = client.post('/api/v1/splitorder', json=order).get_json()
+    print(f"  splitorder        {(time.perf_counter() - start) * 1000:8.0f} ms  {len(body['orderids'])} orders "
+          f"for {body['placed_quantity']}  ({body['message']})")
+    assert body['status'] == 'success' and body['placed_quantity'] == quantity == sum(exchange.accepted)
+    assert all(child <= FREEZE and child % LOT_SIZE == 0 for child in exchange.accepted)
+    order_log_writer.flush(10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: SQL LIKE '%term%' vs the in-memory symbol search index.
+
+Loads a synthetic scrip master into a scratch SQLite database, builds the
+search index and times autocomplete-style queries (one keystroke at a time)
+against both. For every query the index must return the same matches as the
+database whenever there are fewer than the 50-result limit.
+
+Usage: python benchmarks/bench_symbol_search.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+from database.master_contract_db import (SymToken, init_db, process_angel_data_direct, replace_symtoken_table,
+                                         db_session)
+from database.symbol_search import build_search_index
+from benchmarks.bench_master_contract_transform import synthetic_scrip_master
+
+TERMS = ['RELIANCE', 'NIFTY25', 'BANKNIFTY', 'SBIN', 'GOLD', 'USDINR', '45000CE', 'ZZZ']
+
+
+def keystrokes(term):
+    return [term[:i] for i in range(1, len(term) + 1)]
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def sql_search(term, exchange):
+    return SymToken.query.filter(SymToken.symbol.like(f'%{term}%'), SymToken.exchange == exchange).limit(50).all()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    init_db()
+    replace_symtoken_table([process_angel_data_direct(synthetic_scrip_master(rows))])
+
+    start = time.perf_counter()
+    index = build_search_index()
+    print(f"{rows} symbols, search index built in {time.perf_counter() - start:.2f}s")
+
+    queries = [(prefix, exchange) for term in TERMS for prefix in keystrokes(term) for exchange in ('NSE', 'NFO', 'MCX')]
+    timings = {'sql': [], 'index': []}
+    for query, exchange in queries:
+        start = time.perf_counter()
+        expected = sql_search(query, exchange)
+        timings['sql'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = index.search(query, exchange, limit=50)
+        timings['index'].append(time.perf_counter() - start)
+
+        if len(expected) < 50:
+            assert sorted(r.token for r in found) == sorted(r.token for r in expected), (query, exchange)
+        assert all(query in r.symbol for r in found)
+        db_session.remove()
+
+    for label, samples in timings.items():
+        print(f"  {label:<6} p50 {percentile(samples, 0.5) * 1000:8.3f} ms  p99 {percentile(samples, 0.99) * 1000:8.3f} ms"
+              f"  over {len(samples)} queries")
+    print(f"  same matches, p50 speedup {percentile(timings['sql'], 0.5) / percentile(timings['index'], 0.5):.0f}x")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        os.remove(_scratch)
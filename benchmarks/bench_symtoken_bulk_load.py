@@ -0,0 +1,80 @@
+"""
+Benchmark: ORM bulk_insert_mappings vs dialect-native bulk load of symtoken.
+
+Processes a synthetic scrip master, loads it into a scratch database through the
+previous ORM path (a query delete plus `bulk_insert_mappings`, kept here as the
+baseline) and through
+`bulk_load_symtoken`, checks that both leave the same rows behind and prints the
+timings. Point DATABASE_URL at a scratch PostgreSQL database to measure COPY;
+by default a temporary SQLite file is used.
+
+Usage: python benchmarks/bench_symtoken_bulk_load.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = None
+if 'BENCH_DATABASE_URL' in os.environ:
+    os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+else:
+    _scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f"sqlite:///{_scratch}"
+
+import pandas as pd
+from sqlalchemy import select
+from benchmarks.bench_master_contract_transform import synthetic_scrip_master
+from database.master_contract_db import (SymToken, SYMTOKEN_COLUMNS, engine, db_session, init_db,
+                                         process_angel_data_direct, bulk_load_symtoken)
+
+
+def delete_symtoken_table():
+    SymToken.query.delete()
+    db_session.commit()
+
+
+def orm_bulk_insert(df):
+    """The load path bulk_load_symtoken replaced: skip known tokens, then bulk_insert_mappings."""
+    data_dict = df.to_dict(orient='records')
+    existing_tokens = {result.token for result in db_session.query(SymToken.token).all()}
+    db_session.bulk_insert_mappings(SymToken, [row for row in data_dict if row['token'] not in existing_tokens])
+    db_session.commit()
+
+
+def table_contents():
+    query = select(*[getattr(SymToken, c) for c in SYMTOKEN_COLUMNS]).order_by(SymToken.token, SymToken.exchange)
+    with engine.connect() as conn:
+        return pd.DataFrame(conn.execute(query).all(), columns=SYMTOKEN_COLUMNS)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"Generating synthetic scrip master with {rows} rows on {engine.dialect.name}...")
+    df = process_angel_data_direct(synthetic_scrip_master(rows))
+    init_db()
+
+    delete_symtoken_table()
+    start = time.perf_counter()
+    orm_bulk_insert(df)
+    orm_t = time.perf_counter() - start
+    orm_rows = table_contents()
+    print(f"  {'orm':<10} {orm_t:8.3f}s  {len(df) / orm_t:12,.0f} rows/sec")
+
+    delete_symtoken_table()
+    stats = bulk_load_symtoken(SymToken.__table__, df)
+    bulk_rows = table_contents()
+    print(f"  {'bulk':<10} {stats['seconds']:8.3f}s  {stats['rows_per_sec']:12,.0f} rows/sec")
+
+    pd.testing.assert_frame_equal(orm_rows, bulk_rows, check_dtype=False)
+    print(f"  identical rows, speedup {orm_t / stats['seconds']:.1f}x")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        if _scratch:
+            os.remove(_scratch)
@@ -1,12 +1,20 @@
-from flask import Blueprint, request, jsonify, Response
-from database.auth_db import get_api_key
-from database.apilog_db import async_log_order, executor
-from api.order_api import place_order_api, place_smartorder_api , close_all_positions , cancel_order , modify_order , cancel_all_orders_api
+from flask import Blueprint, request, jsonify, Response, g
+from database.auth_db import resolve_api_key
+from database.apilog_db import async_log_order, async_log_orders
+from database.order_queue_db import get_queued_order
+from api.order_execution import execute_order, accept_order, queued_execution_enabled
+from api.idempotency import run_idempotent, IdempotencyConflict
+from api.order_api import close_all_positions , cancel_order , modify_order , cancel_all_orders_api
+from api.order_api import resolve_order_symbols, place_basket_order_api
+from api.split_order import split_order_children, place_split_order
 from extensions import socketio  # Import SocketIO
 # Limiter disabled
 # from limiter import limiter  # Import the limiter instance
 import copy
 import os 
+import time
+from datetime import datetime
+import pytz
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +25,49 @@ API_RATE_LIMIT = os.getenv("API_RATE_LIMIT", "50 per second")
 # Create a Blueprint for version 1 of the API
 api_v1_bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 
+def authenticate_login_user(api_key):
+    """Resolve the API key and require it to belong to LOGIN_USERNAME, the account these routes act for."""
+    identity = resolve_api_key(api_key)
+    if identity is None or identity.user_id != os.getenv('LOGIN_USERNAME'):
+        return None
+    return identity
+
+@api_v1_bp.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3) if started is not None else None
+
+def request_latency_ms():
+    return _elapsed_ms(g.get('request_started'))
+
+def log_order(api_type, request_data, response_data):
+    """Queue an order log with the time spent handling the request so far."""
+    async_log_order(api_type, request_data, response_data, request_latency_ms())
+
+def request_order_logger():
+    """
+    A log_order bound to this request's start time, for orders logged off the request
+    thread (smart orders are placed on their execution lane, without an app context).
+    """
+    started = g.get('request_started')
+
+    def log(api_type, request_data, response_data):
+        async_log_order(api_type, request_data, response_data, _elapsed_ms(started))
+    return log
+
+def log_orders(api_type, entries):
+    """Queue the (request_data, response_data) logs of a batch operation as one write."""
+    async_log_orders(api_type, entries, request_latency_ms())
+
+def idempotent_response(body, status_code, replayed):
+    response = jsonify(body)
+    response.status_code = status_code
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
 @api_v1_bp.errorhandler(429)
 def ratelimit_handler(e):
     return jsonify(error="Rate limit exceeded"), 429
@@ -41,53 +92,24 @@ def place_order():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-               
-        
-
         # Check if the provided Placeorder Request API key matches the Current App API Key
-        if current_api_key != data['apikey']:
+        identity = authenticate_login_user(data['apikey'])
+        if identity is None:
             return jsonify({'status': 'error', 'message': 'Invalid TM-Algo apikey'}), 403
 
-        
-        res, response_data, order_id = place_order_api(data, user_id=login_username)
-        print(f'placeorder response : {response_data} and orderid is {order_id}')
+        def place():
+            if queued_execution_enabled():
+                # Acknowledge now, the order executor sends it to the broker
+                return accept_order('placeorder', identity.user_id, order_request_data), 202
+            return execute_order('placeorder', data, user_id=identity.user_id, auth_token=identity.auth_token,
+                                 broker_api_key=identity.broker_apikey, log=request_order_logger())
 
-        # Check if the 'data' field is not null and the order was successfully placed
-              
-        
-        if res.status == 200:
-            event_data = {'symbol': data['symbol'], 'action': data['action'], 'orderid': order_id}
-            print(f'🔔 Emitting order_event via SocketIO: {event_data}')
-            socketio.emit('order_event', event_data)
-            print(f'✅ SocketIO event emitted successfully')
-            
-            if order_id:
-                order_response_data = {
-                       'status': 'success',
-                        'orderid': order_id
-                        }
-                # Call the asynchronous log function
-                executor.submit(async_log_order,'placeorder',order_request_data, order_response_data)
-                return jsonify(order_response_data)
-                
-            else:
-                # In case 'orderid' is not in the 'data'
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Order placed but order ID not found in response',
-                    'details': response_data
-                }), 500
-        else:
-            # If 'data' is null or status is not 200, extract the message and return as error
-            message = response_data.get('message', 'Failed to place order')
-            return jsonify({
-                'status': 'error',
-                'message': message,
-                
-            }), res.status if res.status != 200 else 500  # Use the API's status code, unless it's 200 but 'data' is null
-    
+        # Retried or double-fired alerts get the first response back without reaching the broker
+        order_response_data, status_code, replayed = run_idempotent('placeorder', identity.user_id, data, place)
+        return idempotent_response(order_response_data, status_code, replayed)
+
+    except IdempotencyConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except KeyError as e:
         # Instead of returning the exception message, return a generic error message
         return jsonify({'status': 'error', 'message': 'A required field is missing from the request'}), 400
@@ -119,67 +141,222 @@ def place_smart_order():
             }), 400
 
         # Validate API key against any user in the database
-        from database.auth_db import validate_api_key
-        user_id = validate_api_key(data['apikey'])
+        identity = resolve_api_key(data['apikey'])
         
-        if not user_id:
+        if identity is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
-        
-        print(f"Valid API key for user: {user_id}")
 
-        
-        #print(f'placesmartorder_resp : {place_smartorder_api(data)}')
-        res, response_data, order_id = place_smartorder_api(data, user_id=user_id)
-        print(f'placesmartorder response: {response_data} and orderid is {order_id}')
-        
-        if res == None and response_data.get('message'):
-            order_response_data = {
-                    'status': 'success',
-                    'message': response_data.get('message')
-                }
-            
-            # Call the asynchronous log function
-            executor.submit(async_log_order,'placesmartorder',order_request_data, order_response_data)
-            return jsonify(order_response_data)
-        
-        # Check if the 'data' field is not null and the order was successfully placed
-        if res.status == 200:
-            event_data = {'symbol': data['symbol'], 'action': data['action'], 'orderid': order_id}
-            print(f'🔔 Emitting order_event (smart order) via SocketIO: {event_data}')
-            socketio.emit('order_event', event_data)
-            print(f'✅ SocketIO event emitted successfully')
-            
-            if order_id:
-                order_response_data = {
-                       'status': 'success',
-                        'orderid': order_id
-                        }
-                # Call the asynchronous log function
-                executor.submit(async_log_order,'placeorder',order_request_data, order_response_data)
-                return jsonify(order_response_data)
-                
-            else:
-                # In case 'orderid' is not in the 'data'
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Order placed but order ID not found in response',
-                    'details': response_data
-                }), 500
-        else:
-            # If 'data' is null or status is not 200, extract the message and return as error
-            message = response_data.get('message', 'Failed to place order')
-            return jsonify({
-                'status': 'error',
-                'message': message,
-                
-            }), res.status if res.status != 200 else 500  # Use the API's status code, unless it's 200 but 'data' is null
-    
+        def place():
+            if queued_execution_enabled():
+                # Acknowledge now, the order executor sends it to the broker
+                return accept_order('placesmartorder', identity.user_id, order_request_data), 202
+            return execute_order('placesmartorder', data, user_id=identity.user_id, auth_token=identity.auth_token,
+                                 broker_api_key=identity.broker_apikey, log=request_order_logger())
+
+        # Retried or double-fired alerts get the first response back without reaching the broker
+        order_response_data, status_code, replayed = run_idempotent('placesmartorder', identity.user_id, data, place)
+        return idempotent_response(order_response_data, status_code, replayed)
+
+    except IdempotencyConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except KeyError as e:
         # Instead of returning the exception message, return a generic error message
         return jsonify({'status': 'error', 'message': 'A required field is missing from the request'}), 400
     except Exception as e:
         # For other exceptions, you should also return a generic error message
         return jsonify({'status': 'error', 'message': 'An unexpected error occurred'}), 500
+
+
+@api_v1_bp.route('/basketorder', methods=['POST'])
+def basket_order():
+    try:
+        data = request.json
+
+        # Mandatory fields for the basket and for each of its legs
+        mandatory_fields = ['apikey', 'strategy', 'orders']
+        missing_fields = [field for field in mandatory_fields if field not in data or not data[field]]
+        if missing_fields:
+            return jsonify({
+                'status': 'error',
+                'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
+            }), 400
+        if not isinstance(data['orders'], list) or not all(isinstance(order, dict) for order in data['orders']):
+            return jsonify({'status': 'error', 'message': 'orders must be a list of orders'}), 400
+
+        # Every leg is checked before any is placed, so a malformed basket is never half placed
+        leg_fields = ['symbol', 'exchange', 'action', 'quantity', 'pricetype', 'product']
+        invalid_legs = []
+        for number, order in enumerate(data['orders'], start=1):
+            missing = [field for field in leg_fields if field not in order or not order[field]]
+            if missing:
+                invalid_legs.append(f'order {number}: {", ".join(missing)}')
+        if invalid_legs:
+            return jsonify({
+                'status': 'error',
+                'message': f'Missing mandatory field(s) in {"; ".join(invalid_legs)}'
+            }), 400
+
+        # Check if the provided API key matches the Current App API Key
+        identity = authenticate_login_user(data['apikey'])
+        if identity is None:
+            return jsonify({'status': 'error', 'message': 'Invalid TM-Algo apikey'}), 403
+
+        # The legs carry the basket's strategy, like orders sent to /placeorder
+        legs = [{**{key: value for key, value in order.items() if key != 'apikey'}, 'strategy': data['strategy']}
+                for order in data['orders']]
+        symbols, unknown = resolve_order_symbols(legs)
+        if unknown:
+            return jsonify({
+                'status': 'error',
+                'message': f'Unknown symbol(s): {", ".join(f"{symbol} ({exchange})" for symbol, exchange in unknown)}'
+            }), 400
+
+        def place():
+            report = place_basket_order_api(legs, symbols, auth_token=identity.auth_token,
+                                            broker_api_key=identity.broker_apikey)
+            results = [{**result['item'], 'status': result['status'], **result['response']}
+                       for result in report['results']]
+
+            event_data = {
+                'strategy': data['strategy'],
+                'placed': report['succeeded'],
+                'total': report['total'],
+                'orders': [{'symbol': result['symbol'], 'action': result['action'], 'orderid': result.get('orderid')}
+                           for result in results if result['status'] == 'success'],
+            }
+            print(f'🔔 Emitting basket_order_event via SocketIO: {event_data}')
+            try:
+                socketio.emit('basket_order_event', event_data)
+            except Exception as e:
+                # The legs are placed, a dashboard notification failing must not report them as failed
+                print(f"Error emitting basket_order_event: {e}")
+
+            log_orders('basketorder', [
+                (leg, {'status': 'success', 'orderid': result['orderid']} if result['status'] == 'success'
+                 else {'status': result['status'], 'message': result.get('message')})
+                for leg, result in zip(legs, results)
+            ])
+
+            result = {
+                'status': 'success' if report['succeeded'] == report['total'] else 'error',
+                'message': f'Placed {report["succeeded"]} of {report["total"]} orders',
+                'results': results,
+                'elapsed_ms': report['elapsed_ms'],
+            }
+            if report['succeeded']:
+                return result, 200
+            # Nothing placed is not a success to replay: 504 when legs may still be live, 502 when all failed
+            return result, 504 if report['timed_out'] else 502
+
+        # A repeated alert must not place the whole basket a second time
+        response_data, status_code, replayed = run_idempotent('basketorder', identity.user_id, data, place)
+        return idempotent_response(response_data, status_code, replayed)
+
+    except IdempotencyConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except KeyError as e:
+        return jsonify({'status': 'error', 'message': 'A required field is missing from the request'}), 400
+    except Exception as e:
+        print(f"Error in basketorder: {e}")
+        return jsonify({'status': 'error', 'message': 'An unexpected error occurred'}), 500
+
+@api_v1_bp.route('/splitorder', methods=['POST'])
+def split_order():
+    try:
+        data = request.json
+
+        # Mandatory fields list
+        mandatory_fields = ['apikey', 'strategy', 'exchange', 'symbol', 'action', 'quantity', 'pricetype', 'product']
+        missing_fields = [field for field in mandatory_fields if field not in data or not data[field]]
+        if missing_fields:
+            return jsonify({
+                'status': 'error',
+                'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
+            }), 400
+
+        # Check if the provided Placeorder Request API key matches the Current App API Key
+        identity = authenticate_login_user(data['apikey'])
+        if identity is None:
+            return jsonify({'status': 'error', 'message': 'Invalid TM-Algo apikey'}), 403
+
+        # Slice the order into child orders within the freeze limit before any is placed
+        try:
+            children, details = split_order_children(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        def place():
+            result = place_split_order(children, details, auth_token=identity.auth_token,
+                                       broker_api_key=identity.broker_apikey)
+
+            event_data = {'symbol': data['symbol'], 'action': data['action'], 'quantity': result['quantity'],
+                          'placed_quantity': result['placed_quantity'], 'orderids': result['orderids']}
+            print(f'🔔 Emitting split_order_event via SocketIO: {event_data}')
+            try:
+                socketio.emit('split_order_event', event_data)
+            except Exception as e:
+                # The orders are placed, a dashboard notification failing must not report them as failed
+                print(f"Error emitting split_order_event: {e}")
+
+            log_orders('splitorder', [
+                (child, {'status': 'success', 'orderid': outcome['orderid']} if outcome['status'] == 'success'
+                 else {'status': outcome['status'], 'message': outcome.get('message')})
+                for child, outcome in zip(children, result['results'])
+            ])
+            if result['placed_quantity']:
+                return result, 200
+            # Nothing placed is not a success to replay: 504 when children may still be live, 502 when all failed
+            return result, 504 if result['pending_quantity'] else 502
+
+        # A repeated alert must not place the whole order a second time
+        response_data, status_code, replayed = run_idempotent('splitorder', identity.user_id, data, place)
+        return idempotent_response(response_data, status_code, replayed)
+
+    except IdempotencyConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except KeyError as e:
+        return jsonify({'status': 'error', 'message': 'A required field is missing from the request'}), 400
+    except Exception as e:
+        print(f"Error in splitorder: {e}")
+        return jsonify({'status': 'error', 'message': 'An unexpected error occurred'}), 500
+
+@api_v1_bp.route('/orderstatus', methods=['POST'])
+def order_status():
+    """Outcome of an order accepted in queued execution mode, by its acknowledgement id."""
+    try:
+        data = request.json
+        missing_fields = [field for field in ['apikey', 'ackid'] if not data.get(field)]
+        if missing_fields:
+            return jsonify({
+                'status': 'error',
+                'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
+            }), 400
+
+        identity = resolve_api_key(data['apikey'])
+        if identity is None:
+            return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
+
+        order = get_queued_order(data['ackid'])
+        if order is None or order['user_id'] != identity.user_id:
+            return jsonify({'status': 'error', 'message': 'Unknown ackid'}), 404
+
+        def timestamp(value):
+            return datetime.fromtimestamp(value, pytz.timezone('Asia/Kolkata')).isoformat() if value else None
+
+        return jsonify({
+            'status': 'success',
+            'ackid': order['id'],
+            'api_type': order['kind'],
+            'state': order['state'],
+            'http_status': order['http_status'],
+            'result': order['response_data'],
+            'queued_at': timestamp(order['created_at']),
+            'started_at': timestamp(order['started_at']),
+            'finished_at': timestamp(order['finished_at']),
+        })
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': 'An unexpected error occurred'}), 500
     
 @api_v1_bp.route('/closeposition', methods=['POST'])
 def close_position():
@@ -195,24 +372,23 @@ def close_position():
         if missing_fields:
             return jsonify({'status': 'error', 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'}), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-        
         # Check if the provided API key matches the current API key
-        if data['apikey'] != current_api_key:
+        identity = authenticate_login_user(data['apikey'])
+        if identity is None:
             return jsonify({"message": "Invalid API key"}), 403
 
         # Call the function to close all positions
-        response_code, status_code = close_all_positions(current_api_key)
+        response_code, status_code = close_all_positions(data['apikey'], auth_token=identity.auth_token,
+                                                         broker_api_key=identity.broker_apikey)
 
-        # Emitting a socket event for closing position
-        event_data = {'status': 'success', 'message': 'All Open Positions SquaredOff'}
+        # Emitting a socket event for closing position, with the outcome actually reached
+        event_data = {'status': response_code.get('status', 'success'), 'message': response_code['message']}
         print(f'🔔 Emitting close_position via SocketIO: {event_data}')
         socketio.emit('close_position', event_data)
         print(f'✅ SocketIO event emitted successfully')
         
         # Asynchronously logging the action
-        executor.submit(async_log_order, 'squareoff', sqoff_request_data, "All Open Positions SquaredOff")
+        log_order('squareoff', sqoff_request_data, response_code)
 
         return jsonify(response_code), status_code
 
@@ -246,11 +422,8 @@ def cancel_order_route():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
         # Check if the provided API key matches the current API key
-        if current_api_key != data['apikey']:
+        if authenticate_login_user(data['apikey']) is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Call the cancel_order function
@@ -263,7 +436,7 @@ def cancel_order_route():
         print(f'✅ SocketIO event emitted successfully')
 
         # Log the successful order cancellation attempt
-        executor.submit(async_log_order, 'cancelorder', order_request_data, response_message)
+        log_order('cancelorder', order_request_data, response_message)
 
         # After creating your response object
         response_message = {'status': 'success', 'orderid': data['orderid']}
@@ -295,15 +468,16 @@ def cancel_all_orders():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
         # Check if the provided API key matches the current API key
-        if current_api_key != data['apikey']:
+        identity = authenticate_login_user(data['apikey'])
+        if identity is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Call the new function to process order cancellations
-        canceled_orders, failed_cancellations = cancel_all_orders_api(data)
+        canceled_orders, failed_cancellations, pending_cancellations, report = cancel_all_orders_api(
+            data, auth_token=identity.auth_token, api_key=identity.broker_apikey)
+        if report is None:
+            return jsonify({'status': 'error', 'message': 'Failed to fetch the order book'}), 502
 
         # Emit events for each canceled order
         for orderid in canceled_orders:
@@ -315,16 +489,23 @@ def cancel_all_orders():
         # Optionally, emit events for failed cancellations if needed
 
         # Asynchronously log the cancellation attempt
-        executor.submit(async_log_order, 'cancelallorder', order_request_data, {
+        log_order('cancelallorder', order_request_data, {
             'canceled_orders': canceled_orders,
-            'failed_cancellations': failed_cancellations
+            'failed_cancellations': failed_cancellations,
+            'pending_cancellations': pending_cancellations
         })
 
-        # Return a success response
+        # Success only when every cancellation went through; pending ones may still be carried out
         message = f'Canceled {len(canceled_orders)} orders. Failed to cancel {len(failed_cancellations)} orders.'
+        if pending_cancellations:
+            message += f' {len(pending_cancellations)} cancellations pending, check the order book.'
         return jsonify({
-            'status': 'success',
-            'message': message
+            'status': 'success' if report['succeeded'] == report['total'] else 'error',
+            'message': message,
+            'canceled_orders': canceled_orders,
+            'failed_cancellations': failed_cancellations,
+            'pending_cancellations': pending_cancellations,
+            'report': report
         })
 
     except KeyError as e:
@@ -350,10 +531,7 @@ def modify_order_route():
         if missing_fields:
             return jsonify({'status': 'error', 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'}), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
-        if data['apikey'] != current_api_key:
+        if authenticate_login_user(data['apikey']) is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Assuming modify_order requires specific parameters from `data` and returns a response_message and a status_code
@@ -366,7 +544,7 @@ def modify_order_route():
         print(f'✅ SocketIO event emitted successfully')
         
         # Asynchronously logging the order modification attempt
-        executor.submit(async_log_order, 'modifyorder', order_request_data, response_message)
+        log_order('modifyorder', order_request_data, response_message)
 
         return jsonify(response_message), 200
 
@@ -7,14 +7,13 @@ from flask_cors import cross_origin
 # from limiter import limiter  # Import the limiter instance
 from datetime import datetime, timedelta
 import pytz
-import http.client
 import json
 import os
 import traceback
 import sqlite3
-from threading import Thread
-from database.auth_db import get_auth_token, check_user_approval, store_auth_tokens, get_user_by_username, get_user_by_id, create_user, check_user_approval, upsert_auth
-from database.master_contract_db import master_contract_download
+from database.auth_db import get_auth_token, check_user_approval, store_auth_tokens, get_user_by_username, get_user_by_id, create_user, check_user_approval, upsert_auth, invalidate_broker_credentials
+from database.master_contract_refresh import refresh_master_contract
+from api.broker_client import broker_request
 from flask_bcrypt import Bcrypt
 
 # Initialize Bcrypt
@@ -54,12 +53,13 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 def async_master_contract_download(user):
     """
-    Asynchronously download the master contract and emit a WebSocket event upon completion.
+    Start a background master contract refresh, or join the one already running,
+    and return its status. A WebSocket event is emitted upon completion.
     """
     try:
         print(f"Starting master contract download for user: {user}")
-        master_contract_status = master_contract_download()
-        print(f"Master contract download completed with status: {master_contract_status}")
+        master_contract_status = refresh_master_contract(triggered_by=f"login:{user}", wait=False)
+        print(f"Master contract download status: {master_contract_status.get('state', master_contract_status.get('status'))}")
         return master_contract_status
     except Exception as e:
         print(f"ERROR in master contract download: {str(e)}")
@@ -180,7 +180,6 @@ def login():
             # We'll rely on the Angel One API to verify credentials
             
             print(f"Connecting to AngelOne API for authentication...")
-            conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
             
             # Prepare login payload
             payload = json.dumps({
@@ -207,12 +206,10 @@ def login():
             # Make the API request
             try:
                 print(f"Sending authentication request to AngelOne API...")
-                conn.request("POST", "/rest/auth/angelbroking/user/v1/loginByPassword", payload, headers)
-                res = conn.getresponse()
-                data = res.read()
+                res = broker_request("POST", "/rest/auth/angelbroking/user/v1/loginByPassword", payload, headers)
                 
                 print(f"Received response from AngelOne API: Status {res.status}")
-                response_json = json.loads(data.decode("utf-8"))
+                response_json = res.json()
                 
                 # Process API response
                 if response_json.get('status') == True:
@@ -257,10 +254,8 @@ def login():
                         
                         # Admin functionality removed - no admin checks needed
                         
-                        # Start master contract download in the background
-                        thread = Thread(target=async_master_contract_download, args=(user,))
-                        thread.daemon = True
-                        thread.start()
+                        # Start master contract download in the background, shared with any refresh already running
+                        async_master_contract_download(user)
                         
                         print(f"User {username} logged in successfully")
                         
@@ -333,6 +328,7 @@ def logout():
                 print(f"Auth token revoked successfully, ID: {inserted_id}")
             else:
                 print("Failed to revoke auth token in database")
+            invalidate_broker_credentials(username=username)
         
         # Clear all user session data
         session.pop('user', None)
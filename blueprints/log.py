@@ -1,39 +1,80 @@
 # blueprints/log.py
 
 from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request
-from database.apilog_db import OrderLog
-from sqlalchemy import func
-import pytz
+from database.order_log_query import query_order_logs, ist_day_range, today_ist, DEFAULT_PAGE_SIZE
+from database.order_log_archive import query_order_log_history
+from database.order_log_retention import get_order_log_retention_status, run_order_log_retention
 from datetime import datetime
+import threading
 
 log_bp = Blueprint('log_bp', __name__, url_prefix='/logs')
 
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
 @log_bp.route('/')
 def view_logs():
     if not session.get('logged_in'):
         return redirect(url_for('auth.login'))
 
-    # Set timezone to IST
-    ist = pytz.timezone('Asia/Kolkata')
-    
-    # Get the current date in IST
-    today_ist = datetime.now(ist).date()
-
-    # Filter logs by today's date in IST
-    logs = OrderLog.query.filter(func.date(OrderLog.created_at) == today_ist).order_by(OrderLog.created_at.desc()).all()
-
-    logs_data = [{
-        'id': log.id,
-        'symbol': log.symbol,
-        'action': log.action,
-        'quantity': log.quantity,
-        'price': log.price,
-        'order_id': log.order_id,
-        'created_at': log.created_at.strftime('%Y-%m-%d %H:%M:%S') if log.created_at else None
-    } for log in logs]
-    
+    # Today's logs in IST, newest first, one page at a time
+    start, end = ist_day_range(today_ist())
+    try:
+        logs_data, next_cursor = query_order_logs(start, end, cursor=request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('log_bp.view_logs'))
+
     # Check if this is an API request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-        return jsonify({'status': 'success', 'logs': logs_data})
+        return jsonify({'status': 'success', 'logs': logs_data, 'next_cursor': next_cursor})
     else:
-        return render_template('logs.html', logs=logs_data)
\ No newline at end of file
+        return render_template('logs.html', logs=logs_data, next_cursor=next_cursor)
+
+
+@log_bp.route('/api')
+def logs_api():
+    """
+    Order logs as JSON, newest first, including archived logs for days past the
+    retention window. Query parameters: date or start/end (YYYY-MM-DD, IST, end
+    inclusive; defaults to today), api_type, strategy, symbol, action, orderid, limit
+    and cursor (the next_cursor of the previous page).
+    """
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    try:
+        if request.args.get('start') or request.args.get('end'):
+            start_day = parse_date(request.args.get('start') or request.args['end'])
+            end_day = parse_date(request.args.get('end') or request.args['start'])
+        else:
+            start_day = end_day = parse_date(request.args['date']) if request.args.get('date') else today_ist()
+        start = ist_day_range(start_day)[0]
+        end = ist_day_range(end_day)[1]
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        logs_data, next_cursor = query_order_log_history(
+            start, end,
+            api_type=request.args.get('api_type'),
+            strategy=request.args.get('strategy'),
+            symbol=request.args.get('symbol'),
+            action=request.args.get('action'),
+            orderid=request.args.get('orderid'),
+            cursor=request.args.get('cursor'),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query parameter: {e}'}), 400
+
+    return jsonify({'status': 'success', 'logs': logs_data, 'next_cursor': next_cursor})
+
+
+@log_bp.route('/retention', methods=['GET', 'POST'])
+def retention():
+    """Status of order log retention; POST runs it now in the background."""
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    if request.method == 'POST':
+        threading.Thread(target=run_order_log_retention, daemon=True).start()
+    return jsonify({'status': 'success', 'retention': get_order_log_retention_status()})
@@ -2,9 +2,58 @@ from flask import Blueprint, jsonify, request, render_template, session, redirec
 from api.order_api import get_order_book, get_trade_book, get_positions, get_holdings
 from mapping.order_data import calculate_order_statistics, map_order_data,map_trade_data, map_position_data, map_portfolio_data, calculate_portfolio_statistics
 from mapping.order_data import transform_order_data, transform_tradebook_data, transform_positions_data, transform_holdings_data
+from api.book_cache import get_cached_book
 # Define the blueprint
 orders_bp = Blueprint('orders_bp', __name__, url_prefix='/')
 
+
+def json_response(payload):
+    """JSON response with an ETag, answered with 304 Not Modified when the client already has it."""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def cached_view(name, load):
+    """Serve the view from the per-account book cache, keyed by the session's broker token."""
+    return get_cached_book(session.get('AUTH_TOKEN'), name, load)
+
+
+def load_orderbook():
+    order_data = get_order_book()
+    if order_data.get('status') == 'error':
+        return False, order_data
+    order_data = map_order_data(order_data=order_data)
+    order_stats = calculate_order_statistics(order_data)
+    return True, {'data': transform_order_data(order_data), 'stats': order_stats}
+
+
+def load_tradebook():
+    tradebook_data = get_trade_book()
+    if tradebook_data.get('status') == 'error':
+        return False, tradebook_data
+    tradebook_data = map_trade_data(trade_data=tradebook_data)
+    return True, transform_tradebook_data(tradebook_data)
+
+
+def load_positions():
+    positions_data = get_positions()
+    if positions_data.get('status') == 'error':
+        return False, positions_data
+    positions_data = map_position_data(positions_data)
+    return True, transform_positions_data(positions_data)
+
+
+def load_holdings():
+    holdings_data = get_holdings()
+    if holdings_data.get('status') == 'error':
+        return False, holdings_data
+    mapped_data = map_portfolio_data(holdings_data)
+    portfolio_stats = calculate_portfolio_statistics(mapped_data)
+    return True, {'holdings': transform_holdings_data(mapped_data), 'stats': portfolio_stats}
+
+
 @orders_bp.route('/orderbook')
 def orderbook():
     try:
@@ -14,45 +63,23 @@ def orderbook():
             print("DEBUG - User not logged in, redirecting to login page")
             return redirect(url_for('auth.login'))
         
-        print("DEBUG - User is logged in, session data:", dict(session))
-        print("DEBUG - Calling get_order_book()")
-        
-        order_data = get_order_book()
-        print("DEBUG - Order Book Response:", order_data)
+        ok, order_view = cached_view('orderbook', load_orderbook)
     
         # Check if there's an error in the API response
-        if order_data.get('status') == 'error':
-            error_message = order_data.get('message', 'Unknown error occurred')
+        if not ok:
+            error_message = order_view.get('message', 'Unknown error occurred')
             print(f"DEBUG - Order book API error: {error_message}")
             # Instead of logging out, show an error message
             return jsonify({'status': 'error', 'message': error_message, 'data': []})
 
-        try:
-            # Process the data if no errors
-            print("DEBUG - Calling map_order_data()")
-            order_data = map_order_data(order_data=order_data)       
-            print("DEBUG - After mapping:", order_data)
+        order_data = order_view['data']
+        order_stats = order_view['stats']
 
-            print("DEBUG - Calling calculate_order_statistics()")
-            order_stats = calculate_order_statistics(order_data)
-            print("DEBUG - Order stats:", order_stats)
-            
-            print("DEBUG - Calling transform_order_data()")
-            order_data = transform_order_data(order_data)
-            print("DEBUG - After transform:", order_data)
-            
-            # Pass the data to the orderbook.html template
-            print("DEBUG - Rendering template with data")
-            # Check if this is an API request
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return jsonify({'status': 'success', 'data': order_data, 'stats': order_stats})
-            else:
-                return render_template('orderbook.html', order_data=order_data, order_stats=order_stats)
-        except Exception as e:
-            import traceback
-            print(f"DEBUG - Error processing order data: {str(e)}")
-            traceback.print_exc()
-            return jsonify({'status': 'error', 'message': f"Error processing data: {str(e)}", 'data': []})
+        # Check if this is an API request
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
+            return json_response({'status': 'success', 'data': order_data, 'stats': order_stats})
+        else:
+            return render_template('orderbook.html', order_data=order_data, order_stats=order_stats)
     except Exception as outer_e:
         import traceback
         print(f"DEBUG - Outer exception in orderbook route: {str(outer_e)}")
@@ -71,26 +98,20 @@ def tradebook():
         return redirect(url_for('auth.login'))
     
     try:
-        tradebook_data = get_trade_book()
-        print(tradebook_data)
+        ok, tradebook_data = cached_view('tradebook', load_tradebook)
 
         # Check if there's an error in the API response
-        if tradebook_data.get('status') == 'error':
+        if not ok:
             if request.headers.get('Accept') == 'application/json' or request.is_json:
                 return jsonify({
                     'status': 'error', 
                     'message': tradebook_data.get('message', 'Failed to fetch trade book')
                 }), 500
             return redirect(url_for('auth.logout'))
-
-        # Process the data
-        tradebook_data = map_trade_data(trade_data=tradebook_data) 
-        tradebook_data = transform_tradebook_data(tradebook_data)
-        print(tradebook_data)
         
         # Check if request wants JSON (from React frontend)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'data': tradebook_data
             })
@@ -119,26 +140,20 @@ def positions():
         return redirect(url_for('auth.login'))
     
     try:
-        positions_data = get_positions()
-        print(positions_data)
+        ok, positions_data = cached_view('positions', load_positions)
 
         # Check if there's an error in the API response
-        if positions_data.get('status') == 'error':
+        if not ok:
             if request.headers.get('Accept') == 'application/json' or request.is_json:
                 return jsonify({
                     'status': 'error', 
                     'message': positions_data.get('message', 'Failed to fetch positions')
                 }), 500
             return redirect(url_for('auth.logout'))
-
-        # Process the data
-        positions_data = map_position_data(positions_data)
-        positions_data = transform_positions_data(positions_data)
-        print(positions_data)
         
         # Check if request wants JSON (from React frontend)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'data': positions_data
             })
@@ -166,16 +181,11 @@ def holdings():
         return redirect(url_for('auth.login'))
     
     try:
-        print("DEBUG - Starting holdings route handler")
-        print("DEBUG - User is logged in, session data:", dict(session))
-        print("DEBUG - Calling get_holdings()")
-        
-        holdings_data = get_holdings()
-        print("DEBUG - Holdings Response:", holdings_data)
+        ok, holdings_view = cached_view('holdings', load_holdings)
         
         # Check if there's an error in the API response
-        if holdings_data.get('status') == 'error':
-            error_message = holdings_data.get('message', 'Unknown error occurred')
+        if not ok:
+            error_message = holdings_view.get('message', 'Unknown error occurred')
             print(f"DEBUG - Holdings API error: {error_message}")
             
             if request.headers.get('Accept') == 'application/json' or request.is_json:
@@ -184,45 +194,22 @@ def holdings():
                     'message': error_message
                 }), 500
             return jsonify({'status': 'error', 'message': error_message, 'data': []})
+
+        transformed_data = holdings_view['holdings']
+        portfolio_stats = holdings_view['stats']
         
-        try:
-            # Process the data if no errors
-            print("DEBUG - Calling map_portfolio_data()")
-            mapped_data = map_portfolio_data(holdings_data)
-            print("DEBUG - After mapping:", mapped_data)
-            
-            print("DEBUG - Calling calculate_portfolio_statistics()")
-            portfolio_stats = calculate_portfolio_statistics(mapped_data)
-            print("DEBUG - Portfolio stats:", portfolio_stats)
-            
-            print("DEBUG - Calling transform_holdings_data()")
-            transformed_data = transform_holdings_data(mapped_data)
-            print("DEBUG - After transform:", transformed_data)
-            
-            # Check if request wants JSON (from React frontend)
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return jsonify({
-                    'status': 'success',
-                    'data': {
-                        'holdings': transformed_data,
-                        'stats': portfolio_stats
-                    }
-                })
-            else:
-                # For browser requests, render HTML template
-                return render_template('holdings.html', holdings=transformed_data, portfolio_stats=portfolio_stats)
-                
-        except Exception as e:
-            import traceback
-            print(f"DEBUG - Error processing holdings data: {str(e)}")
-            traceback.print_exc()
-            
-            if request.headers.get('Accept') == 'application/json' or request.is_json:
-                return jsonify({
-                    'status': 'error',
-                    'message': f"Error processing data: {str(e)}"
-                }), 500
-            return jsonify({'status': 'error', 'message': f"Error processing data: {str(e)}", 'data': []})
+        # Check if request wants JSON (from React frontend)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
+            return json_response({
+                'status': 'success',
+                'data': {
+                    'holdings': transformed_data,
+                    'stats': portfolio_stats
+                }
+            })
+        else:
+            # For browser requests, render HTML template
+            return render_template('holdings.html', holdings=transformed_data, portfolio_stats=portfolio_stats)
             
     except Exception as outer_e:
         import traceback
@@ -16,12 +16,13 @@ def search():
     
     symbol = request.args.get('symbol')
     exchange = request.args.get('exchange')
+    instrumenttype = request.args.get('instrumenttype') or None
     
     # If no search params, just render the page
     if not symbol:
         return render_template('search.html')
     
-    results = search_symbols(symbol, exchange)
+    results = search_symbols(symbol, exchange, instrumenttype)
     
     # Check if this is an API/AJAX request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
@@ -54,11 +55,12 @@ def get_suggestions():
     
     symbol = request.args.get('term', '')  # 'term' is common for jQuery autocomplete
     exchange = request.args.get('exchange', 'NSE')
+    instrumenttype = request.args.get('instrumenttype') or None
     
     if not symbol or len(symbol) < 1:
         return jsonify([])
         
-    results = search_symbols(symbol, exchange)
+    results = search_symbols(symbol, exchange, instrumenttype)
     
     # Format suggestions as a list of items
     suggestions = [{
@@ -77,8 +79,18 @@ def download_master_contract():
         return redirect(url_for('auth.login'))
     
     try:
-        from database.master_contract_db import master_contract_download
-        result = master_contract_download()
-        return jsonify({'status': 'success', 'message': 'Master contract download initiated'})
+        from database.master_contract_refresh import refresh_master_contract
+        force = request.args.get('force', '').lower() in ('1', 'true')
+        result = refresh_master_contract(triggered_by=f"user:{session.get('user')}", force=force, wait=False)
+        return jsonify({'status': 'success', 'message': 'Master contract download initiated', 'result': result})
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)})
+
+# Status and progress of the current or most recent master contract download
+@search_bp.route('/download-master-contract/status')
+def download_master_contract_status():
+    if not session.get('logged_in'):
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+
+    from database.master_contract_refresh import get_master_contract_status
+    return jsonify({'status': 'success', 'data': get_master_contract_status()})
\ No newline at end of file
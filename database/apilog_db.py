@@ -2,11 +2,14 @@
 
 import os
 import json
-from sqlalchemy import create_engine, Column, Integer, DateTime, Text
+import atexit
+import queue
+import threading
+import time
+from sqlalchemy import create_engine, Column, Integer, Float, DateTime, Text, Index, inspect, text, select, update, bindparam, and_
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
-from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 import pytz
@@ -15,6 +18,16 @@ from utils.colored_logger import logger
 
 load_dotenv()
 
+# Order log writer settings
+ORDER_LOG_QUEUE_SIZE = int(os.getenv('ORDER_LOG_QUEUE_SIZE', '10000'))
+ORDER_LOG_BATCH_SIZE = int(os.getenv('ORDER_LOG_BATCH_SIZE', '200'))
+ORDER_LOG_FLUSH_INTERVAL_MS = int(os.getenv('ORDER_LOG_FLUSH_INTERVAL_MS', '200'))
+# What to do when the queue is full: 'block' waits up to ORDER_LOG_ENQUEUE_TIMEOUT_MS, then drops; 'drop' drops at once
+ORDER_LOG_FULL_POLICY = os.getenv('ORDER_LOG_FULL_POLICY', 'block').lower()
+ORDER_LOG_ENQUEUE_TIMEOUT_MS = int(os.getenv('ORDER_LOG_ENQUEUE_TIMEOUT_MS', '1000'))
+# Rows converted per transaction when extracting columns from older order logs
+ORDER_LOG_BACKFILL_BATCH = int(os.getenv('ORDER_LOG_BACKFILL_BATCH', '1000'))
+
 # Try multiple environment variable names for database URL (with and without db_ prefix)
 DATABASE_URL = (
     os.environ.get('POSTGRES_URL') or 
@@ -46,31 +59,287 @@ class OrderLog(Base):
     request_data = Column(Text, nullable=False)
     response_data = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), default=func.now())
+    # Fields extracted from the payloads so logs can be queried without parsing them
+    strategy = Column(Text)
+    symbol = Column(Text)
+    exchange = Column(Text)
+    action = Column(Text)
+    quantity = Column(Integer)
+    orderid = Column(Text)
+    status = Column(Text)
+    latency_ms = Column(Float)
+
+    # Logs are read newest first by date range, optionally for one api_type, strategy or symbol
+    __table_args__ = (
+        Index('ix_order_logs_created_at_id', 'created_at', 'id'),
+        Index('ix_order_logs_api_type_created_at', 'api_type', 'created_at', 'id'),
+        Index('ix_order_logs_strategy_created_at', 'strategy', 'created_at', 'id'),
+        Index('ix_order_logs_symbol_created_at', 'symbol', 'created_at', 'id'),
+        Index('ix_order_logs_orderid', 'orderid'),
+    )
+
+EXTRACTED_COLUMNS = ['strategy', 'symbol', 'exchange', 'action', 'quantity', 'orderid', 'status']
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_log_fields(request_data, response_data):
+    """The indexed OrderLog columns for a request/response pair (parsed JSON or dicts)."""
+    request_data = request_data if isinstance(request_data, dict) else {}
+    response_data = response_data if isinstance(response_data, dict) else {}
+    nested = response_data.get('data') if isinstance(response_data.get('data'), dict) else {}
+    action = request_data.get('action')
+    status = response_data.get('status')
+    orderid = response_data.get('orderid') or nested.get('orderid') or request_data.get('orderid')
+    return {
+        'strategy': request_data.get('strategy'),
+        'symbol': request_data.get('symbol'),
+        'exchange': request_data.get('exchange'),
+        'action': action.upper() if isinstance(action, str) else None,
+        'quantity': _to_int(request_data.get('quantity')),
+        'orderid': str(orderid) if orderid is not None else None,
+        'status': str(status).lower() if status is not None else None,
+    }
+
+
+def _add_missing_columns():
+    """Add extracted columns missing from an order_logs table created by an older version."""
+    existing = {column['name'] for column in inspect(engine).get_columns(OrderLog.__tablename__)}
+    missing = [column for column in OrderLog.__table__.columns if column.name not in existing]
+    if not missing:
+        return False
+    with engine.begin() as conn:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE {OrderLog.__tablename__} ADD COLUMN {column.name} {column_type}'))
+    print(f"Added order log columns: {', '.join(column.name for column in missing)}")
+    return True
+
 
 def init_db():
     print("Initializing API Log DB")
     Base.metadata.create_all(bind=engine)
+    migrated = _add_missing_columns()
+    # create_all skips tables that already exist, add indexes missing from older databases
+    for index in OrderLog.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    if migrated:
+        # Existing rows get their columns filled in the background
+        threading.Thread(target=backfill_order_log_columns, daemon=True).start()
 
 
+def backfill_order_log_columns(batch_size=ORDER_LOG_BACKFILL_BATCH, progress=None):
+    """
+    Fill the extracted columns of order logs written before they existed, in id order,
+    one transaction per batch so the table is never locked for long. Safe to rerun: it
+    only picks rows whose extracted columns are all empty. Returns the rows converted.
+    """
+    table = OrderLog.__table__
+    pending = and_(*[table.c[name].is_(None) for name in EXTRACTED_COLUMNS])
+    statement = (update(table).where(table.c.id == bindparam('_id'))
+                 .values({name: bindparam(name) for name in EXTRACTED_COLUMNS}))
+    last_id = 0
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.request_data, table.c.response_data)
+                .where(table.c.id > last_id, pending).order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for log_id, request_data, response_data in rows:
+                try:
+                    fields = extract_log_fields(json.loads(request_data), json.loads(response_data))
+                except (TypeError, ValueError):
+                    fields = dict.fromkeys(EXTRACTED_COLUMNS)
+                updates.append({'_id': log_id, **fields})
+            conn.execute(statement, updates)
+        last_id = rows[-1][0]
+        converted += len(rows)
+        if progress:
+            progress(converted, last_id)
+    print(f"Order log backfill converted {converted} rows")
+    return converted
 
-# Executor for asynchronous tasks
-executor = ThreadPoolExecutor(2)
 
-def async_log_order(api_type,request_data, response_data):
-    try:
-        # Serialize JSON data for storage
-        request_json = json.dumps(request_data)
-        response_json = json.dumps(response_data)
 
-        # Get current time in IST
-        ist = pytz.timezone('Asia/Kolkata')
-        now_ist = datetime.now(ist)
+class OrderLogWriter:
+    """
+    Writes order logs from a bounded in-memory queue on a background thread.
+
+    Rows are serialized and timestamped by the caller, then inserted in batches of up
+    to `batch_size` rows, one transaction per batch, at least every `flush_interval`
+    seconds. When the queue is full the row is dropped (after waiting up to
+    `enqueue_timeout` seconds under the 'block' policy) and counted, so an alert storm
+    slows logging down rather than order placement.
+    """
+
+    def __init__(self, maxsize=ORDER_LOG_QUEUE_SIZE, batch_size=ORDER_LOG_BATCH_SIZE,
+                 flush_interval=ORDER_LOG_FLUSH_INTERVAL_MS / 1000, policy=ORDER_LOG_FULL_POLICY,
+                 enqueue_timeout=ORDER_LOG_ENQUEUE_TIMEOUT_MS / 1000):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.enqueue_timeout = enqueue_timeout
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked worker where the parent's thread doesn't exist
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='order-log-writer', daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _row(api_type, request_data, response_data, latency_ms, created_at):
+        return {
+            'api_type': api_type,
+            'request_data': json.dumps(request_data),
+            'response_data': json.dumps(response_data),
+            'created_at': created_at,
+            'latency_ms': latency_ms,
+            **extract_log_fields(request_data, response_data),
+        }
 
-        order_log = OrderLog(api_type=api_type,request_data=request_json, response_data=response_json, created_at=now_ist)
-        db_session.add(order_log)
-        db_session.commit()
+    def _put(self, item, rows):
+        self._ensure_started()
+        try:
+            if self.policy == 'block':
+                self.queue.put(item, timeout=self.enqueue_timeout)
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            self._count('dropped', rows)
+            return False
+        self._count('enqueued', rows)
+        return True
+
+    def submit(self, api_type, request_data, response_data, latency_ms=None):
+        """Queue an order log row. Returns False if it was dropped because the queue is full."""
+        row = self._row(api_type, request_data, response_data, latency_ms, datetime.now(pytz.timezone('Asia/Kolkata')))
+        return self._put(row, 1)
+
+    def submit_many(self, api_type, entries, latency_ms=None):
+        """
+        Queue the rows of one batch operation, a list of (request_data, response_data),
+        as a single item: they share a timestamp and are inserted in the same transaction.
+        Returns False if they were dropped because the queue is full.
+        """
+        created_at = datetime.now(pytz.timezone('Asia/Kolkata'))
+        rows = [self._row(api_type, request_data, response_data, latency_ms, created_at)
+                for request_data, response_data in entries]
+        return self._put(rows, len(rows)) if rows else True
+
+    def _write(self, batch, items):
+        try:
+            with engine.begin() as conn:
+                conn.execute(OrderLog.__table__.insert(), batch)
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(batch))
+            print(f"Error saving order logs: {e}")
+        finally:
+            for _ in range(items):
+                self.queue.task_done()
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            # Items are single rows or the row lists of submit_many, which are never split
+            batch = list(first) if isinstance(first, list) else [first]
+            items = 1
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                items += 1
+                if isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+            self._write(batch, items)
+
+    def flush(self, timeout=None):
+        """Wait until every queued row has been written (or has failed). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if self._thread is None or not self._thread.is_alive():
+                self._ensure_started()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=5):
+        """Flush what is queued and stop the writer thread, called at interpreter exit."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self.flush(timeout)
+        self._stopping.set()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        return stats
+
+
+order_log_writer = OrderLogWriter()
+atexit.register(order_log_writer.close)
+
+
+def async_log_order(api_type,request_data, response_data, latency_ms=None):
+    """Queue an order log for the background writer; never blocks on the database."""
+    try:
+        order_log_writer.submit(api_type, request_data, response_data, latency_ms)
     except Exception as e:
         print(f"Error saving order log: {e}")
-    finally:
-        db_session.remove()
 
+
+def async_log_orders(api_type, entries, latency_ms=None):
+    """Queue the (request_data, response_data) rows of a batch operation as one write."""
+    try:
+        order_log_writer.submit_many(api_type, entries, latency_ms)
+    except Exception as e:
+        print(f"Error saving order logs: {e}")
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['backfill']:
+        init_db()
+        backfill_order_log_columns(progress=lambda done, last_id: print(f"  {done} rows converted (up to id {last_id})"))
+    else:
+        print("Usage: python -m database.apilog_db backfill")
@@ -10,6 +10,8 @@ from sqlalchemy.sql import func
 from dotenv import load_dotenv
 from database.db import db 
 from cachetools import TTLCache
+from collections import namedtuple
+import threading
 import traceback
 from datetime import datetime, timedelta  # <-- FIX: Import timedelta
 from utils.colored_logger import logger
@@ -18,6 +20,30 @@ from utils.colored_logger import logger
 auth_cache = TTLCache(maxsize=1024, ttl=30)
 api_key_cache = TTLCache(maxsize=1024, ttl=30)
 
+# Cache of resolved API keys, keyed by the key itself. Invalid keys are remembered in a
+# separate, bounded cache so a burst of made-up keys cannot evict the valid ones. Changes
+# only invalidate the cache of the worker that made them, so the TTLs are kept to seconds:
+# they bound how long other workers keep honouring a revoked key or refusing a new one.
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', '10'))
+API_KEY_NEGATIVE_CACHE_TTL = int(os.getenv('API_KEY_NEGATIVE_CACHE_TTL', '5'))
+API_KEY_NEGATIVE_CACHE_SIZE = int(os.getenv('API_KEY_NEGATIVE_CACHE_SIZE', '4096'))
+resolved_api_key_cache = TTLCache(maxsize=1024, ttl=API_KEY_CACHE_TTL)
+invalid_api_key_cache = TTLCache(maxsize=API_KEY_NEGATIVE_CACHE_SIZE, ttl=API_KEY_NEGATIVE_CACHE_TTL)
+_api_key_cache_lock = threading.Lock()
+
+# Broker credentials per user_id, so the order path does not hit the database for every order.
+# A login or logout on another worker is only seen here once the entry expires, hence seconds.
+BROKER_CREDENTIALS_CACHE_TTL = int(os.getenv('BROKER_CREDENTIALS_CACHE_TTL', '10'))
+broker_credentials_cache = TTLCache(maxsize=1024, ttl=BROKER_CREDENTIALS_CACHE_TTL)
+_broker_credentials_lock = threading.Lock()
+
+BrokerCredentials = namedtuple('BrokerCredentials', ['user_id', 'username', 'auth_token', 'feed_token',
+                                                     'broker_apikey', 'expires_at'])
+
+# The user an API key belongs to, with the broker credentials needed to act for them
+ApiKeyIdentity = namedtuple('ApiKeyIdentity', ['user_id', 'username', 'is_admin', 'broker_apikey',
+                                               'auth_token', 'feed_token'])
+
 load_dotenv()
 
 # Try multiple environment variable names for database URL (with and without db_ prefix)
@@ -136,6 +162,8 @@ def upsert_auth(name, auth_token, revoke=False):
         cache_key = f"auth-{name}"
         if cache_key in auth_cache:
             del auth_cache[cache_key]
+        invalidate_api_key_cache(username=name)
+        invalidate_broker_credentials(username=name)
             
         return auth_obj.id
         
@@ -214,6 +242,7 @@ def upsert_api_key(user_id, api_key):
         cache_key = f"api-key-{user_id}"
         if cache_key in api_key_cache:
             del api_key_cache[cache_key]
+        invalidate_api_key_cache(user_id=user_id)
             
         return api_key_obj.id
         
@@ -265,19 +294,121 @@ def validate_api_key(api_key):
         print("ERROR in validate_api_key: api_key is empty")
         return None
         
+    identity = resolve_api_key(api_key)
+    return identity.user_id if identity else None
+
+def resolve_api_key(api_key):
+    """
+    Resolve an API key to an ApiKeyIdentity, or None if the key is invalid.
+
+    The user record and active broker tokens are fetched in a single joined query and
+    cached by key, so repeated calls with the same key do not touch the database.
+    """
+    if not api_key:
+        return None
+
+    with _api_key_cache_lock:
+        identity = resolved_api_key_cache.get(api_key)
+        if identity is not None:
+            return identity
+        if api_key in invalid_api_key_cache:
+            return None
+
     try:
-        api_key_obj = ApiKeys.query.filter_by(api_key=api_key).first()
-        if api_key_obj:
-            print(f"Valid API key found for user_id: {api_key_obj.user_id}")
-            return api_key_obj.user_id
-        else:
-            print(f"Invalid API key: {api_key}")
+        row = db_session.query(ApiKeys.user_id, Users.username, Users.is_admin, Users.apikey,
+                               AuthTokens.access_token, AuthTokens.feed_token) \
+            .outerjoin(Users, Users.user_id == ApiKeys.user_id) \
+            .outerjoin(AuthTokens, (AuthTokens.username == Users.username) & (AuthTokens.is_active == True)) \
+            .filter(ApiKeys.api_key == api_key) \
+            .first()
+    except Exception as e:
+        db_session.rollback()
+        print(f"ERROR while resolving API key: {str(e)}")
+        traceback.print_exc()
+        return None
+
+    with _api_key_cache_lock:
+        if row is None:
+            invalid_api_key_cache[api_key] = True
             return None
+        identity = ApiKeyIdentity(*row)
+        resolved_api_key_cache[api_key] = identity
+    return identity
+
+def invalidate_api_key_cache(user_id=None, username=None):
+    """
+    Drop cached API key resolutions for a user (matched by user_id or username), or all of
+    them when neither is given. Invalid keys are always forgotten, since a key rejected
+    a moment ago may just have been issued.
+    """
+    with _api_key_cache_lock:
+        if user_id is None and username is None:
+            resolved_api_key_cache.clear()
+        else:
+            stale = [key for key, identity in resolved_api_key_cache.items()
+                     if (user_id is not None and identity.user_id == user_id)
+                     or (username is not None and identity.username == username)]
+            for key in stale:
+                resolved_api_key_cache.pop(key, None)
+        invalid_api_key_cache.clear()
+
+def _credentials_expired(credentials):
+    expires_at = credentials.expires_at
+    if expires_at is None:
+        return False
+    now = datetime.now(expires_at.tzinfo) if expires_at.tzinfo else datetime.now()
+    return expires_at <= now
+
+def get_broker_credentials(user_id):
+    """
+    Return the BrokerCredentials (access token, feed token, broker API key and token expiry)
+    for a user_id, or None if the user does not exist. Served from memory until the entry's
+    TTL or the token's own expiry passes, or the user's tokens change.
+    """
+    if not user_id:
+        return None
+
+    with _broker_credentials_lock:
+        credentials = broker_credentials_cache.get(user_id)
+        if credentials is not None and _credentials_expired(credentials):
+            broker_credentials_cache.pop(user_id, None)
+            credentials = None
+    if credentials is not None:
+        return credentials
+
+    try:
+        row = db_session.query(Users.user_id, Users.username, AuthTokens.access_token, AuthTokens.feed_token,
+                               Users.apikey, AuthTokens.expires_at) \
+            .outerjoin(AuthTokens, (AuthTokens.username == Users.username) & (AuthTokens.is_active == True)) \
+            .filter(Users.user_id == user_id) \
+            .first()
     except Exception as e:
-        print(f"ERROR while validating API key: {str(e)}")
+        db_session.rollback()
+        print(f"ERROR while fetching broker credentials: {str(e)}")
         traceback.print_exc()
         return None
 
+    if row is None:
+        return None
+    credentials = BrokerCredentials(*row)
+    if credentials.auth_token and _credentials_expired(credentials):
+        credentials = credentials._replace(auth_token=None, feed_token=None, expires_at=None)
+    with _broker_credentials_lock:
+        broker_credentials_cache[user_id] = credentials
+    return credentials
+
+def invalidate_broker_credentials(user_id=None, username=None):
+    """Drop cached broker credentials for a user (matched by user_id or username), or all of them."""
+    with _broker_credentials_lock:
+        if user_id is None and username is None:
+            broker_credentials_cache.clear()
+            return
+        stale = [key for key, credentials in broker_credentials_cache.items()
+                 if (user_id is not None and credentials.user_id == user_id)
+                 or (username is not None and credentials.username == username)]
+        for key in stale:
+            broker_credentials_cache.pop(key, None)
+
 # User management functions
 
 def create_user(username, user_id, apikey, is_admin=False):
@@ -308,6 +439,7 @@ def create_user(username, user_id, apikey, is_admin=False):
         db_session.add(api_key)
         
         db_session.commit()
+        invalidate_api_key_cache(user_id=user_id)
         print(f"Successfully created user: {username}")
         return {"status": "success", "message": "User created successfully"}
     except Exception as e:
@@ -381,6 +513,8 @@ def update_user(username, new_data):
             print(f"ERROR in update_user: User {username} not found")
             return {"status": "error", "message": "User not found"}
         
+        previous_user_id = user.user_id
+
         # Update user fields if provided in new_data
         if 'user_id' in new_data:
             # Check if new user_id already exists
@@ -415,6 +549,10 @@ def update_user(username, new_data):
             user.is_admin = new_data['is_admin']
             
         db_session.commit()
+        invalidate_api_key_cache(user_id=previous_user_id)
+        invalidate_api_key_cache(username=username)
+        invalidate_broker_credentials(username=username)
+        api_key_cache.pop(f"api-key-{previous_user_id}", None)
         print(f"Successfully updated user: {username}")
         return {"status": "success", "message": "User updated successfully"}
     except Exception as e:
@@ -511,6 +649,11 @@ def delete_user(username):
         # Delete the user
         db_session.delete(user)
         db_session.commit()
+        invalidate_api_key_cache(user_id=user.user_id)
+        invalidate_api_key_cache(username=username)
+        invalidate_broker_credentials(username=username)
+        api_key_cache.pop(f"api-key-{user.user_id}", None)
+        auth_cache.pop(f"auth-{username}", None)
         
         print(f"Successfully deleted user: {username}")
         return {"status": "success", "message": "User deleted successfully"}
@@ -551,6 +694,8 @@ def store_auth_tokens(username, user_id, access_token, feed_token, refresh_token
             print(f"Created new auth tokens for user: {username}")
         
         db_session.commit()
+        invalidate_api_key_cache(username=username)
+        invalidate_broker_credentials(username=username)
         return {"status": "success", "message": "Auth tokens stored successfully"}
         
     except Exception as e:
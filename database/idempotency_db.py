@@ -0,0 +1,144 @@
+# database/idempotency_db.py
+
+"""
+Shared store of idempotency keys for the order webhooks.
+
+A key is claimed with an insert, so exactly one worker process (or host) wins a
+given key; the others see the winner's pending row and wait for its response, which
+is stored on the row once the order completes. Rows expire at `expires_at` (epoch
+seconds) and are pruned from time to time.
+"""
+
+import os
+import json
+import time
+import threading
+
+from sqlalchemy import create_engine, Column, Integer, Float, String, Text, select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Try multiple environment variable names for database URL (with and without db_ prefix)
+DATABASE_URL = (
+    os.environ.get('POSTGRES_URL') or
+    os.environ.get('db_POSTGRES_URL') or
+    os.environ.get('POSTGRES_PRISMA_URL') or
+    os.environ.get('db_POSTGRES_PRISMA_URL') or
+    os.environ.get('db_DATABASE_URL') or
+    os.environ.get('DATABASE_URL') or
+    'sqlite:///tmp/algo.db'  # Use /tmp for serverless fallback
+)
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_timeout=10
+)
+
+db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+Base = declarative_base()
+Base.query = db_session.query_property()
+
+PENDING = 'pending'
+DONE = 'done'
+
+# Expired rows are deleted at most this often, by whichever claim comes along
+PRUNE_INTERVAL = 300
+_last_prune = 0
+_prune_lock = threading.Lock()
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    key = Column(String(64), primary_key=True)  # sha256 hex of the scoped key or request content
+    state = Column(String(16), nullable=False)
+    http_status = Column(Integer)
+    response_data = Column(Text)
+    created_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+def init_db():
+    print("Initializing Idempotency DB")
+    Base.metadata.create_all(bind=engine)
+
+
+def _row(conn, key):
+    row = conn.execute(select(IdempotencyKey.__table__).where(IdempotencyKey.__table__.c.key == key)).mappings().first()
+    if row is None:
+        return None
+    entry = dict(row)
+    entry['response_data'] = json.loads(entry['response_data']) if entry['response_data'] else None
+    return entry
+
+
+def claim_key(key, pending_ttl):
+    """
+    Claim `key` for a new request. Returns None when the caller now owns it, otherwise
+    the existing entry as a dict (state, http_status, response_data, expires_at).
+    An expired entry is replaced. The pending claim lapses after `pending_ttl` seconds
+    so a worker that died mid-order does not hold the key forever.
+    """
+    _prune()
+    table = IdempotencyKey.__table__
+    for _ in range(3):
+        now = time.time()
+        try:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), {'key': key, 'state': PENDING, 'created_at': now,
+                                              'expires_at': now + pending_ttl})
+            return None
+        except IntegrityError:
+            pass
+        with engine.connect() as conn:
+            entry = _row(conn, key)
+        if entry is None:
+            continue  # released in the meantime, try again
+        if entry['expires_at'] > now:
+            return entry
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key == key, table.c.expires_at <= now))
+    with engine.connect() as conn:
+        return _row(conn, key)
+
+
+def get_key(key):
+    with engine.connect() as conn:
+        entry = _row(conn, key)
+    if entry is None or entry['expires_at'] <= time.time():
+        return None
+    return entry
+
+
+def complete_key(key, http_status, response_data, ttl):
+    """Store the response of the request that owns `key`, kept for `ttl` seconds."""
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(update(IdempotencyKey.__table__).where(IdempotencyKey.__table__.c.key == key).values(
+            state=DONE, http_status=http_status, response_data=json.dumps(response_data), expires_at=now + ttl))
+
+
+def release_key(key):
+    """Forget a claimed key whose request failed, so a retry is executed."""
+    with engine.begin() as conn:
+        conn.execute(delete(IdempotencyKey.__table__).where(IdempotencyKey.__table__.c.key == key))
+
+
+def _prune():
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < PRUNE_INTERVAL or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _last_prune = now
+        with engine.begin() as conn:
+            conn.execute(delete(IdempotencyKey.__table__).where(IdempotencyKey.__table__.c.expires_at <= now))
+    except Exception as e:
+        print(f"Error pruning idempotency keys: {e}")
+    finally:
+        _prune_lock.release()
@@ -1,13 +1,21 @@
 #database/master_contract_db.py
 
 import os
+import io
+import json
+import hashlib
+import tempfile
+import numpy as np
 import pandas as pd
 import requests
 import gzip
 import shutil
+import time
 from datetime import datetime
 
-from sqlalchemy import create_engine, Column, Integer, String, Float , Sequence, Index
+from sqlalchemy import create_engine, Column, Integer, String, Float , Sequence, Index, Table, MetaData, inspect, text, DateTime
+from sqlalchemy import select, delete, update, bindparam, func
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
@@ -53,37 +61,201 @@ class SymToken(Base):
     # Define a composite index on symbol and exchange columns
     __table_args__ = (Index('idx_symbol_exchange', 'symbol', 'exchange'),)
 
+class MasterContractMeta(Base):
+    """Key/value state about the last master contract load, e.g. the hash of the source file."""
+    __tablename__ = 'master_contract_meta'
+    key = Column(String, primary_key=True)
+    value = Column(String)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+
 def init_db():
     logger.database("Initializing Master Contract DB")
     Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == 'postgresql':
+        # COPY cannot run client-side defaults, so let the server draw ids from the sequence
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE symtoken ALTER COLUMN id SET DEFAULT nextval('symtoken_id_seq')")
+        if SYMBOL_SEARCH_PG_TRGM and not any(ix['name'].endswith('_symbol_trgm') for ix in inspect(engine).get_indexes('symtoken')):
+            create_trigram_index('symtoken', 'ix_symtoken_symbol_trgm')
+
+def create_trigram_index(table_name, index_name):
+    """Create a pg_trgm GIN index on symbol so the database fallback search can serve ILIKE '%term%' from an index."""
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING gin (symbol gin_trgm_ops)")
+    except Exception as e:
+        logger.warning(f"Could not create trigram index {index_name}: {e}")
+
+# Master contract reloads are written to this table and then swapped in for symtoken
+SYMTOKEN_STAGING_TABLE = 'symtoken_staging'
+SYMTOKEN_COLUMNS = ['symbol', 'brsymbol', 'name', 'exchange', 'brexchange', 'token',
+                    'expiry', 'strike', 'lotsize', 'instrumenttype', 'tick_size']
+SYMTOKEN_SWAP_ATTEMPTS = 5
+SYMTOKEN_SWAP_LOCK_TIMEOUT_MS = 5000
+SYMTOKEN_BULK_CHUNK_SIZE = 10000
+
+# Scrip master source and ingest settings
+MASTER_CONTRACT_URL = os.getenv('MASTER_CONTRACT_URL', 'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json')
+MASTER_CONTRACT_STREAMING = os.getenv('MASTER_CONTRACT_STREAMING', 'TRUE').upper() != 'FALSE'
+MASTER_CONTRACT_CHUNK_ROWS = int(os.getenv('MASTER_CONTRACT_CHUNK_ROWS', '20000'))
+MASTER_CONTRACT_DOWNLOAD_CHUNK = 1024 * 1024
+# FULL reloads symtoken every time, INCREMENTAL applies only the rows that changed
+MASTER_CONTRACT_REFRESH_MODE = os.getenv('MASTER_CONTRACT_REFRESH_MODE', 'INCREMENTAL').upper()
+
+# Back the database fallback of symbol search with a pg_trgm GIN index on PostgreSQL
+SYMBOL_SEARCH_PG_TRGM = os.getenv('SYMBOL_SEARCH_PG_TRGM', 'FALSE').upper() == 'TRUE'
+SYMTOKEN_KEY_COLUMNS = ['token', 'exchange']
+
+def symtoken_table_copy(name):
+    """
+    Return an unindexed Table with the symtoken schema under another name. The id keeps
+    drawing from the shared symtoken_id_seq so ids stay unique across reloads.
+    """
+    columns = [Column(c.name, c.type, nullable=c.nullable)
+               for c in SymToken.__table__.columns if c.name != 'id']
+    server_default = text("nextval('symtoken_id_seq')") if engine.dialect.name == 'postgresql' else None
+    id_column = Column('id', Integer, Sequence('symtoken_id_seq'), server_default=server_default, primary_key=True)
+    return Table(name, MetaData(), id_column, *columns)
+
+def drop_staging_table():
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {SYMTOKEN_STAGING_TABLE}")
+
+def create_staging_table():
+    # Clear out a staging table left behind by an interrupted reload
+    drop_staging_table()
+    staging = symtoken_table_copy(SYMTOKEN_STAGING_TABLE)
+    staging.create(engine, checkfirst=True)
+    return staging
+
+def load_into_staging(staging, df):
+    """Insert a processed master contract DataFrame into the staging table, returns the row count."""
+    return bulk_load_symtoken(staging, df)['rows']
+
+def symtoken_frame(df):
+    """Select the symtoken columns and coerce them to the types the table stores."""
+    frame = df[SYMTOKEN_COLUMNS].copy()
+    frame['strike'] = pd.to_numeric(frame['strike'], errors='coerce')
+    frame['tick_size'] = pd.to_numeric(frame['tick_size'], errors='coerce')
+    frame['lotsize'] = pd.to_numeric(frame['lotsize'], errors='coerce').astype('Int64')
+    return frame
+
+def _copy_chunks_postgres(table, frame, raw_conn):
+    columns = ', '.join(SYMTOKEN_COLUMNS)
+    copy_sql = f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = raw_conn.cursor()
+    try:
+        for start in range(0, len(frame), SYMTOKEN_BULK_CHUNK_SIZE):
+            buffer = io.StringIO()
+            frame.iloc[start:start + SYMTOKEN_BULK_CHUNK_SIZE].to_csv(buffer, header=False, index=False, na_rep='\\N')
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+    finally:
+        cursor.close()
+
+def _executemany_chunks(table, frame, raw_conn):
+    columns = ', '.join(SYMTOKEN_COLUMNS)
+    placeholders = ', '.join(['?' if engine.dialect.paramstyle == 'qmark' else '%s'] * len(SYMTOKEN_COLUMNS))
+    insert_sql = f"INSERT INTO {table.name} ({columns}) VALUES ({placeholders})"
+    cursor = raw_conn.cursor()
+    try:
+        for start in range(0, len(frame), SYMTOKEN_BULK_CHUNK_SIZE):
+            chunk = frame.iloc[start:start + SYMTOKEN_BULK_CHUNK_SIZE].astype(object)
+            rows = chunk.where(chunk.notna(), None).values.tolist()
+            cursor.executemany(insert_sql, rows)
+    finally:
+        cursor.close()
+
+def bulk_load_symtoken(table, df):
+    """
+    Stream a processed master contract DataFrame into `table` in a single transaction,
+    using COPY FROM STDIN on PostgreSQL and chunked executemany elsewhere.
 
-def delete_symtoken_table():
-    print("Deleting Symtoken Table")
-    SymToken.query.delete()
-    db_session.commit()
-
-def copy_from_dataframe(df):
-    print("Performing Bulk Insert")
-    # Convert DataFrame to a list of dictionaries
-    data_dict = df.to_dict(orient='records')
-
-    # Retrieve existing tokens to filter them out from the insert
-    existing_tokens = {result.token for result in db_session.query(SymToken.token).all()}
-
-    # Filter out data_dict entries with tokens that already exist
-    filtered_data_dict = [row for row in data_dict if row['token'] not in existing_tokens]
-
-    # Insert in bulk the filtered records
+    Returns a dict with the row count, elapsed seconds and rows/sec.
+    """
+    frame = symtoken_frame(df)
+    start = time.monotonic()
+    raw_conn = engine.raw_connection()
     try:
-        if filtered_data_dict:  # Proceed only if there's anything to insert
-            db_session.bulk_insert_mappings(SymToken, filtered_data_dict)
-            db_session.commit()
-            print(f"Bulk insert completed successfully with {len(filtered_data_dict)} new records.")
+        if engine.dialect.name == 'postgresql':
+            _copy_chunks_postgres(table, frame, raw_conn)
         else:
-            print("No new records to insert.")
-    except Exception as e:
-        print(f"Error during bulk insert: {e}")
-        db_session.rollback()
+            _executemany_chunks(table, frame, raw_conn)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+    elapsed = time.monotonic() - start
+    rows_per_sec = len(frame) / elapsed if elapsed > 0 else float(len(frame))
+    logger.database(f"Bulk loaded {len(frame)} rows into {table.name} in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)")
+    return {'rows': len(frame), 'seconds': elapsed, 'rows_per_sec': rows_per_sec}
+
+def swap_in_staging_table(staging):
+    """
+    Index the staging table and atomically rename it to symtoken. Readers see either the
+    old or the new table, never an empty or partially loaded one.
+    """
+    # Index names are schema-wide, so every generation gets its own suffix
+    generation = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    indexes = [Index(f'ix_symtoken_{generation}_{column}', staging.c[column])
+               for column in ['symbol', 'brsymbol', 'exchange', 'brexchange', 'token']]
+    indexes.append(Index(f'idx_symbol_exchange_{generation}', staging.c.symbol, staging.c.exchange))
+    for index in indexes:
+        index.create(engine)
+    if SYMBOL_SEARCH_PG_TRGM and engine.dialect.name == 'postgresql':
+        create_trigram_index(SYMTOKEN_STAGING_TABLE, f'ix_symtoken_{generation}_symbol_trgm')
+
+    has_live_table = inspect(engine).has_table(SymToken.__tablename__)
+    for attempt in range(1, SYMTOKEN_SWAP_ATTEMPTS + 1):
+        try:
+            with engine.begin() as conn:
+                if engine.dialect.name == 'sqlite':
+                    # pysqlite runs DDL in autocommit mode, so open the transaction explicitly
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                elif engine.dialect.name == 'postgresql':
+                    # Don't queue every reader behind the rename while a long transaction holds the table
+                    conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{SYMTOKEN_SWAP_LOCK_TIMEOUT_MS}ms'")
+                if has_live_table:
+                    conn.exec_driver_sql("ALTER TABLE symtoken RENAME TO symtoken_retired")
+                conn.exec_driver_sql(f"ALTER TABLE {SYMTOKEN_STAGING_TABLE} RENAME TO symtoken")
+                if has_live_table:
+                    conn.exec_driver_sql("DROP TABLE symtoken_retired")
+            break
+        except OperationalError as e:
+            if attempt == SYMTOKEN_SWAP_ATTEMPTS:
+                raise
+            logger.warning(f"Symtoken swap attempt {attempt} failed ({e.orig}), retrying...")
+            time.sleep(attempt)
+
+    # Invalidate the in-process lookup caches at the swap point
+    refresh_symbol_caches()
+
+def refresh_symbol_caches():
+    """Rebuild the in-process symbol lookup and search indexes after symtoken changed."""
+    from database.token_db import rebuild_symbol_index
+    from database.symbol_search import rebuild_search_index
+    rebuild_symbol_index()
+    rebuild_search_index()
+
+def replace_symtoken_table(frames):
+    """
+    Load an iterable of processed DataFrames into a staging table and swap it in for
+    symtoken. The live table is left untouched if anything fails before the swap.
+    """
+    staging = create_staging_table()
+    total = 0
+    try:
+        for df in frames:
+            total += load_into_staging(staging, df)
+        swap_in_staging_table(staging)
+    except Exception:
+        drop_staging_table()
+        raise
+    return total
 
 def download_json_angel_data(url, output_path):
     """
@@ -99,6 +271,278 @@ def download_json_angel_data(url, output_path):
         print(f"Failed to download data. Status code: {response.status_code}")
 
 
+def stream_download(url, output_path, timeout=30, progress=None):
+    """
+    Download `url` to `output_path` in fixed-size chunks so the body is never held
+    in memory as a whole. Returns the number of bytes written and their sha256 hex digest.
+    `progress`, if given, is called as progress(stage, **info) after every chunk.
+    """
+    written = 0
+    digest = hashlib.sha256()
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise Exception(f"Failed to download data. Status code: {response.status_code}")
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=MASTER_CONTRACT_DOWNLOAD_CHUNK):
+                f.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+                if progress:
+                    progress('downloading', bytes=written)
+    return written, digest.hexdigest()
+
+def iter_json_array(fileobj, read_size=64 * 1024):
+    """
+    Yield the elements of a top-level JSON array one at a time from a text file object,
+    holding at most one read buffer plus the element being decoded in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace and separators, reading more input when the buffer runs dry
+        while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ',')):
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            chunk = fileobj.read(read_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            item, end = None, None
+        # A value that runs up to the end of the buffer may have been cut short, read on
+        if end is None or (end >= len(buffer) and not eof):
+            if eof:
+                raise ValueError(f"Malformed JSON element at offset {pos}")
+            chunk = fileobj.read(read_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+def iter_record_batches(records, size):
+    """Group an iterable of records into lists of at most `size` items."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_master_contract_frames(path, chunk_rows=MASTER_CONTRACT_CHUNK_ROWS, progress=None):
+    """Parse a downloaded scrip master file incrementally, yielding processed DataFrames of `chunk_rows` records."""
+    records = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for batch in iter_record_batches(iter_json_array(f), chunk_rows):
+            records += len(batch)
+            yield process_angel_data_direct(batch)
+            if progress:
+                progress('processing', records=records)
+
+def streaming_master_contract_load(url=MASTER_CONTRACT_URL, chunk_rows=MASTER_CONTRACT_CHUNK_ROWS, progress=None):
+    """
+    Download the scrip master to a temporary file and load it into symtoken chunk by chunk.
+    Peak memory is bounded by `chunk_rows` rather than by the size of the file.
+    Returns the number of symbols loaded.
+    """
+    fd, path = tempfile.mkstemp(prefix='scrip_master_', suffix='.json')
+    os.close(fd)
+    try:
+        size, source_hash = stream_download(url, path, progress=progress)
+        logger.info(f"Downloaded {size / (1024 * 1024):.1f} MB, processing in chunks of {chunk_rows} records...")
+        return load_master_contract(lambda: stream_master_contract_frames(path, chunk_rows, progress), source_hash)
+    finally:
+        delete_angel_temp_data(path)
+
+def in_memory_master_contract_load(url=MASTER_CONTRACT_URL, progress=None):
+    """Download and process the whole scrip master in memory. Returns the number of symbols loaded."""
+    if progress:
+        progress('downloading')
+    response = requests.get(url, timeout=30)
+    if response.status_code != 200:
+        raise Exception(f"Failed to download data. Status code: {response.status_code}")
+
+    source_hash = hashlib.sha256(response.content).hexdigest()
+    logger.info("Processing downloaded data...")
+    if progress:
+        progress('processing', bytes=len(response.content))
+    token_df = process_angel_data_direct(response.json())
+    return load_master_contract(lambda: [token_df], source_hash)
+
+def get_master_contract_meta(key):
+    meta = MasterContractMeta.query.filter_by(key=key).first()
+    return meta.value if meta else None
+
+def set_master_contract_meta(key, value):
+    try:
+        meta = MasterContractMeta.query.filter_by(key=key).first()
+        if meta:
+            meta.value = value
+        else:
+            db_session.add(MasterContractMeta(key=key, value=value))
+        db_session.commit()
+    except Exception as e:
+        print(f"Error while saving master contract state {key}: {e}")
+        db_session.rollback()
+
+def symtoken_row_count():
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(SymToken.__table__)).scalar()
+
+def load_master_contract(frames_factory, source_hash):
+    """
+    Bring symtoken in line with a downloaded scrip master and return the number of symbols.
+
+    `frames_factory` returns a fresh iterable of processed DataFrames each time it is
+    called. In INCREMENTAL mode the load is skipped when the source hash matches the
+    last load, and otherwise only the changed rows are written; it falls back to a
+    full reload when the table is empty or the rows cannot be keyed uniquely.
+    """
+    if MASTER_CONTRACT_REFRESH_MODE == 'INCREMENTAL':
+        count = symtoken_row_count()
+        if count and source_hash == get_master_contract_meta('source_sha256'):
+            logger.info(f"Master contract unchanged since the last load, keeping {count} symbols")
+            return count
+        total = incremental_symtoken_refresh(frames_factory()) if count else None
+        if total is None:
+            total = replace_symtoken_table(frames_factory())
+    else:
+        total = replace_symtoken_table(frames_factory())
+    set_master_contract_meta('source_sha256', source_hash)
+    return total
+
+def symtoken_fingerprints(frame):
+    """
+    Hash every row of a symtoken-shaped frame into a uint64 fingerprint. Values are
+    normalized first so rows read back from the database hash the same as fresh ones.
+    """
+    normalized = pd.DataFrame({
+        c: frame[c].fillna('').astype(str) for c in SYMTOKEN_COLUMNS
+        if c not in ('strike', 'lotsize', 'tick_size')
+    })
+    normalized['strike'] = pd.to_numeric(frame['strike'], errors='coerce').round(6)
+    normalized['tick_size'] = pd.to_numeric(frame['tick_size'], errors='coerce').round(6)
+    normalized['lotsize'] = pd.to_numeric(frame['lotsize'], errors='coerce').fillna(-1).astype('int64')
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+def current_symtoken_fingerprints(chunk_rows=MASTER_CONTRACT_CHUNK_ROWS):
+    """
+    Return a DataFrame of (token, exchange, id, fingerprint) for the live symtoken table,
+    reading and hashing it in chunks so only the keys and fingerprints are kept in memory.
+    """
+    columns = ['id'] + SYMTOKEN_COLUMNS
+    parts = []
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        cursor.execute(f"SELECT {', '.join(columns)} FROM symtoken")
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            chunk['fingerprint'] = symtoken_fingerprints(chunk)
+            parts.append(chunk[SYMTOKEN_KEY_COLUMNS + ['id', 'fingerprint']])
+        cursor.close()
+    finally:
+        raw_conn.close()
+    if not parts:
+        return pd.DataFrame(columns=SYMTOKEN_KEY_COLUMNS + ['id', 'fingerprint'])
+    return pd.concat(parts, ignore_index=True)
+
+def _frame_records(frame):
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict(orient='records')
+
+class _SymtokenKeysNotUnique(Exception):
+    """Raised inside the incremental refresh transaction to roll it back for a full reload."""
+
+def incremental_symtoken_refresh(frames):
+    """
+    Diff processed DataFrames against symtoken by (token, exchange) and apply only the
+    inserts, updates and deletes in one transaction. Each chunk's inserts and updates
+    are written as it is read; only a seen flag per live row and the keys of new rows
+    are kept for delete and duplicate detection. Returns the resulting number of
+    symbols, or None (with nothing written) when a full reload is needed because keys
+    are not unique.
+    """
+    start = time.monotonic()
+    current = current_symtoken_fingerprints()
+    if current.duplicated(SYMTOKEN_KEY_COLUMNS).any():
+        logger.info("symtoken has duplicate (token, exchange) keys, falling back to a full reload")
+        return None
+    current['position'] = np.arange(len(current))
+    seen = np.zeros(len(current), dtype=bool)
+    new_keys = set()
+    updated = 0
+    deletes = []
+
+    table = SymToken.__table__
+    try:
+        with engine.begin() as conn:
+            for df in frames:
+                frame = symtoken_frame(df).reset_index(drop=True)
+                keys = frame[SYMTOKEN_KEY_COLUMNS].copy()
+                if keys.duplicated().any():
+                    raise _SymtokenKeysNotUnique()
+                keys['fingerprint'] = symtoken_fingerprints(frame)
+
+                matched = keys.merge(current, on=SYMTOKEN_KEY_COLUMNS, how='left', suffixes=('', '_current'))
+                is_new = matched['id'].isna().to_numpy()
+                positions = matched.loc[~is_new, 'position'].astype('int64').to_numpy()
+                if seen[positions].any():
+                    raise _SymtokenKeysNotUnique()
+                seen[positions] = True
+
+                if is_new.any():
+                    chunk_keys = set(zip(*(keys.loc[is_new, c] for c in SYMTOKEN_KEY_COLUMNS)))
+                    if not new_keys.isdisjoint(chunk_keys):
+                        raise _SymtokenKeysNotUnique()
+                    new_keys |= chunk_keys
+                    conn.execute(table.insert(), _frame_records(frame[is_new]))
+
+                is_changed = ~is_new & (matched['fingerprint'] != matched['fingerprint_current']).to_numpy()
+                if is_changed.any():
+                    records = _frame_records(frame[is_changed])
+                    for record, row_id in zip(records, matched.loc[is_changed, 'id'].astype('int64').tolist()):
+                        record['_id'] = row_id
+                    conn.execute(update(table).where(table.c.id == bindparam('_id')), records)
+                    updated += len(records)
+
+            deletes = current.loc[~seen, 'id'].astype('int64').tolist()
+            for i in range(0, len(deletes), SYMTOKEN_BULK_CHUNK_SIZE):
+                conn.execute(delete(table).where(table.c.id.in_(deletes[i:i + SYMTOKEN_BULK_CHUNK_SIZE])))
+    except _SymtokenKeysNotUnique:
+        logger.info("Scrip master has duplicate (token, exchange) keys, falling back to a full reload")
+        return None
+
+    if new_keys or updated or deletes:
+        refresh_symbol_caches()
+
+    logger.database(f"Incremental master contract refresh: {len(new_keys)} inserted, {updated} updated, "
+                    f"{len(deletes)} deleted in {time.monotonic() - start:.2f}s")
+    return int(seen.sum()) + len(new_keys)
+
 def reformat_symbol(row):
     symbol = row['symbol']
     instrument_type = row['instrumenttype']
@@ -119,6 +563,36 @@ def reformat_symbol(row):
     return symbol
 
 
+def reformat_symbols(symbol, instrument_type):
+    """
+    Columnar version of reformat_symbol: rearranges the space separated FUT and CE/PE
+    symbols of a whole Series at once and leaves every other row untouched.
+    """
+    symbol = symbol.copy()
+    fut = instrument_type == 'FUT'
+    opt = instrument_type.isin(['CE', 'PE'])
+    candidates = fut | opt
+    if not candidates.any():
+        return symbol
+
+    parts = symbol[candidates].str.split(' ', expand=True)
+    nparts = symbol[candidates].str.count(' ') + 1
+
+    # For FUT, remove the spaces and append 'FUT' at the end
+    fut_rows = fut[candidates] & (nparts == 5)
+    if fut_rows.any():
+        p = parts[fut_rows]
+        symbol.loc[p.index] = p[0] + p[2] + p[3] + p[4] + p[1]
+
+    # For CE/PE, rearrange the parts and remove spaces
+    opt_rows = opt[candidates] & (nparts == 6)
+    if opt_rows.any():
+        p = parts[opt_rows]
+        symbol.loc[p.index] = p[0] + p[3] + p[4] + p[5] + p[1] + p[2]
+
+    return symbol
+
+
 def convert_date(date_str):
     # Convert from '19MAR2024' to '19-MAR-24'
     try:
@@ -127,6 +601,15 @@ def convert_date(date_str):
         # Return the original date if it doesn't match the format
         return date_str
 
+
+def convert_dates(dates):
+    """
+    Columnar version of convert_date: converts '19MAR2024' to '19-Mar-24' for a whole
+    Series, keeping the original value wherever it doesn't match the format.
+    """
+    parsed = pd.to_datetime(dates, format='%d%b%Y', errors='coerce')
+    return parsed.dt.strftime('%d-%b-%y').where(parsed.notna(), dates)
+
 def process_angel_json(path):
     """
     Processes the Angel JSON file to fit the existing database schema.
@@ -170,33 +653,34 @@ def process_angel_json(path):
     
     
     # Assuming the 'expiry' field in the JSON is in the format '19MAR2024'
-    df['expiry'] = df['expiry'].apply(lambda x: convert_date(x) if pd.notnull(x) else x)
+    df['expiry'] = convert_dates(df['expiry'])
     df['expiry'] = df['expiry'].str.upper()
 
-    
-
-
     # Convert 'strike' to float, 'lotsize' to int, and 'tick_size' to float as per the database schema
+    instrument_type = df['instrumenttype']
+    exchange = df['exchange']
+    cds_options = instrument_type.isin(['OPTCUR', 'OPTIRC']) & (exchange == 'CDS')
+
     df['strike'] = df['strike'].astype(float) / 100
-    df.loc[(df['instrumenttype'] == 'OPTCUR') & (df['exchange'] == 'CDS'), 'strike'] = df['strike'].astype(float) / 100000
-    df.loc[(df['instrumenttype'] == 'OPTIRC') & (df['exchange'] == 'CDS'), 'strike'] = df['strike'].astype(float) / 100000
-    
+    df.loc[cds_options, 'strike'] = df.loc[cds_options, 'strike'] / 100000
 
     df['lotsize'] = df['lotsize'].astype(int)
     df['tick_size'] = df['tick_size'].astype(float)
 
     # Futures Symbol Update in CDS and MCX Exchanges
-    df.loc[(df['instrumenttype'] == 'FUTCUR') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
-    df.loc[(df['instrumenttype'] == 'FUTIRC') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
-    
-    df.loc[(df['instrumenttype'] == 'FUTCOM') & (df['exchange'] == 'MCX'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + 'FUT'
+    futures = (instrument_type.isin(['FUTCUR', 'FUTIRC']) & (exchange == 'CDS')) | ((instrument_type == 'FUTCOM') & (exchange == 'MCX'))
+    if futures.any():
+        fut = df.loc[futures]
+        df.loc[futures, 'symbol'] = fut['name'] + fut['expiry'].str.replace('-', '', regex=False) + 'FUT'
 
     # Options Symbol Update in CDS and MCX Exchanges
-    df.loc[(df['instrumenttype'] == 'OPTCUR') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\.0', '', regex=True) + df['symbol'].str[-2:]
-    df.loc[(df['instrumenttype'] == 'OPTIRC') & (df['exchange'] == 'CDS'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\.0', '', regex=True) + df['symbol'].str[-2:] 
-    df.loc[(df['instrumenttype'] == 'OPTFUT') & (df['exchange'] == 'MCX'), 'symbol'] = df['name'] + df['expiry'].str.replace('-', '', regex=False) + df['strike'].astype(str).str.replace('\.0', '', regex=True) + df['symbol'].str[-2:]
+    options = cds_options | ((instrument_type == 'OPTFUT') & (exchange == 'MCX'))
+    if options.any():
+        opt = df.loc[options]
+        df.loc[options, 'symbol'] = (opt['name'] + opt['expiry'].str.replace('-', '', regex=False)
+                                     + opt['strike'].astype(str).str.replace('\\.0', '', regex=True)
+                                     + opt['symbol'].str[-2:])
 
- 
     # Return the processed DataFrame
     return df
 
@@ -213,48 +697,42 @@ def delete_angel_temp_data(output_path):
         print(f"An error occurred while deleting the file: {e}")
 
 
+def download_and_load_master_contract(progress=None):
+    """
+    Download the scrip master and bring symtoken up to date, raising on failure.
+    Returns the number of symbols. Callers should go through
+    database.master_contract_refresh.refresh_master_contract so concurrent
+    refreshes are coalesced.
+    """
+    logger.info("Starting download from Angel Broking...")
+    # Symbols are loaded into a staging table and swapped in, so symtoken is never empty mid-reload
+    if MASTER_CONTRACT_STREAMING:
+        total = streaming_master_contract_load(progress=progress)
+    else:
+        total = in_memory_master_contract_load(progress=progress)
+    logger.success(f"Master contract download completed successfully! Total symbols: {total}")
+    return total
+
+def emit_master_contract_status(status, message):
+    """Notify connected clients about a master contract download, tolerating serverless deployments without Socket.IO."""
+    try:
+        return socketio.emit('master_contract_download', {'status': status, 'message': message})
+    except:
+        print("Socket.IO emit failed (expected on serverless)")
+        return {'status': status, 'message': message}
+
 def master_contract_download():
     logger.info("Downloading Master Contract")
-    url = 'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json'
     
     try:
-        # For serverless, use in-memory processing instead of file system
-        logger.info("Starting download from Angel Broking...")
-        import requests
-        import json
-        
-        response = requests.get(url, timeout=30)
-        if response.status_code != 200:
-            raise Exception(f"Failed to download data. Status code: {response.status_code}")
-        
-        logger.info("Processing downloaded data...")
-        data = response.json()
-        
-        # Process data directly without saving to file
-        token_df = process_angel_data_direct(data)
-        
-        logger.warning("Clearing existing data...")
-        delete_symtoken_table()
-        logger.info("Inserting new data...")
-        copy_from_dataframe(token_df)
-        logger.success(f"Master contract download completed successfully! Total symbols: {len(token_df)}")
-        
-        # Try to emit socket event, but don't fail if it doesn't work (Vercel serverless)
-        try:
-            return socketio.emit('master_contract_download', {'status': 'success', 'message': f'Successfully Downloaded {len(token_df)} symbols'})
-        except:
-            print("Socket.IO emit failed (expected on serverless)")
-            return {'status': 'success', 'message': f'Successfully Downloaded {len(token_df)} symbols'}
+        total = download_and_load_master_contract()
+        return emit_master_contract_status('success', f'Successfully Downloaded {total} symbols')
 
     except Exception as e:
         print(f"Master contract download failed: {str(e)}")
         import traceback
         traceback.print_exc()
-        try:
-            return socketio.emit('master_contract_download', {'status': 'error', 'message': str(e)})
-        except:
-            print("Socket.IO emit failed (expected on serverless)")
-            return {'status': 'error', 'message': str(e)}
+        return emit_master_contract_status('error', str(e))
 
 def process_angel_data_direct(data):
     """Process Angel Broking data directly from JSON without file operations"""
@@ -266,7 +744,7 @@ def process_angel_data_direct(data):
     df = pd.DataFrame(data)
     
     # Apply the same processing as process_angel_json
-    df['symbol'] = df.apply(reformat_symbol, axis=1)
+    df['symbol'] = reformat_symbols(df['symbol'], df['instrumenttype'])
     
     # Filter and clean data
     df = df[df['exch_seg'].isin(['NSE', 'BSE', 'NFO', 'BFO', 'CDS', 'MCX'])]
@@ -334,8 +812,14 @@ def add_sample_data():
         print(f"Error adding sample data: {e}")
         db_session.rollback()
 
-def search_symbols(symbol, exchange):
+def search_symbols(symbol, exchange, instrumenttype=None):
     try:
+        # Serve from the in-memory search index once it is loaded, ranked exact > prefix > substring
+        from database.symbol_search import get_search_index
+        index = get_search_index()
+        if index is not None:
+            return index.search(symbol, exchange, instrumenttype=instrumenttype, limit=50)
+
         # Case-insensitive search with ILIKE (PostgreSQL) or LIKE with UPPER (SQLite)
         if 'postgresql' in DATABASE_URL.lower():
             results = SymToken.query.filter(
@@ -0,0 +1,187 @@
+# database/master_contract_refresh.py
+
+"""
+Coordinates master contract refreshes so concurrent triggers (logins, cold starts,
+manual download endpoints) share one download instead of racing each other.
+"""
+
+import os
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import text
+from dotenv import load_dotenv
+from database.master_contract_db import (engine, download_and_load_master_contract, emit_master_contract_status,
+                                         get_master_contract_meta, set_master_contract_meta, symtoken_row_count)
+from utils.colored_logger import logger
+from utils.single_flight import SingleFlight
+
+load_dotenv()
+
+# A refresh that completed less than this many seconds ago is not repeated unless forced
+MASTER_CONTRACT_COOLDOWN = int(os.getenv('MASTER_CONTRACT_COOLDOWN', '300'))
+
+# Key of the PostgreSQL advisory lock shared by every worker process
+MASTER_CONTRACT_LOCK_ID = 7_301_942_061
+
+_REFRESH_KEY = 'master_contract'
+_flight = SingleFlight()
+_status_lock = threading.Lock()
+_status = {
+    'state': 'idle',  # idle, running, success, error
+    'stage': None,
+    'progress': {},
+    'triggered_by': None,
+    'started_at': None,
+    'finished_at': None,
+    'symbols': None,
+    'message': None,
+}
+
+
+def _update_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+
+def _report_progress(stage, **info):
+    _update_status(stage=stage, progress=info)
+
+
+def get_master_contract_status(include_cooldown=True):
+    """Return a snapshot of the current or most recent refresh; the cooldown is read from the database."""
+    with _status_lock:
+        status = dict(_status, progress=dict(_status['progress']))
+    status['in_flight'] = _flight.in_flight(_REFRESH_KEY)
+    status['waiters'] = _flight.waiters(_REFRESH_KEY)
+    if include_cooldown:
+        remaining = _cooldown_remaining()
+        status['cooldown_remaining'] = round(remaining, 1) if remaining else 0
+    return status
+
+
+def _cooldown_remaining():
+    """
+    Seconds left before another refresh is allowed, based on the last successful load
+    recorded in the database so the window is shared by every worker process.
+    """
+    if MASTER_CONTRACT_COOLDOWN <= 0:
+        return 0
+    try:
+        loaded_at = get_master_contract_meta('loaded_at')
+        if not loaded_at or not symtoken_row_count():
+            return 0
+    except Exception as e:
+        print(f"Error while reading the master contract cooldown: {e}")
+        return 0
+    return max(0, MASTER_CONTRACT_COOLDOWN - (time.time() - float(loaded_at)))
+
+
+def _record_outcome(result):
+    """Store the outcome of a download so workers that waited for it can report it."""
+    set_master_contract_meta('last_refresh', json.dumps({'status': result['status'], 'message': result['message'],
+                                                         'symbols': result['symbols'], 'finished_at': time.time()}))
+
+
+def _outcome_since(started):
+    """The outcome of a download another worker finished after `started`, or None if there is none."""
+    try:
+        outcome = json.loads(get_master_contract_meta('last_refresh') or 'null')
+    except Exception as e:
+        print(f"Error while reading the last master contract refresh: {e}")
+        return None
+    if not outcome or outcome.get('finished_at', 0) < started:
+        return None
+    return outcome
+
+
+@contextmanager
+def _cross_process_lock():
+    """
+    Hold a PostgreSQL session advisory lock for the duration of the refresh. Yields False
+    when another process held the lock, after waiting for that process to finish.
+    Other databases are coordinated within the process only.
+    """
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': MASTER_CONTRACT_LOCK_ID}).scalar()
+        if not acquired:
+            _report_progress('waiting for another worker')
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MASTER_CONTRACT_LOCK_ID})
+        try:
+            yield acquired
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MASTER_CONTRACT_LOCK_ID})
+            conn.commit()
+
+
+def _run_refresh(triggered_by, force):
+    # Checked here rather than by the caller, so a login never waits on these queries
+    if not force and _cooldown_remaining():
+        return {'status': 'skipped', 'message': 'Master contract was refreshed recently', 'symbols': symtoken_row_count()}
+
+    started = time.time()
+    _update_status(state='running', stage='starting', progress={}, triggered_by=triggered_by,
+                   started_at=datetime.now().isoformat(), finished_at=None, message=None)
+    downloading = False
+    try:
+        with _cross_process_lock() as acquired:
+            outcome = None if acquired else _outcome_since(started)
+            if outcome is not None and outcome['status'] == 'success':
+                # Another worker just reloaded symtoken, only the in-process index needs refreshing
+                from database.token_db import rebuild_symbol_index
+                rebuild_symbol_index()
+                result = {'status': 'success', 'message': 'Master contract refreshed by another worker',
+                          'symbols': outcome['symbols']}
+            elif outcome is not None:
+                result = {'status': 'error', 'symbols': None,
+                          'message': f"Master contract refresh by another worker failed: {outcome['message']}"}
+            elif not force and _cooldown_remaining():
+                result = {'status': 'skipped', 'message': 'Master contract was refreshed recently',
+                          'symbols': symtoken_row_count()}
+            else:
+                # Nobody ran before us, or the worker we waited for died without recording an outcome
+                downloading = True
+                total = download_and_load_master_contract(progress=_report_progress)
+                set_master_contract_meta('loaded_at', str(time.time()))
+                result = {'status': 'success', 'message': f'Successfully Downloaded {total} symbols', 'symbols': total}
+                _record_outcome(result)
+                emit_master_contract_status('success', result['message'])
+    except Exception as e:
+        logger.error(f"Master contract refresh failed: {e}")
+        result = {'status': 'error', 'message': str(e), 'symbols': None}
+        if downloading:
+            _record_outcome(result)
+        emit_master_contract_status('error', str(e))
+
+    _update_status(state='error' if result['status'] == 'error' else 'success', stage=None,
+                   finished_at=datetime.now().isoformat(), symbols=result['symbols'], message=result['message'])
+    return result
+
+
+def refresh_master_contract(triggered_by=None, force=False, wait=True):
+    """
+    Refresh the master contract, joining the refresh already in flight if there is one.
+
+    Unless `force` is set, nothing is downloaded within MASTER_CONTRACT_COOLDOWN seconds
+    of the last successful load. With `wait=False` everything, the cooldown check
+    included, runs on a background thread and the in-memory status is returned
+    immediately without touching the database. Otherwise returns a dict with `status`
+    (success, skipped or error), `message` and `symbols`. A refresh run by another
+    worker process while this one waited reports that worker's outcome.
+    """
+    if not wait:
+        if not _flight.in_flight(_REFRESH_KEY):
+            thread = threading.Thread(target=_flight.do, args=(_REFRESH_KEY, _run_refresh, triggered_by, force))
+            thread.daemon = True
+            thread.start()
+        return get_master_contract_status(include_cooldown=False)
+
+    logger.info(f"Master contract refresh requested by {triggered_by or 'unknown'}")
+    return _flight.do(_REFRESH_KEY, _run_refresh, triggered_by, force)
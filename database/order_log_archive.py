@@ -0,0 +1,174 @@
+# database/order_log_archive.py
+
+"""
+Compressed on-disk archive of order logs moved out of the order_logs table.
+
+Each retention run writes the rows of one IST day to a gzipped JSON Lines file named
+`order_logs-YYYY-MM-DD.<first id>-<last id>.jsonl.gz` under ORDER_LOG_ARCHIVE_DIR. The
+reader pages through those files with the same filters and (created_at, id) cursors
+as query_order_logs, and query_order_log_history merges them with the live table so
+a date range spanning the retention cutoff reads as one log.
+"""
+
+import os
+import glob
+import gzip
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+from database.apilog_db import OrderLog, EXTRACTED_COLUMNS, extract_log_fields
+from database.order_log_query import (IST, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, as_ist, decode_cursor, encode_cursor,
+                                      filter_order_logs, summarize_log)
+
+load_dotenv()
+
+ORDER_LOG_ARCHIVE_DIR = os.getenv('ORDER_LOG_ARCHIVE_DIR', 'archive/order_logs')
+# Parsed archive days kept in memory for paging through them
+ARCHIVE_CACHE_DAYS = int(os.getenv('ORDER_LOG_ARCHIVE_CACHE_DAYS', '8'))
+
+ARCHIVE_COLUMNS = [column.name for column in OrderLog.__table__.columns]
+
+
+def archive_path(day, first_id, last_id):
+    return os.path.join(ORDER_LOG_ARCHIVE_DIR, f'order_logs-{day.isoformat()}.{first_id}-{last_id}.jsonl.gz')
+
+
+def write_archive(day, rows):
+    """
+    Write the order log rows (mappings with ARCHIVE_COLUMNS) of one IST day to a new
+    archive file and return its path. The file is written under a temporary name and
+    renamed, so a crash never leaves a truncated archive behind.
+    """
+    os.makedirs(ORDER_LOG_ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(day, rows[0]['id'], rows[-1]['id'])
+    partial = path + '.partial'
+    with gzip.open(partial, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            record = {name: row[name] for name in ARCHIVE_COLUMNS}
+            if all(record[name] is None for name in EXTRACTED_COLUMNS):
+                # Rows the column backfill never reached are archived with their fields extracted
+                try:
+                    record.update(extract_log_fields(json.loads(record['request_data']),
+                                                     json.loads(record['response_data'])))
+                except (TypeError, ValueError):
+                    pass
+            record['created_at'] = record['created_at'].isoformat() if record['created_at'] else None
+            f.write(json.dumps(record) + '\n')
+    os.replace(partial, path)
+    return path
+
+
+def archived_days():
+    """IST days that have archive files, oldest first."""
+    days = set()
+    for path in glob.glob(os.path.join(ORDER_LOG_ARCHIVE_DIR, 'order_logs-*.jsonl.gz')):
+        try:
+            days.add(datetime.strptime(os.path.basename(path)[len('order_logs-'):][:10], '%Y-%m-%d').date())
+        except ValueError:
+            continue
+    return sorted(days)
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE_DAYS)
+def _load_archive_files(paths):
+    rows = {}
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                record['created_at'] = datetime.fromisoformat(record['created_at']) if record['created_at'] else None
+                rows[record['id']] = SimpleNamespace(**record)
+    return sorted(rows.values(), key=_sort_key, reverse=True)
+
+
+def read_archive_day(day):
+    """
+    The archived rows of one IST day as attribute objects, newest first, without
+    duplicates. Archive files are never rewritten, so days are cached by file list.
+    """
+    paths = glob.glob(os.path.join(ORDER_LOG_ARCHIVE_DIR, f'order_logs-{day.isoformat()}.*.jsonl.gz'))
+    return _load_archive_files(tuple(sorted(paths)))
+
+
+def _sort_key(row):
+    return (as_ist(row.created_at) if row.created_at else datetime.min.replace(tzinfo=IST), row.id)
+
+
+def _matches(row, start, end, api_type, strategy, symbol, action, orderid):
+    created_at = as_ist(row.created_at) if row.created_at else None
+    return ((start is None or (created_at is not None and created_at >= start))
+            and (end is None or (created_at is not None and created_at < end))
+            and (not api_type or row.api_type == api_type)
+            and (not strategy or row.strategy == strategy)
+            and (not symbol or row.symbol == symbol)
+            and (not action or row.action == action.upper())
+            and (not orderid or row.orderid == str(orderid)))
+
+
+def _archived_rows(start, end, api_type, strategy, symbol, action, orderid, cursor, limit):
+    """Up to `limit` archived rows older than `cursor` matching the filters, newest first."""
+    after = None
+    if cursor:
+        created_at, log_id = decode_cursor(cursor)
+        after = (as_ist(created_at), log_id)
+    first_day = start.astimezone(IST).date() if start is not None else None
+    last_day = (end - timedelta(microseconds=1)).astimezone(IST).date() if end is not None else None
+    if after is not None and (last_day is None or after[0].astimezone(IST).date() < last_day):
+        last_day = after[0].astimezone(IST).date()
+
+    found = []
+    for day in reversed(archived_days()):
+        if last_day is not None and day > last_day:
+            continue
+        if first_day is not None and day < first_day:
+            break
+        for row in read_archive_day(day):
+            if after is not None and _sort_key(row) >= after:
+                continue
+            if _matches(row, start, end, api_type, strategy, symbol, action, orderid):
+                found.append(row)
+                if len(found) == limit:
+                    return found
+    return found
+
+
+def _page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [summarize_log(row) for row in rows], next_cursor
+
+
+def query_archived_logs(start=None, end=None, api_type=None, strategy=None, symbol=None, action=None,
+                        orderid=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (logs, next_cursor) for one page of archived order logs, like query_order_logs."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    rows = _archived_rows(start, end, api_type, strategy, symbol, action, orderid, cursor, limit + 1)
+    return _page(rows, limit)
+
+
+def query_order_log_history(start=None, end=None, api_type=None, strategy=None, symbol=None, action=None,
+                            orderid=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (logs, next_cursor) for one page of order logs from the table and the archive
+    together, newest first. The archive is only read when the range reaches back to an
+    archived day, so queries over recent days cost the same as query_order_logs.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    filters = dict(api_type=api_type, strategy=strategy, symbol=symbol, action=action, orderid=orderid)
+    live = filter_order_logs(start, end, cursor=cursor, **filters).limit(limit + 1).all()
+
+    days = archived_days()
+    if days and (start is None or start.astimezone(IST).date() <= days[-1]):
+        archived = _archived_rows(start, end, cursor=cursor, limit=limit + 1, **filters)
+        # A row is only in the archive once it is deleted from the table, but a run
+        # interrupted between the two leaves it in both for a while
+        merged = {row.id: row for row in archived}
+        merged.update({row.id: row for row in live})
+        live = sorted(merged.values(), key=_sort_key, reverse=True)
+    return _page(live, limit)
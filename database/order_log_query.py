@@ -0,0 +1,140 @@
+# database/order_log_query.py
+
+"""
+Queries over the order log for the logs page and the logs JSON API.
+
+Rows are filtered by an IST date range on created_at and paged newest first with a
+keyset cursor on (created_at, id), so every page is an index range scan no matter
+how many rows the table holds or how deep the page is. Strategy, symbol, action and
+orderid filters use the columns the writer extracts from each request, which are
+indexed, instead of searching the JSON payloads.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytz
+from sqlalchemy import or_, and_
+
+from database.apilog_db import OrderLog
+
+IST = pytz.timezone('Asia/Kolkata')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def ist_day_range(day):
+    """[start, end) of an IST calendar day as timezone-aware datetimes."""
+    start = IST.localize(datetime.combine(day, datetime.min.time()))
+    return start, IST.localize(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def today_ist():
+    return datetime.now(IST).date()
+
+
+# IST has no daylight saving, so a fixed offset localizes naive times without pytz's per-call cost
+_IST_OFFSET = timezone(timedelta(hours=5, minutes=30))
+
+
+def as_ist(value):
+    """Timestamps read back from SQLite are naive IST; make them comparable with aware ones."""
+    return value.replace(tzinfo=_IST_OFFSET) if value.tzinfo is None else value
+
+
+def encode_cursor(created_at, log_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, log_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) pair of a cursor, raising ValueError when it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, log_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return (datetime.fromisoformat(created_at) if created_at else None), int(log_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _loads(text):
+    try:
+        data = json.loads(text) if text else {}
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {'value': data}
+
+
+def _first(*values):
+    return next((value for value in values if value is not None), None)
+
+
+def summarize_log(log):
+    """
+    Flatten a log row into the fields the logs page and API show. Extracted columns are
+    used when set, the JSON payloads fill in rows the backfill has not reached yet.
+    """
+    request_data = _loads(log.request_data)
+    response_data = _loads(log.response_data)
+    return {
+        'id': log.id,
+        'api_type': log.api_type,
+        'strategy': _first(log.strategy, request_data.get('strategy')),
+        'symbol': _first(log.symbol, request_data.get('symbol')),
+        'exchange': _first(log.exchange, request_data.get('exchange')),
+        'action': _first(log.action, request_data.get('action')),
+        'quantity': _first(log.quantity, request_data.get('quantity')),
+        'price': request_data.get('price'),
+        'orderid': _first(log.orderid, response_data.get('orderid'), request_data.get('orderid')),
+        'status': _first(log.status, response_data.get('status')),
+        'latency_ms': log.latency_ms,
+        'message': response_data.get('message'),
+        'request_data': log.request_data,
+        'response_data': log.response_data,
+        'created_at': log.created_at.strftime('%Y-%m-%d %H:%M:%S') if log.created_at else None,
+    }
+
+
+def filter_order_logs(start=None, end=None, api_type=None, strategy=None, symbol=None, action=None,
+                      orderid=None, cursor=None):
+    """The OrderLog query for the given filters and cursor, ordered newest first."""
+    query = OrderLog.query
+    if start is not None:
+        query = query.filter(OrderLog.created_at >= start)
+    if end is not None:
+        query = query.filter(OrderLog.created_at < end)
+    if api_type:
+        query = query.filter(OrderLog.api_type == api_type)
+    if strategy:
+        query = query.filter(OrderLog.strategy == strategy)
+    if symbol:
+        query = query.filter(OrderLog.symbol == symbol)
+    if action:
+        query = query.filter(OrderLog.action == action.upper())
+    if orderid:
+        query = query.filter(OrderLog.orderid == str(orderid))
+    if cursor:
+        created_at, log_id = decode_cursor(cursor)
+        query = query.filter(or_(OrderLog.created_at < created_at,
+                                 and_(OrderLog.created_at == created_at, OrderLog.id < log_id)))
+    return query.order_by(OrderLog.created_at.desc(), OrderLog.id.desc())
+
+
+def query_order_logs(start=None, end=None, api_type=None, strategy=None, symbol=None, action=None,
+                     orderid=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (logs, next_cursor) for one page of order logs, newest first.
+
+    `start` and `end` bound created_at as [start, end). `cursor` is the next_cursor of
+    the previous page; next_cursor is None on the last page. Raises ValueError for a
+    malformed cursor.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    rows = filter_order_logs(start, end, api_type, strategy, symbol, action, orderid, cursor).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [summarize_log(row) for row in rows], next_cursor
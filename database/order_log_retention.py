@@ -0,0 +1,217 @@
+# database/order_log_retention.py
+
+"""
+Keeps the order_logs table to the last ORDER_LOG_RETENTION_DAYS IST days.
+
+Older rows are moved, one IST day and one batch at a time, into the compressed
+archive (see database.order_log_archive) and then deleted from the table, so the
+logs page and queries only ever touch recent data while historical logs stay
+readable through query_order_log_history. With ORDER_LOG_ARCHIVE disabled old rows
+are purged without being archived.
+
+Retention is off unless ORDER_LOG_RETENTION_DAYS is set. The archive is plain files,
+so on hosts whose disk does not survive a redeploy (Railway, Vercel) it must point
+at persistent storage; the background worker does not start while archiving to a
+directory that was never configured: every run, scheduled, manual or from the
+dashboard, is skipped until ORDER_LOG_ARCHIVE_DIR is set.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func, text
+from dotenv import load_dotenv
+
+from database.apilog_db import OrderLog, engine
+from database.order_log_archive import ARCHIVE_COLUMNS, write_archive
+from database.order_log_query import IST, as_ist, ist_day_range, today_ist
+from utils.colored_logger import logger
+
+load_dotenv()
+
+# Days of order logs kept in the table, counting today; 0 (default) keeps everything
+ORDER_LOG_RETENTION_DAYS = int(os.getenv('ORDER_LOG_RETENTION_DAYS', '0'))
+# Archive rows before deleting them; when disabled they are purged
+ORDER_LOG_ARCHIVE = os.getenv('ORDER_LOG_ARCHIVE', 'true').lower() == 'true'
+# Rows moved per transaction (and per archive file)
+ORDER_LOG_RETENTION_BATCH = int(os.getenv('ORDER_LOG_RETENTION_BATCH', '5000'))
+# Seconds between background retention runs; 0 disables the background worker
+ORDER_LOG_RETENTION_INTERVAL = int(os.getenv('ORDER_LOG_RETENTION_INTERVAL', '3600'))
+
+# Key of the PostgreSQL advisory lock so only one worker process runs retention at a time
+ORDER_LOG_RETENTION_LOCK_ID = 7_301_942_062
+
+_run_lock = threading.Lock()
+_worker = None
+_worker_pid = None
+_status_lock = threading.Lock()
+_status = {
+    'state': 'idle',  # idle, running, success, skipped, error
+    'started_at': None,
+    'finished_at': None,
+    'cutoff': None,
+    'days': [],
+    'archived': 0,
+    'deleted': 0,
+    'files': 0,
+    'message': None,
+}
+
+
+def _update_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+
+def get_order_log_retention_status():
+    """Return a snapshot of the current or most recent retention run."""
+    with _status_lock:
+        status = dict(_status, days=list(_status['days']))
+    status['retention_days'] = ORDER_LOG_RETENTION_DAYS
+    status['archive'] = ORDER_LOG_ARCHIVE
+    return status
+
+
+def retention_cutoff(now=None):
+    """Start of the oldest IST day kept in the table, or None when retention is disabled."""
+    if ORDER_LOG_RETENTION_DAYS <= 0:
+        return None
+    today = now.astimezone(IST).date() if now is not None else today_ist()
+    return ist_day_range(today - timedelta(days=ORDER_LOG_RETENTION_DAYS - 1))[0]
+
+
+@contextmanager
+def _cross_process_lock():
+    """
+    Yield whether this process may run retention: a PostgreSQL session advisory lock
+    when another worker is not already holding it. Other databases run unlocked.
+    """
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                {'key': ORDER_LOG_RETENTION_LOCK_ID}).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ORDER_LOG_RETENTION_LOCK_ID})
+                conn.commit()
+
+
+def _move_day(day, cutoff, batch_size, totals):
+    """Archive and delete the rows of one IST day older than the cutoff, in id-ordered batches."""
+    table = OrderLog.__table__
+    start, end = ist_day_range(day)
+    end = min(end, cutoff)
+    in_day = (table.c.created_at >= start, table.c.created_at < end)
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(*[table.c[name] for name in ARCHIVE_COLUMNS])
+                .where(table.c.id > last_id, *in_day).order_by(table.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                return
+            first_id, last_id = rows[0]['id'], rows[-1]['id']
+            if ORDER_LOG_ARCHIVE:
+                # The file is complete before the rows are deleted; a failed delete only leaves duplicates
+                write_archive(day, rows)
+                totals['files'] += 1
+                totals['archived'] += len(rows)
+            # Every row of the day in this id range was just read, so the range deletes exactly those
+            result = conn.execute(delete(table).where(table.c.id >= first_id, table.c.id <= last_id, *in_day))
+            totals['deleted'] += result.rowcount
+
+
+# The default directory is on the app's own disk, which an ephemeral host wipes on redeploy
+ARCHIVE_DIR_MISSING = ("Order log retention skipped: set ORDER_LOG_ARCHIVE_DIR to persistent storage "
+                       "(or ORDER_LOG_ARCHIVE=false to purge old logs)")
+
+
+def _archive_dir_missing():
+    return ORDER_LOG_ARCHIVE and not os.getenv('ORDER_LOG_ARCHIVE_DIR')
+
+
+def run_order_log_retention(now=None, batch_size=None):
+    """
+    Move order logs older than the retention window out of the table. Returns a dict
+    with `status` (success, skipped or error), the `cutoff`, the IST `days` processed
+    and the rows `archived` and `deleted`.
+    """
+    cutoff = retention_cutoff(now)
+    if cutoff is None:
+        return {'status': 'skipped', 'message': 'Order log retention is disabled'}
+    if _archive_dir_missing():
+        logger.warning(ARCHIVE_DIR_MISSING)
+        _update_status(state='skipped', message=ARCHIVE_DIR_MISSING)
+        return {'status': 'skipped', 'message': ARCHIVE_DIR_MISSING}
+    if not _run_lock.acquire(blocking=False):
+        return {'status': 'skipped', 'message': 'Order log retention is already running'}
+
+    totals = {'archived': 0, 'deleted': 0, 'files': 0}
+    days = []
+    _update_status(state='running', started_at=datetime.now().isoformat(), finished_at=None,
+                   cutoff=cutoff.isoformat(), days=days, message=None, **totals)
+    try:
+        with _cross_process_lock() as acquired:
+            if not acquired:
+                result = {'status': 'skipped', 'message': 'Order log retention is running in another worker'}
+            else:
+                while True:
+                    with engine.connect() as conn:
+                        oldest = conn.execute(select(func.min(OrderLog.created_at))
+                                              .where(OrderLog.created_at < cutoff)).scalar()
+                    if oldest is None:
+                        break
+                    if isinstance(oldest, str):
+                        oldest = datetime.fromisoformat(oldest)
+                    day = as_ist(oldest).astimezone(IST).date()
+                    _move_day(day, cutoff, batch_size or ORDER_LOG_RETENTION_BATCH, totals)
+                    days.append(day.isoformat())
+                    _update_status(**totals)
+                result = {'status': 'success',
+                          'message': f"Moved {totals['deleted']} order logs from {len(days)} days out of the table"}
+    except Exception as e:
+        logger.error(f"Order log retention failed: {e}")
+        result = {'status': 'error', 'message': str(e)}
+    finally:
+        _run_lock.release()
+
+    result.update(cutoff=cutoff.isoformat(), days=days, **totals)
+    _update_status(state=result['status'], finished_at=datetime.now().isoformat(), message=result['message'], **totals)
+    return result
+
+
+def _retention_loop():
+    while True:
+        result = run_order_log_retention()
+        if result.get('deleted'):
+            logger.info(result['message'])
+        time.sleep(ORDER_LOG_RETENTION_INTERVAL)
+
+
+def start_order_log_retention():
+    """Run retention every ORDER_LOG_RETENTION_INTERVAL seconds on a background thread, once per process."""
+    global _worker, _worker_pid
+    if ORDER_LOG_RETENTION_INTERVAL <= 0 or ORDER_LOG_RETENTION_DAYS <= 0:
+        return
+    if _archive_dir_missing():
+        # Every run would be skipped, don't start a worker for nothing
+        logger.warning(ARCHIVE_DIR_MISSING)
+        return
+    if _worker is not None and _worker_pid == os.getpid() and _worker.is_alive():
+        return
+    _worker_pid = os.getpid()
+    _worker = threading.Thread(target=_retention_loop, name='order-log-retention', daemon=True)
+    _worker.start()
+
+
+if __name__ == '__main__':
+    print(run_order_log_retention())
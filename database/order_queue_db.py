@@ -0,0 +1,234 @@
+# database/order_queue_db.py
+
+"""
+Durable queue of accepted webhook orders waiting for, or done with, broker execution.
+
+The queue lives in its own SQLite database in WAL mode, separate from the main
+database, so accepting an order is one local fsync'd insert however slow the broker
+or the main database is, and queued orders survive a restart. Every worker process
+on the host shares the file; orders are claimed with a conditional update so each
+one is sent at most once.
+
+A claim holds a lease, renewed by the claiming process while the order runs. Each
+process is identified by a random id made at start (and again after a fork), not
+by its PID, which a restarted container worker usually gets back. A running order
+whose lease has lapsed belonged to a process that is gone and is recovered.
+"""
+
+import os
+import json
+import uuid
+import time
+import threading
+
+from sqlalchemy import (create_engine, event, Column, Integer, Float, String, Text, Index, select, update, delete, func,
+                        exists, or_, and_, inspect, text)
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ORDER_QUEUE_DATABASE_URL = os.getenv('ORDER_QUEUE_DATABASE_URL', 'sqlite:///tmp/order_queue.db')
+
+# States of a queued order
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+EXPIRED = 'expired'
+INTERRUPTED = 'interrupted'
+
+# Id of this process in the queue, made again in a forked child
+_worker = (None, None)
+_worker_lock = threading.Lock()
+
+
+def worker_id():
+    global _worker
+    pid, current = _worker
+    if pid != os.getpid():
+        with _worker_lock:
+            pid, current = _worker
+            if pid != os.getpid():
+                current = uuid.uuid4().hex
+                _worker = (os.getpid(), current)
+    return current
+
+
+if ORDER_QUEUE_DATABASE_URL.startswith('sqlite:///'):
+    _directory = os.path.dirname(ORDER_QUEUE_DATABASE_URL[len('sqlite:///'):])
+    if _directory:
+        os.makedirs(_directory, exist_ok=True)
+
+engine = create_engine(ORDER_QUEUE_DATABASE_URL, connect_args={'timeout': 10, 'check_same_thread': False}
+                       if ORDER_QUEUE_DATABASE_URL.startswith('sqlite') else {})
+
+
+@event.listens_for(engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    if engine.dialect.name != 'sqlite':
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL lets request threads append while executor threads read and update,
+    # FULL sync makes an acknowledged order survive a power loss as well as a crash
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=FULL')
+    cursor.close()
+
+
+db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+Base = declarative_base()
+Base.query = db_session.query_property()
+
+
+class QueuedOrder(Base):
+    __tablename__ = 'order_queue'
+    id = Column(String(32), primary_key=True)  # acknowledgement id returned to the caller
+    kind = Column(String(32), nullable=False)  # placeorder or placesmartorder
+    lane_key = Column(String(255))  # orders sharing a lane key run one at a time, in order
+    user_id = Column(String(255))
+    request_data = Column(Text, nullable=False)  # the request without its apikey
+    state = Column(String(16), nullable=False, default=QUEUED)
+    http_status = Column(Integer)
+    response_data = Column(Text)
+    created_at = Column(Float, nullable=False)  # epoch seconds, comparable across processes
+    started_at = Column(Float)
+    finished_at = Column(Float)
+    worker_pid = Column(Integer)
+    worker_id = Column(String(32))  # process that claimed the order, see worker_id()
+    lease_expires_at = Column(Float)  # a running order whose lease lapsed lost its process
+
+    __table_args__ = (
+        Index('ix_order_queue_state_created_at', 'state', 'created_at'),
+        Index('ix_order_queue_lane_key_state', 'lane_key', 'state'),
+    )
+
+
+def init_db():
+    print("Initializing Order Queue DB")
+    Base.metadata.create_all(bind=engine)
+    # Queues created before lane keys and leases existed
+    existing = {column['name'] for column in inspect(engine).get_columns(QueuedOrder.__tablename__)}
+    for name, column_type in (('lane_key', 'VARCHAR(255)'), ('worker_id', 'VARCHAR(32)'), ('lease_expires_at', 'FLOAT')):
+        if name not in existing:
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {QueuedOrder.__tablename__} ADD COLUMN {name} {column_type}'))
+    for index in QueuedOrder.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def enqueue_order(kind, user_id, request_data, lane_key=None):
+    """Store an accepted order and return its acknowledgement id."""
+    ack_id = uuid.uuid4().hex
+    with engine.begin() as conn:
+        conn.execute(QueuedOrder.__table__.insert(), {
+            'id': ack_id, 'kind': kind, 'user_id': user_id, 'request_data': json.dumps(request_data),
+            'lane_key': lane_key, 'state': QUEUED, 'created_at': time.time(),
+        })
+    return ack_id
+
+
+def claim_next_order(max_age=None, lease=30):
+    """
+    Mark the oldest queued order as running for this process, leased for `lease`
+    seconds, and return it as a dict, or None when nothing can run. Orders queued
+    longer than `max_age` seconds are marked expired instead of being returned, a
+    late signal is worse than none.
+
+    An order with a lane key only runs once every order queued before it on the same
+    lane has finished, so orders for one lane go to the broker strictly in order
+    whichever worker process claims them.
+    """
+    table = QueuedOrder.__table__
+    ahead = table.alias('ahead')
+    blocked = exists().where(ahead.c.lane_key == table.c.lane_key, or_(
+        ahead.c.state == RUNNING,
+        and_(ahead.c.state == QUEUED, or_(ahead.c.created_at < table.c.created_at,
+                                          and_(ahead.c.created_at == table.c.created_at, ahead.c.id < table.c.id)))))
+    while True:
+        with engine.connect() as conn:
+            row = conn.execute(select(table).where(table.c.state == QUEUED, or_(table.c.lane_key.is_(None), ~blocked))
+                               .order_by(table.c.created_at, table.c.id).limit(1)).mappings().first()
+        if row is None:
+            return None
+        now = time.time()
+        expired = max_age is not None and now - row['created_at'] > max_age
+        if expired:
+            values = {'state': EXPIRED, 'finished_at': now, 'http_status': 504,
+                      'response_data': json.dumps({'status': 'error',
+                                                   'message': 'Order expired in the queue before it was sent'})}
+        else:
+            values = {'state': RUNNING, 'started_at': now, 'worker_pid': os.getpid(), 'worker_id': worker_id(),
+                      'lease_expires_at': now + lease}
+        # A write transaction of its own (not upgraded from the read) so SQLite waits for
+        # the lock instead of failing, and the state check lets only one worker win
+        with engine.begin() as conn:
+            claimed = conn.execute(update(table).where(table.c.id == row['id'], table.c.state == QUEUED)
+                                   .values(**values)).rowcount
+        if claimed and not expired:
+            order = dict(row)
+            order['request_data'] = json.loads(order['request_data'])
+            return order
+        # Expired, or claimed by another worker in the meantime: look at the next one
+
+
+def finish_order(ack_id, http_status, response_data):
+    """Record the outcome of a running order."""
+    with engine.begin() as conn:
+        conn.execute(update(QueuedOrder.__table__).where(QueuedOrder.__table__.c.id == ack_id).values(
+            state=DONE if http_status < 400 else FAILED, http_status=http_status,
+            response_data=json.dumps(response_data), finished_at=time.time()))
+
+
+def renew_leases(lease):
+    """Extend the lease of every order this process is running by `lease` seconds."""
+    table = QueuedOrder.__table__
+    with engine.begin() as conn:
+        return conn.execute(update(table).where(table.c.state == RUNNING, table.c.worker_id == worker_id())
+                            .values(lease_expires_at=time.time() + lease)).rowcount
+
+
+def recover_interrupted_orders(lease=30):
+    """
+    Mark running orders whose lease has lapsed as interrupted; their process is gone.
+    Orders claimed before leases existed count as leased for `lease` seconds from
+    their start. They are not retried: the broker may have received them, so the
+    outcome is unknown. Returns how many were marked.
+    """
+    table = QueuedOrder.__table__
+    now = time.time()
+    lapsed = and_(table.c.state == RUNNING, or_(
+        table.c.lease_expires_at < now,
+        and_(table.c.lease_expires_at.is_(None), or_(table.c.started_at.is_(None), table.c.started_at < now - lease))))
+    with engine.begin() as conn:
+        return conn.execute(update(table).where(lapsed).values(
+            state=INTERRUPTED, finished_at=now, http_status=500,
+            response_data=json.dumps({'status': 'error', 'message': 'Execution was interrupted, '
+                                      'check the order book before sending the order again'}))).rowcount
+
+
+def get_queued_order(ack_id):
+    """The queued order with this acknowledgement id as a dict, or None."""
+    with engine.connect() as conn:
+        row = conn.execute(select(QueuedOrder.__table__).where(QueuedOrder.__table__.c.id == ack_id)).mappings().first()
+    if row is None:
+        return None
+    order = dict(row)
+    order['request_data'] = json.loads(order['request_data'])
+    order['response_data'] = json.loads(order['response_data']) if order['response_data'] else None
+    return order
+
+
+def queue_depth():
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(QueuedOrder.__table__)
+                            .where(QueuedOrder.__table__.c.state == QUEUED)).scalar()
+
+
+def prune_finished_orders(older_than):
+    """Delete finished orders that completed more than `older_than` seconds ago."""
+    table = QueuedOrder.__table__
+    with engine.begin() as conn:
+        return conn.execute(delete(table).where(table.c.state.notin_([QUEUED, RUNNING]),
+                                                table.c.finished_at < time.time() - older_than)).rowcount
@@ -0,0 +1,214 @@
+# database/symbol_search.py
+
+"""
+In-memory instrument search used by symbol search and autocomplete.
+
+Symbols are held per exchange in sorted order, so exact and prefix matches are a
+binary search, and a trigram inverted index narrows substring matches down to a
+handful of candidates instead of scanning the whole symbol master.
+"""
+
+import os
+import threading
+import time
+import heapq
+from bisect import bisect_left
+from collections import namedtuple
+from array import array
+from operator import itemgetter
+
+from sqlalchemy import select
+from dotenv import load_dotenv
+from database.master_contract_db import SymToken, SYMTOKEN_COLUMNS, engine
+
+load_dotenv()
+
+# Rebuild the search index in the background once it is older than this many seconds
+SYMBOL_INDEX_TTL = int(os.getenv('SYMBOL_INDEX_TTL', '3600'))
+
+# Same attribute names as SymToken, id included, so results can be used wherever query results were
+SYMBOL_RECORD_COLUMNS = ['id'] + SYMTOKEN_COLUMNS
+SymbolRecord = namedtuple('SymbolRecord', SYMBOL_RECORD_COLUMNS)
+
+NGRAM = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _unique(positions):
+    """Drop repeats from an ascending stream of positions."""
+    previous = None
+    for position in positions:
+        if position != previous:
+            yield position
+            previous = position
+
+
+class ExchangeSearchIndex:
+    """Symbols of one exchange sorted by their upper-cased text, with trigram postings into that order."""
+
+    def __init__(self, entries):
+        entries.sort(key=itemgetter(0))
+        self.keys = [key for key, _ in entries]
+        self.records = [record for _, record in entries]
+        postings = {}
+        self.short_keys = []  # positions of symbols too short to have a trigram
+        for position, key in enumerate(self.keys):
+            if len(key) < NGRAM:
+                self.short_keys.append(position)
+            for gram in _ngrams(key):
+                postings.setdefault(gram, []).append(position)
+        # Positions are appended in ascending order, so every posting list is already sorted
+        self.postings = {gram: array('i', positions) for gram, positions in postings.items()}
+        # Queries shorter than a trigram are answered from the trigrams that contain them
+        self.short_grams = {}
+        for gram in self.postings:
+            for size in range(1, NGRAM):
+                for start in range(NGRAM - size + 1):
+                    grams = self.short_grams.setdefault(gram[start:start + size], [])
+                    if not grams or grams[-1] != gram:
+                        grams.append(gram)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def exact(self, query):
+        position = bisect_left(self.keys, query)
+        while position < len(self.keys) and self.keys[position] == query:
+            yield self.records[position]
+            position += 1
+
+    def prefix(self, query):
+        """Symbols starting with `query` but not equal to it, in alphabetical order."""
+        position = bisect_left(self.keys, query)
+        while position < len(self.keys) and self.keys[position].startswith(query):
+            if self.keys[position] != query:
+                yield self.records[position]
+            position += 1
+
+    def substring(self, query):
+        """Symbols containing `query` anywhere after the first character, in alphabetical order."""
+        if len(query) < NGRAM:
+            lists = [self.postings[gram] for gram in self.short_grams.get(query, [])]
+            candidates = _unique(heapq.merge(self.short_keys, *lists))
+        else:
+            grams = _ngrams(query)
+            lists = [self.postings.get(gram) for gram in grams]
+            if any(positions is None for positions in lists):
+                return
+            # Walk the shortest posting list and verify each candidate
+            candidates = min(lists, key=len)
+        for position in candidates:
+            key = self.keys[position]
+            if query in key and not key.startswith(query):
+                yield self.records[position]
+
+
+class SymbolSearchIndex:
+    """
+    Read-only search index over the symbol master, grouped by exchange. Like the
+    lookup index in database.token_db it is never mutated; a refresh builds a new
+    one and swaps it in.
+    """
+
+    def __init__(self, rows):
+        by_exchange = {}
+        for row in rows:
+            record = SymbolRecord(*row)
+            key = (record.symbol or '').upper()
+            by_exchange.setdefault(record.exchange, []).append((key, record))
+        self.exchanges = {exchange: ExchangeSearchIndex(entries) for exchange, entries in by_exchange.items()}
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return sum(len(index) for index in self.exchanges.values())
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at > SYMBOL_INDEX_TTL
+
+    def _indexes(self, exchange):
+        if exchange:
+            index = self.exchanges.get(exchange)
+            return [index] if index else []
+        return [self.exchanges[name] for name in sorted(self.exchanges)]
+
+    def search(self, query, exchange=None, instrumenttype=None, limit=50):
+        """
+        Return up to `limit` SymbolRecords (all of them when `limit` is None) matching
+        `query` case-insensitively, ranked exact matches first, then prefix matches, then
+        substring matches. `exchange` and `instrumenttype` restrict the results when given.
+        """
+        query = (query or '').strip().upper()
+        if not query or (limit is not None and limit <= 0):
+            return []
+        indexes = self._indexes(exchange)
+        results = []
+        for tier in ('exact', 'prefix', 'substring'):
+            for index in indexes:
+                for record in getattr(index, tier)(query):
+                    if instrumenttype and record.instrumenttype != instrumenttype:
+                        continue
+                    results.append(record)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+    def exact(self, query, exchange=None):
+        """Return every SymbolRecord whose symbol equals `query` case-insensitively."""
+        query = (query or '').strip().upper()
+        return [record for index in self._indexes(exchange) for record in index.exact(query)]
+
+
+_search_index = None
+_build_lock = threading.Lock()
+_background_build = None
+
+
+def build_search_index():
+    """Build a new SymbolSearchIndex from the symtoken table in a single pass."""
+    query = select(*[getattr(SymToken, column) for column in SYMBOL_RECORD_COLUMNS]).order_by(SymToken.id)
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+    return SymbolSearchIndex(rows)
+
+
+def rebuild_search_index():
+    """Rebuild the search index from the database and atomically swap it in."""
+    global _search_index
+    with _build_lock:
+        start = time.monotonic()
+        try:
+            index = build_search_index()
+        except Exception as e:
+            print(f"Error while building the symbol search index: {e}")
+            return None
+        _search_index = index
+        print(f"Symbol search index loaded with {len(index)} symbols in {time.monotonic() - start:.2f}s")
+        return index
+
+
+def warm_search_index():
+    """Start a background rebuild of the search index unless one is already running."""
+    global _background_build
+    if _background_build is not None and _background_build.is_alive():
+        return
+    _background_build = threading.Thread(target=rebuild_search_index, daemon=True)
+    _background_build.start()
+
+
+def get_search_index():
+    """
+    Return the current search index, or None when searches should fall back to the
+    database (index not loaded yet, or the table was empty when it was built).
+    """
+    index = _search_index
+    if index is None:
+        warm_search_index()
+        return None
+    if index.is_stale() or len(index) == 0:
+        warm_search_index()
+    if len(index) == 0:
+        return None
+    return index
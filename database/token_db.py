@@ -1,30 +1,133 @@
-from database.master_contract_db import SymToken  # Import here to avoid circular imports
-from cachetools import TTLCache
+from database.master_contract_db import SymToken, engine  # Import here to avoid circular imports
+from sqlalchemy import select, tuple_
+from dotenv import load_dotenv
+import os
+import threading
+import time
+
+load_dotenv()
+
+# Rebuild the in-memory symbol index in the background once it is older than this many seconds
+SYMBOL_INDEX_TTL = int(os.getenv('SYMBOL_INDEX_TTL', '3600'))
+
+# (key, exchange) pairs per IN query when bulk lookups fall back to the database
+SYMBOL_BULK_QUERY_SIZE = 500
+
+
+class SymbolIndex:
+    """
+    Read-only in-memory copy of the symtoken lookup columns.
+
+    Rows are held column-wise in parallel lists and the lookup dicts map a
+    (key, exchange) pair to the row position of its first occurrence, which
+    matches the `.first()` semantics of the SQL lookups they replace. An index
+    is never mutated after it is built; a refresh builds a new one and swaps it in.
+    """
+
+    def __init__(self, rows):
+        self.symbols = []
+        self.brsymbols = []
+        self.tokens = []
+        self.exchanges = []
+        self.names = []     # underlying, e.g. NIFTY for its options and futures
+        self.lotsizes = []
+        self.by_symbol = {}    # (symbol, exchange) -> row
+        self.by_token = {}     # (token, exchange) -> row
+        self.by_brsymbol = {}  # (brsymbol, exchange) -> row
+
+        for row, (symbol, brsymbol, token, exchange, name, lotsize) in enumerate(rows):
+            self.symbols.append(symbol)
+            self.brsymbols.append(brsymbol)
+            self.tokens.append(token)
+            self.exchanges.append(exchange)
+            self.names.append(name)
+            self.lotsizes.append(lotsize)
+            self.by_symbol.setdefault((symbol, exchange), row)
+            self.by_token.setdefault((token, exchange), row)
+            self.by_brsymbol.setdefault((brsymbol, exchange), row)
+
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at > SYMBOL_INDEX_TTL
+
+
+_symbol_index = None
+_build_lock = threading.Lock()
+_background_build = None
+
+
+def build_symbol_index():
+    """Build a new SymbolIndex from the symtoken table in a single pass."""
+    query = (select(SymToken.symbol, SymToken.brsymbol, SymToken.token, SymToken.exchange, SymToken.name,
+                    SymToken.lotsize)
+             .order_by(SymToken.id))
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+    return SymbolIndex(rows)
+
+
+def rebuild_symbol_index():
+    """
+    Rebuild the symbol index from the database and atomically swap it in.
+    Lookups running concurrently keep using the previous index until the swap.
+    """
+    global _symbol_index
+    with _build_lock:
+        start = time.monotonic()
+        try:
+            index = build_symbol_index()
+        except Exception as e:
+            print(f"Error while building the symbol index: {e}")
+            return None
+        _symbol_index = index
+        print(f"Symbol index loaded with {len(index)} symbols in {time.monotonic() - start:.2f}s")
+        return index
+
+
+def warm_symbol_index():
+    """Start a background rebuild of the symbol index unless one is already running."""
+    global _background_build
+    if _background_build is not None and _background_build.is_alive():
+        return
+    _background_build = threading.Thread(target=rebuild_symbol_index, daemon=True)
+    _background_build.start()
+
+
+def _get_index():
+    """
+    Return the current symbol index, or None when lookups should fall back to the database
+    (index not loaded yet, or the table was empty when it was built).
+    """
+    index = _symbol_index
+    if index is None:
+        warm_symbol_index()
+        return None
+    if index.is_stale() or len(index) == 0:
+        warm_symbol_index()
+    if len(index) == 0:
+        return None
+    return index
 
-# Define a cache for the tokens, symbols with a max size and a 3600-second TTL
-token_cache = TTLCache(maxsize=1024, ttl=3600)
 
 def get_token(symbol, exchange):
     """
-    Retrieves a token for a given symbol and exchange, utilizing a cache to improve performance.
+    Retrieves a token for a given symbol and exchange from the in-memory symbol index.
     """
-    cache_key = f"{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        token = get_token_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if token is not None:
-            token_cache[cache_key] = token
-        return token
+    index = _get_index()
+    if index is None:
+        return get_token_dbquery(symbol, exchange)
+    row = index.by_symbol.get((symbol, exchange))
+    return index.tokens[row] if row is not None else None
 
 def get_token_dbquery(symbol, exchange):
     """
     Queries the database for a token by symbol and exchange.
     """
-    
+
     try:
         sym_token = SymToken.query.filter_by(symbol=symbol, exchange=exchange).first()
         if sym_token:
@@ -34,24 +137,47 @@ def get_token_dbquery(symbol, exchange):
     except Exception as e:
         print(f"Error while querying the database: {e}")
         return None
-    
+
+
+def get_symbol_details(symbol, exchange):
+    """
+    Retrieves the token, broker symbol, underlying name and lot size of a symbol as a
+    dict, or None when the symbol is not known on the exchange.
+    """
+    index = _get_index()
+    if index is None:
+        return get_symbol_details_dbquery(symbol, exchange)
+    row = index.by_symbol.get((symbol, exchange))
+    if row is None:
+        return None
+    return {'token': index.tokens[row], 'brsymbol': index.brsymbols[row], 'name': index.names[row],
+            'lotsize': index.lotsizes[row]}
+
+def get_symbol_details_dbquery(symbol, exchange):
+    """
+    Queries the database for the details of a symbol by symbol and exchange.
+    """
+    try:
+        sym_token = SymToken.query.filter_by(symbol=symbol, exchange=exchange).first()
+        if sym_token:
+            return {'token': sym_token.token, 'brsymbol': sym_token.brsymbol, 'name': sym_token.name,
+                    'lotsize': sym_token.lotsize}
+        else:
+            return None
+    except Exception as e:
+        print(f"Error while querying the database: {e}")
+        return None
 
 
 def get_symbol(token, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves a symbol for a given token and exchange from the in-memory symbol index.
     """
-    cache_key = f"{token}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        symbol = get_symbol_dbquery(token, exchange)
-        # Cache the result for future requests
-        if symbol is not None:
-            token_cache[cache_key] = symbol
-        return symbol
+    index = _get_index()
+    if index is None:
+        return get_symbol_dbquery(token, exchange)
+    row = index.by_token.get((token, exchange))
+    return index.symbols[row] if row is not None else None
 
 def get_symbol_dbquery(token, exchange):
     """
@@ -70,19 +196,13 @@ def get_symbol_dbquery(token, exchange):
 
 def get_oa_symbol(symbol, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves the OpenAlgo symbol for a given broker symbol and exchange from the in-memory symbol index.
     """
-    cache_key = f"oa{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        oasymbol = get_oa_symbol_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if oasymbol is not None:
-            token_cache[cache_key] = oasymbol
-        return oasymbol
+    index = _get_index()
+    if index is None:
+        return get_oa_symbol_dbquery(symbol, exchange)
+    row = index.by_brsymbol.get((symbol, exchange))
+    return index.symbols[row] if row is not None else None
 
 def get_oa_symbol_dbquery(symbol, exchange):
     """
@@ -101,19 +221,13 @@ def get_oa_symbol_dbquery(symbol, exchange):
 
 def get_br_symbol(symbol, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves the broker symbol for a given symbol and exchange from the in-memory symbol index.
     """
-    cache_key = f"br{symbol}-{exchange}"
-    # Attempt to retrieve from cache
-    if cache_key in token_cache:
-        return token_cache[cache_key]
-    else:
-        # Query database if not in cache
-        brsymbol = get_br_symbol_dbquery(symbol, exchange)
-        # Cache the result for future requests
-        if brsymbol is not None:
-            token_cache[cache_key] = brsymbol
-        return brsymbol
+    index = _get_index()
+    if index is None:
+        return get_br_symbol_dbquery(symbol, exchange)
+    row = index.by_symbol.get((symbol, exchange))
+    return index.brsymbols[row] if row is not None else None
 
 def get_br_symbol_dbquery(symbol, exchange):
     """
@@ -127,4 +241,74 @@ def get_br_symbol_dbquery(symbol, exchange):
             return None
     except Exception as e:
         print(f"Error while querying the database: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _bulk_lookup(pairs, by, values, key_column, value_column):
+    """
+    Resolve distinct (key, exchange) pairs to values in one pass: a dict lookup per pair
+    on the symbol index, or IN queries on the database when the index is not loaded.
+    Returns a dict of pair -> value with unresolved pairs left out.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    index = _get_index()
+    if index is not None:
+        lookup = getattr(index, by)
+        column = getattr(index, values)
+        resolved = {}
+        for pair in pairs:
+            row = lookup.get(pair)
+            if row is not None:
+                resolved[pair] = column[row]
+        return resolved
+
+    resolved = {}
+    pairs = list(pairs)
+    try:
+        with engine.connect() as conn:
+            for start in range(0, len(pairs), SYMBOL_BULK_QUERY_SIZE):
+                chunk = pairs[start:start + SYMBOL_BULK_QUERY_SIZE]
+                query = (select(key_column, SymToken.exchange, value_column)
+                         .where(tuple_(key_column, SymToken.exchange).in_(chunk))
+                         .order_by(SymToken.id))
+                for key, exchange, value in conn.execute(query):
+                    # First match wins, like the single lookups
+                    resolved.setdefault((key, exchange), value)
+    except Exception as e:
+        print(f"Error while querying the database: {e}")
+    return resolved
+
+
+def get_symbols_bulk(pairs):
+    """
+    Retrieves symbols for many (token, exchange) pairs at once.
+    Returns a dict of (token, exchange) -> symbol; pairs with no match are left out.
+    """
+    return _bulk_lookup(pairs, 'by_token', 'symbols', SymToken.token, SymToken.symbol)
+
+
+def get_oa_symbols_bulk(pairs):
+    """
+    Retrieves OpenAlgo symbols for many (broker symbol, exchange) pairs at once.
+    Returns a dict of (brsymbol, exchange) -> symbol; pairs with no match are left out.
+    """
+    return _bulk_lookup(pairs, 'by_brsymbol', 'symbols', SymToken.brsymbol, SymToken.symbol)
+
+
+def get_tokens_bulk(pairs):
+    """
+    Retrieves tokens for many (symbol, exchange) pairs at once.
+    Returns a dict of (symbol, exchange) -> token; pairs with no match are left out.
+    """
+    return _bulk_lookup(pairs, 'by_symbol', 'tokens', SymToken.symbol, SymToken.token)
+
+
+def get_br_symbols_bulk(pairs):
+    """
+    Retrieves broker symbols for many (symbol, exchange) pairs at once.
+    Returns a dict of (symbol, exchange) -> brsymbol; pairs with no match are left out.
+    """
+    return _bulk_lookup(pairs, 'by_symbol', 'brsymbols', SymToken.symbol, SymToken.brsymbol)
@@ -1,15 +1,21 @@
 # database/tv_search.py
 
 from database.master_contract_db import SymToken
+from database.symbol_search import get_search_index
 #from database.db import db_session
 
 def search_symbols(symbol, exchange):
-    # First try case-insensitive search (convert both to uppercase)
-    results = SymToken.query.filter(SymToken.symbol.ilike(f"{symbol}"), SymToken.exchange == exchange).all()
-    
-    # If no results, try a more flexible search with partial matching
-    if not results:
-        results = SymToken.query.filter(SymToken.symbol.ilike(f"%{symbol}%"), SymToken.exchange == exchange).all()
+    index = get_search_index()
+    if index is not None:
+        # Exact matches, otherwise every partial match like the SQL below, ranked prefix before substring
+        results = index.exact(symbol, exchange) or index.search(symbol, exchange, limit=None)
+    else:
+        # First try case-insensitive search (convert both to uppercase)
+        results = SymToken.query.filter(SymToken.symbol.ilike(f"{symbol}"), SymToken.exchange == exchange).all()
+        
+        # If no results, try a more flexible search with partial matching
+        if not results:
+            results = SymToken.query.filter(SymToken.symbol.ilike(f"%{symbol}%"), SymToken.exchange == exchange).all()
     
     # If still no results, create a dummy symbol for testing purposes
     if not results:
@@ -1,5 +1,5 @@
 import json
-from database.token_db import get_symbol, get_oa_symbol 
+from database.token_db import get_symbols_bulk, get_oa_symbols_bulk
 
 def map_order_data(order_data):
     """
@@ -36,13 +36,14 @@ def map_order_data(order_data):
     
     # Process each order in the list
     if order_list:
+        # Resolve every distinct (token, exchange) pair in one lookup
+        symbols = get_symbols_bulk((order['symboltoken'], order['exchange']) for order in order_list)
         for order in order_list:
             # Extract the instrument_token and exchange for the current order
             symboltoken = order['symboltoken']
             exchange = order['exchange']
             
-            # Use the get_symbol function to fetch the symbol from the database
-            symbol_from_db = get_symbol(symboltoken, exchange)
+            symbol_from_db = symbols.get((symboltoken, exchange))
             
             # Check if a symbol was found; if so, update the trading_symbol in the current order
             if symbol_from_db:
@@ -58,7 +59,7 @@ def map_order_data(order_data):
             else:
                 print(f"Symbol not found for token {symboltoken} and exchange {exchange}. Keeping original trading symbol.")
                 
-    return order_data
+    return order_list
 
 
 def calculate_order_statistics(order_data):
@@ -194,13 +195,14 @@ def map_trade_data(trade_data):
 
 
     if trade_data:
+        # Resolve every distinct (broker symbol, exchange) pair in one lookup
+        symbols = get_oa_symbols_bulk((order['tradingsymbol'], order['exchange']) for order in trade_data)
         for order in trade_data:
             # Extract the instrument_token and exchange for the current order
             symbol = order['tradingsymbol']
             exchange = order['exchange']
             
-            # Use the get_symbol function to fetch the symbol from the database
-            symbol_from_db = get_oa_symbol(symbol, exchange)
+            symbol_from_db = symbols.get((symbol, exchange))
             
             # Check if a symbol was found; if so, update the trading_symbol in the current order
             if symbol_from_db:
@@ -311,10 +313,12 @@ def map_portfolio_data(portfolio_data):
 
     # Modify 'product' field for each holding if applicable
     if data.get('holdings'):
+        # Resolve every distinct (broker symbol, exchange) pair in one lookup
+        symbols = get_oa_symbols_bulk((holding['tradingsymbol'], holding['exchange']) for holding in data['holdings'])
         for portfolio in data['holdings']:
             symbol = portfolio['tradingsymbol']
             exchange = portfolio['exchange']
-            symbol_from_db = get_oa_symbol(symbol, exchange)
+            symbol_from_db = symbols.get((symbol, exchange))
             
             # Check if a symbol was found; if so, update the trading_symbol in the current order
             if symbol_from_db:
@@ -3,11 +3,12 @@
 
 from database.token_db import get_br_symbol
 
-def transform_data(data,token):
+def transform_data(data,token,br_symbol=None):
     """
     Transforms the new API request structure to the current expected structure.
+    `br_symbol` skips the broker symbol lookup when the caller has already resolved it.
     """
-    symbol = get_br_symbol(data["symbol"],data["exchange"])
+    symbol = br_symbol or get_br_symbol(data["symbol"],data["exchange"])
     # Basic mapping
     transformed = {
         "apikey": data["apikey"],
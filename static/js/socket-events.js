@@ -51,6 +51,19 @@ document.addEventListener('DOMContentLoaded', function() {
         showFlashMessage(bgColorClass, `${data.action.toUpperCase()} Order Placed for Symbol: ${data.symbol}, Order ID: ${data.orderid}`);
     });
 
+    socket.on('basket_order_event', function(data) {
+        console.log('🧺 Basket Order Event:', data);
+        var bgColorClass = data.placed === data.total ? 'bg-green-500' : 'bg-yellow-500';
+        showFlashMessage(bgColorClass, `Basket Order (${data.strategy}): ${data.placed} of ${data.total} orders placed`);
+    });
+
+    socket.on('split_order_event', function(data) {
+        console.log('✂️ Split Order Event:', data);
+        var bgColorClass = data.placed_quantity !== data.quantity ? 'bg-yellow-500' :
+            (data.action.toUpperCase() === 'BUY' ? 'bg-green-500' : 'bg-red-500');
+        showFlashMessage(bgColorClass, `${data.action.toUpperCase()} Split Order for Symbol: ${data.symbol}, ${data.placed_quantity} of ${data.quantity} placed in ${data.orderids.length} orders`);
+    });
+
     function showFlashMessage(bgColorClass, message) {
         console.log(`💬 Flash message (${bgColorClass}): ${message}`);
         
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app's modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that create their database engine at import time get a scratch SQLite file
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/test.db")
@@ -0,0 +1,127 @@
+"""BrokerConnectionPool against a local HTTPS stub."""
+import http.client
+import os
+import shutil
+import ssl
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.broker_client import BrokerConnectionPool
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /ok answers and keeps the connection open, /close answers and then closes it
+    without telling the client, /drop reads the request and closes without answering.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.received.append((self.command, self.path))
+        if self.path == '/drop':
+            self.close_connection = True
+            return
+        body = b'{"status": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == '/close':
+            self.close_connection = True
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    if shutil.which('openssl') is None:
+        pytest.skip('openssl is needed to make the stub certificate')
+    directory = tmp_path_factory.mktemp('cert')
+    cert, key = str(directory / 'cert.pem'), str(directory / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost'],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+@pytest.fixture
+def stub(certificate):
+    cert, key = certificate
+    server = ThreadingHTTPServer(('localhost', 0), StubHandler)
+    server.received = []
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(stub, certificate):
+    context = ssl.create_default_context(cafile=certificate[0])
+    pool = BrokerConnectionPool('localhost', stub.server_address[1], ssl_context=context, read_timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_reuses_the_connection(pool):
+    for _ in range(3):
+        res = pool.request('GET', '/ok')
+        assert res.status == 200 and res.json() == {'status': True}
+    assert pool.stats['created'] == 1
+    assert pool.stats['reused'] == 2
+
+
+def test_idle_connection_closed_by_the_broker_is_replaced(pool, stub):
+    pool.request('POST', '/close', '{}')
+    res = pool.request('POST', '/ok', '{}')
+    assert res.status == 200
+    assert pool.stats['created'] == 2
+    assert pool.stats['discarded'] == 1
+    assert pool.stats['reconnects'] == 0
+    assert [path for _, path in stub.received] == ['/close', '/ok']
+
+
+def test_stale_get_is_retried_on_a_fresh_connection(pool, stub, monkeypatch):
+    pool.request('GET', '/close')
+    # Let the dead socket through, as when the broker's close is still in flight
+    monkeypatch.setattr(BrokerConnectionPool, '_dropped', staticmethod(lambda conn: False))
+    res = pool.request('GET', '/ok')
+    assert res.status == 200
+    assert pool.stats['reconnects'] == 1
+
+
+def test_post_is_not_sent_again_once_it_went_out(pool, stub):
+    pool.request('POST', '/ok', '{}')
+    with pytest.raises((http.client.RemoteDisconnected, ConnectionError, ssl.SSLError)):
+        pool.request('POST', '/drop', '{"order": 1}')
+    assert stub.received.count(('POST', '/drop')) == 1
+    assert pool.stats['reconnects'] == 0
+
+
+def test_get_whose_response_was_lost_is_retried_once(pool, stub):
+    pool.request('GET', '/ok')
+    with pytest.raises((http.client.RemoteDisconnected, ConnectionError, ssl.SSLError)):
+        pool.request('GET', '/drop')
+    # Sent on the reused connection, then once more on a fresh one which raises
+    assert stub.received.count(('GET', '/drop')) == 2
+    assert pool.stats['reconnects'] == 1
+
+
+def test_fresh_connection_failure_is_not_retried(pool, stub):
+    with pytest.raises((http.client.RemoteDisconnected, ConnectionError, ssl.SSLError)):
+        pool.request('GET', '/drop')
+    assert stub.received.count(('GET', '/drop')) == 1
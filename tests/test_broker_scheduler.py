@@ -0,0 +1,128 @@
+"""BrokerScheduler and TokenBucket on a fake clock."""
+import threading
+import time
+
+import pytest
+
+from api.broker_scheduler import (BrokerScheduler, BrokerQueueTimeout, TokenBucket, PRIORITY_EXIT, PRIORITY_ORDER,
+                                  PRIORITY_QUERY)
+
+ENDPOINT = '/rest/secure/angelbroking/order/v1/placeOrder'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, condition, timeout):
+        # Waiting moves time forward instead of sleeping
+        self.now += timeout
+
+
+def test_bucket_starts_full_and_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, capacity=2, now=0.0)
+    assert bucket.try_take(0.0) and bucket.try_take(0.0)
+    assert not bucket.try_take(0.0)
+    assert bucket.time_until_token(0.0) == pytest.approx(0.1)
+    assert not bucket.try_take(0.05)
+    assert bucket.try_take(0.1)
+
+
+def test_bucket_never_holds_more_than_its_capacity():
+    bucket = TokenBucket(rate=10, capacity=2, now=0.0)
+    bucket.try_take(0.0)
+    bucket.try_take(0.0)
+    bucket._refill(60.0)
+    assert bucket.tokens == 2
+
+
+def test_calls_beyond_the_rate_wait_for_a_token():
+    clock = FakeClock()
+    scheduler = BrokerScheduler(limits={'placeOrder': 10}, burst=1, queue_timeout=5, clock=clock, wait=clock.sleep)
+    waits = [scheduler.acquire(ENDPOINT) for _ in range(4)]
+    assert waits[0] == 0.0
+    assert waits[1:] == [pytest.approx(0.1)] * 3
+    assert clock.now == pytest.approx(1000.3)
+    metrics = scheduler.metrics()['placeOrder']
+    assert metrics['sent'] == 4 and metrics['queued'] == 3
+
+
+def test_unlimited_endpoints_are_not_queued():
+    clock = FakeClock()
+    scheduler = BrokerScheduler(limits={'getRMS': 0}, clock=clock, wait=clock.sleep)
+    assert [scheduler.acquire('/user/v1/getRMS') for _ in range(5)] == [0.0] * 5
+    assert clock.now == 1000.0
+
+
+def test_call_not_granted_before_its_deadline_times_out():
+    clock = FakeClock()
+    scheduler = BrokerScheduler(limits={'placeOrder': 1}, burst=1, queue_timeout=0.5, clock=clock, wait=clock.sleep)
+    scheduler.acquire(ENDPOINT)
+    with pytest.raises(BrokerQueueTimeout):
+        scheduler.acquire(ENDPOINT)
+    assert clock.now == pytest.approx(1000.5)
+    metrics = scheduler.metrics()['placeOrder']
+    assert metrics['expired'] == 1 and metrics['queue_depth'] == 0
+    # The timed out call did not use up the token that arrives later
+    clock.now += 0.5
+    assert scheduler.acquire(ENDPOINT) == 0.0
+
+
+def _run_queued(scheduler, clock, calls):
+    """Queue `calls` of (name, priority) behind an empty bucket and return the names in the order they were granted."""
+    granted = []
+
+    def call(name, priority):
+        scheduler.acquire(ENDPOINT, priority)
+        granted.append(name)
+
+    threads = []
+    for name, priority in calls:
+        thread = threading.Thread(target=call, args=(name, priority), daemon=True)
+        thread.start()
+        threads.append(thread)
+        # Queue them one at a time so arrival order is known
+        deadline = time.monotonic() + 5
+        while len(scheduler._queues['placeOrder']) < len(threads):
+            assert time.monotonic() < deadline, 'call was not queued'
+            time.sleep(0.001)
+
+    for count in range(1, len(calls) + 1):
+        with scheduler._condition:
+            clock.now += 1.0
+            scheduler._condition.notify_all()
+        deadline = time.monotonic() + 5
+        while len(granted) < count:
+            assert time.monotonic() < deadline, 'no call was granted the new token'
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    return granted
+
+
+@pytest.fixture
+def held_scheduler():
+    clock = FakeClock()
+    # Waiters poll their condition instead of moving the clock; the test hands out time
+    scheduler = BrokerScheduler(limits={'placeOrder': 1}, burst=1, queue_timeout=60, clock=clock,
+                                wait=lambda condition, timeout: condition.wait(0.005))
+    scheduler.acquire(ENDPOINT)
+    return scheduler, clock
+
+
+def test_queued_calls_are_granted_in_priority_order(held_scheduler):
+    scheduler, clock = held_scheduler
+    granted = _run_queued(scheduler, clock, [('query', PRIORITY_QUERY), ('order', PRIORITY_ORDER),
+                                             ('exit', PRIORITY_EXIT)])
+    assert granted == ['exit', 'order', 'query']
+    by_priority = scheduler.metrics()['placeOrder']['by_priority']
+    assert {name: values['sent'] for name, values in by_priority.items()} == {'order': 2, 'query': 1, 'exit': 1}
+
+
+def test_calls_of_equal_priority_are_granted_in_arrival_order(held_scheduler):
+    scheduler, clock = held_scheduler
+    granted = _run_queued(scheduler, clock, [(f'order{i}', PRIORITY_ORDER) for i in range(4)])
+    assert granted == ['order0', 'order1', 'order2', 'order3']
@@ -0,0 +1,58 @@
+import threading
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+import api.order_api as order_api
+from api.bulk_executor import run_bulk
+
+POSITIONS = [{'tradingsymbol': symbol, 'exchange': 'NSE', 'producttype': 'INTRADAY', 'netqty': '5'}
+             for symbol in ('OK-EQ', 'REJECT-EQ', 'SLOW-EQ')]
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """Positions to square off and a broker that places OK, rejects REJECT and never answers SLOW in time."""
+    release = threading.Event()
+
+    def place_order_api(data, **kwargs):
+        if data['symbol'] == 'SLOW-EQ':
+            release.wait(5)
+        if data['symbol'] == 'REJECT-EQ':
+            return SimpleNamespace(status=400), {'message': 'Rejected'}, None
+        return SimpleNamespace(status=200), {'status': True}, f"OID-{data['symbol']}"
+
+    positions = list(POSITIONS)
+    monkeypatch.setattr(order_api, 'resolve_order_credentials', lambda *args: ('jwt', 'key'))
+    monkeypatch.setattr(order_api, 'get_positions', lambda *args: {'status': True, 'data': positions})
+    monkeypatch.setattr(order_api, 'place_order_api', place_order_api)
+    monkeypatch.setattr(order_api, 'run_bulk', partial(run_bulk, timeout=0.2))
+    yield positions
+    release.set()
+
+
+def outcomes(report):
+    return {result['item']['symbol']: result['status'] for result in report['results']}
+
+
+def test_all_squared_off_is_success(broker):
+    broker[:] = POSITIONS[:1]
+    response, status = order_api.close_all_positions('key')
+    assert status == 200
+    assert (response['status'], response['message']) == ('success', 'All Open Positions SquaredOff')
+
+
+def test_partial_square_off_is_an_error_with_pending_positions(broker):
+    response, status = order_api.close_all_positions('key')
+    assert status == 200
+    assert response['status'] == 'error'
+    assert response['message'] == 'Squared off 1 of 3 positions, 1 pending'
+    assert outcomes(response['report']) == {'OK-EQ': 'success', 'REJECT-EQ': 'error', 'SLOW-EQ': 'pending'}
+
+
+def test_nothing_squared_off_reports_pending_before_failed(broker):
+    broker[:] = POSITIONS[1:]
+    assert order_api.close_all_positions('key')[1] == 504
+    broker[:] = POSITIONS[1:2]
+    assert order_api.close_all_positions('key')[1] == 502
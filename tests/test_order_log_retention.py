@@ -0,0 +1,15 @@
+import database.order_log_retention as retention
+
+
+def test_archiving_without_an_archive_dir_is_skipped_for_every_caller(monkeypatch):
+    monkeypatch.setattr(retention, 'ORDER_LOG_RETENTION_DAYS', 7)
+    monkeypatch.setattr(retention, 'ORDER_LOG_ARCHIVE', True)
+    monkeypatch.delenv('ORDER_LOG_ARCHIVE_DIR', raising=False)
+    monkeypatch.setattr(retention, '_move_day', lambda *args: (_ for _ in ()).throw(AssertionError('rows moved')))
+
+    result = retention.run_order_log_retention()
+
+    assert result['status'] == 'skipped'
+    assert 'ORDER_LOG_ARCHIVE_DIR' in result['message']
+    assert retention.get_order_log_retention_status()['state'] == 'skipped'
+
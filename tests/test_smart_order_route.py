@@ -0,0 +1,128 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+import api.order_execution as order_execution
+import blueprints.api_v1 as api_v1
+from database import idempotency_db
+
+
+class StubBroker:
+    """Counts placements and answers like a successful place_smartorder_api call."""
+
+    def __init__(self, message=None):
+        self.message = message
+        self.placed = 0
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def place_smartorder_api(self, data, user_id=None, auth_token=None, broker_api_key=None):
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+            if self.message:
+                return None, {'status': 'success', 'message': self.message}, None
+            self.placed += 1
+            return SimpleNamespace(status=200), {'status': 'success'}, f'OID{self.placed}'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    idempotency_db.init_db()
+    monkeypatch.setattr(order_execution, 'ORDER_EXECUTION_MODE', 'sync')
+    monkeypatch.setattr(order_execution, 'socketio', SimpleNamespace(emit=lambda *args, **kwargs: None))
+    monkeypatch.setattr(api_v1, 'resolve_api_key',
+                        lambda key: SimpleNamespace(user_id='user1', auth_token='jwt', broker_apikey='key'))
+    logs = []
+    monkeypatch.setattr(api_v1, 'async_log_order', lambda *args: logs.append(args))
+    app = Flask(__name__)
+    app.register_blueprint(api_v1.api_v1_bp)
+    test_client = app.test_client()
+    test_client.logs = logs
+    return test_client
+
+
+def smart_order(**fields):
+    return {'apikey': 'secret', 'strategy': 'test', 'exchange': 'NSE', 'symbol': 'SBIN', 'action': 'BUY',
+            'quantity': '10', 'position_size': '10', 'product': 'MIS', 'pricetype': 'MARKET', **fields}
+
+
+def test_sync_smart_order_is_placed_and_logged_from_its_lane(client, monkeypatch):
+    broker = StubBroker()
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', broker.place_smartorder_api)
+
+    response = client.post('/api/v1/placesmartorder', json=smart_order())
+
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'success', 'orderid': 'OID1'}
+    assert all(name.startswith('smart-order-lane') for name in broker.threads)
+    (api_type, request_data, response_data, latency_ms), = client.logs
+    assert api_type == 'placeorder' and response_data['orderid'] == 'OID1'
+    assert 'apikey' not in request_data and latency_ms is not None
+
+
+def test_matching_position_is_logged(client, monkeypatch):
+    broker = StubBroker(message='Positions Already Matched. No Action needed.')
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', broker.place_smartorder_api)
+
+    response = client.post('/api/v1/placesmartorder', json=smart_order())
+
+    assert response.status_code == 200
+    assert [log[0] for log in client.logs] == ['placesmartorder']
+
+
+def test_repeated_key_is_placed_once(client, monkeypatch):
+    broker = StubBroker()
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', broker.place_smartorder_api)
+    order = smart_order(idempotency_key='alert-1')
+
+    first = client.post('/api/v1/placesmartorder', json=order)
+    second = client.post('/api/v1/placesmartorder', json=order)
+
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert broker.placed == 1
+
+
+def test_failing_order_log_does_not_fail_the_order(client, monkeypatch):
+    broker = StubBroker()
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', broker.place_smartorder_api)
+
+    def broken_log(*args):
+        raise RuntimeError('log queue unavailable')
+    monkeypatch.setattr(api_v1, 'async_log_order', broken_log)
+
+    response = client.post('/api/v1/placesmartorder', json=smart_order(symbol='INFY'))
+
+    assert response.status_code == 200
+    assert broker.placed == 1
+
+
+def test_server_error_after_the_broker_call_is_replayed(client, monkeypatch):
+    broker = StubBroker()
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', broker.place_smartorder_api)
+    monkeypatch.setattr(order_execution, 'socketio', None)  # emitting fails after the order is placed
+    monkeypatch.setattr(order_execution, '_write_log', lambda *args: 1 / 0)
+    order = smart_order(symbol='TCS', idempotency_key='alert-2')
+
+    first = client.post('/api/v1/placesmartorder', json=order)
+    second = client.post('/api/v1/placesmartorder', json=order)
+
+    assert first.status_code == 500
+    assert second.status_code == 500 and second.headers.get('Idempotent-Replayed') == 'true'
+    assert broker.placed == 1
+
+
+def test_rejected_order_releases_the_key(client, monkeypatch):
+    calls = []
+
+    def rejected(data, **kwargs):
+        calls.append(data)
+        return SimpleNamespace(status=200), {'status': False, 'message': 'Insufficient funds'}, None
+    monkeypatch.setattr(order_execution, 'place_smartorder_api', rejected)
+    order = smart_order(symbol='WIPRO', idempotency_key='alert-3')
+
+    assert client.post('/api/v1/placesmartorder', json=order).status_code == 502
+    assert client.post('/api/v1/placesmartorder', json=order).status_code == 502
+    assert len(calls) == 2
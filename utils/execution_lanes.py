@@ -0,0 +1,99 @@
+"""
+Keyed execution lanes: calls for the same key run one at a time in submission order,
+calls for different keys run concurrently on a shared worker pool
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class _Task:
+    __slots__ = ('future', 'fn', 'args', 'kwargs', 'submitted')
+
+    def __init__(self, fn, args, kwargs):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted = time.monotonic()
+
+
+class ExecutionLanes:
+    """
+    Runs `fn` calls in per-key FIFO lanes. The first call for an idle key schedules a
+    drain of that key's lane on the pool; calls arriving while the lane is busy are
+    appended and run by the same drain, strictly after the calls ahead of them. A
+    lane is forgotten once it is empty, so keys cost nothing while idle.
+    """
+
+    def __init__(self, max_workers, name='lane', recent_waits=1000):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=recent_waits)
+        self.max_workers = max_workers
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'queued_behind': 0, 'max_depth': 0}
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` on the lane for `key` and return a Future for its result."""
+        task = _Task(fn, args, kwargs)
+        with self._lock:
+            lane = self._lanes.get(key)
+            idle = lane is None
+            if idle:
+                lane = self._lanes[key] = {'tasks': deque(), 'running': False}
+            lane['tasks'].append(task)
+            self.stats['submitted'] += 1
+            depth = len(lane['tasks']) + lane['running']
+            if depth > 1:
+                self.stats['queued_behind'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+        if idle:
+            self._pool.submit(self._drain, key)
+        return task.future
+
+    def run(self, key, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the lane for `key` and return its result, or raise its exception."""
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                lane = self._lanes[key]
+                if not lane['tasks']:
+                    del self._lanes[key]
+                    return
+                task = lane['tasks'].popleft()
+                lane['running'] = True
+                self._waits.append(time.monotonic() - task.submitted)
+            if task.future.set_running_or_notify_cancel():
+                try:
+                    task.future.set_result(task.fn(*task.args, **task.kwargs))
+                    outcome = 'completed'
+                except BaseException as e:
+                    task.future.set_exception(e)
+                    outcome = 'failed'
+                with self._lock:
+                    self.stats[outcome] += 1
+            with self._lock:
+                lane['running'] = False
+
+    def metrics(self, top=5):
+        """Active lanes, queued calls, the deepest lanes and recent lane wait times."""
+        with self._lock:
+            depths = {key: len(lane['tasks']) + lane['running'] for key, lane in self._lanes.items()}
+            queued = sum(len(lane['tasks']) for lane in self._lanes.values())
+            waits = sorted(self._waits)
+            stats = dict(self.stats)
+        deepest = sorted(depths.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            'workers': self.max_workers,
+            'active_lanes': len(depths),
+            'queued': queued,
+            'deepest_lanes': [{'key': str(key), 'depth': depth} for key, depth in deepest if depth > 1],
+            'avg_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            'p95_wait_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            'max_wait_ms': round(waits[-1] * 1000, 1) if waits else 0.0,
+            **stats,
+        }
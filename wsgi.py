@@ -2,12 +2,28 @@ from app import app, socketio
 from database.auth_db import init_db as ensure_auth_tables_exists
 from database.master_contract_db import init_db as ensure_master_contract_tables_exists
 from database.apilog_db import init_db as ensure_api_log_tables_exists
+from database.idempotency_db import init_db as ensure_idempotency_tables_exists
+from database.token_db import warm_symbol_index
+from database.symbol_search import warm_search_index
+from database.order_log_retention import start_order_log_retention
+from api.order_execution import start_order_executor
 
 # Initialize database tables on startup
 with app.app_context():
     ensure_auth_tables_exists()
     ensure_master_contract_tables_exists()
     ensure_api_log_tables_exists()
+    ensure_idempotency_tables_exists()
+
+# Load the in-memory symbol lookup and search indexes in the background
+warm_symbol_index()
+warm_search_index()
+
+# Move order logs past the retention window to the archive in the background
+start_order_log_retention()
+
+# Drain webhook orders accepted before a restart when queued execution is on
+start_order_executor()
 
 # For Railway/Gunicorn deployment
 if __name__ == "__main__":